@@ -1,17 +1,39 @@
 import dash
-from dash import dcc, html, Input, Output, State, dash_table
+from dash import dcc, html, Input, Output, State, Patch, ClientsideFunction, ALL, dash_table
 import pandas as pd
-import plotly.graph_objects as go
 import base64
-import io
 import dash_bootstrap_components as dbc
-from typing import List, Dict, Any
-import gspread
+from typing import List, Dict, Any, Optional
 import os
-from oauth2client.service_account import ServiceAccountCredentials
-from dataclasses import dataclass
-import json
 import traceback
+import uuid
+from datastore import DatasetExpired, dataset_store
+from drilldown import HISTORY_COLUMNS, housemaid_history, housemaid_key
+from search import search_index, warm_indexes
+from figures import (
+    bar_figure, pie_figure, timeline_figure, percentile_figure, trend_figure, top_stage_counts, patch_trace, bar_arrays, pie_arrays, EMPTY_COUNTS
+)
+from views import filter_spec, late_spec, filtered_frame, late_frame, breach_forecast, memoized
+from forecast import FORECAST_HORIZONS, FORECAST_LIST_SIZE
+from sketches import percentile_table, sketch_store
+from archive import TREND_DIMENSIONS, late_trend, upload_archive
+from completion import STATUS_COLUMN, completion_tracker, progress_table, request_keys
+from assignments import OVERDUE_COLUMN, AgentQueue, assignment_index
+from distribution import distribute_cases, refresh_done, without_done
+from bundles import bundle_builder, bundle_summary, install_bundle_downloads, workbook_filenames
+from delta import CHANGE_LABELS, build_snapshot, snapshot_store
+from pipeline import (
+    decode_contents, parse_bytes, parse_file, late_flags, row_thresholds, split_evenly,
+    export_filename, to_csv_bytes, to_excel_bytes
+)
+from rules import RuleTable, rule_store, threshold_sets
+from schema import sniff_upload
+from client_summary import CLIENT_MODE_MAX_ROWS, build_case_summary
+from serialization import install_json_encoder, install_compression
+from instrumentation import install_request_metrics, stage
+from diagnostics import install_memory_diagnostics
+from users import User, UserManager
+from watcher import WATCH_DIR, WATCH_INTERVAL, WATCHED_DATASET_ID, DirectoryWatcher, claim_recorder
 
 # Define custom styles for components
 custom_styles = {
@@ -50,6 +72,11 @@ app = dash.Dash(__name__,
     ]
 )
 server = app.server  # Expose the Flask server for deployment
+install_json_encoder()
+install_compression(server)
+install_request_metrics(server)
+install_memory_diagnostics(server)
+install_bundle_downloads(server)
 # Custom CSS for enhanced visual design
 app.index_string = '''
 <!DOCTYPE html>
@@ -207,138 +234,195 @@ app.index_string = '''
 </html>
 '''
 
-# Define User and UserManager classes for Manage Users functionality
-@dataclass
-class User:
-    name: str
-    google_sheet_id: str
-    active: bool = True
-    workload: int = 0
-
-class UserManager:
-    def __init__(self):
-        self.users: Dict[str, User] = {
-            "razan.hassan": User(
-                name="Razan Hassan",
-                google_sheet_id="14dpPJUFwMXTFemq8b2as3Jpwj_Qs-kplradlM63lS_U"
-            ),
-            "aya.tahawi": User(
-                name="Aya Tahawi",
-                google_sheet_id="1hkB77aTFTalcZtUG9xfNKH3b7nIgYAZP1-AF6Ob7szE"
-            ),
-            "maya.dayoub": User(
-                name="Maya Dayoub",
-                google_sheet_id="1fDaIXfSGEKlUTlVprS7_SjG1wbhaGk1kVLvZXTia6QU"
-            ),
-            "laila.alhafi": User(
-                name="Laila Alhafi",
-                google_sheet_id="1nCzh8FMZOGa2x7v_OLIUtVEtAc4hzUG3f-rIgHJgEF8"
-            ),
-            "ehab.joud": User(
-                name="Ehab Joud",
-                google_sheet_id="1WccFTrR-Izh4qpRSnDD9A_nq8MWm0l54fqFJu4eJPYY"
-            ),
-            "hala.khaddour": User(
-                name="Hala Khaddour",
-                google_sheet_id="1_zM3sANFMHXvjSFvIHCtG2sKiS7GBWk8haUCoYBm1XU"
-            ),
-            "marah.ghanem": User(
-                name="Marah Ghanem",
-                google_sheet_id="1z88anA3_FKx6xo3fc4bci22-J8naoiEYdbcK8eiN8CM"
-            )
-        }
-        self.setup_google_sheets()
-
-    def setup_google_sheets(self):
-        """Initialize Google Sheets connection"""
-        scope = ['https://spreadsheets.google.com/feeds',
-                'https://www.googleapis.com/auth/drive']
-        
-        # Add your credentials file path
-        service_account_json = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
-        if not service_account_json:
-            raise ValueError("Environment variable GOOGLE_SERVICE_ACCOUNT_JSON is missing")
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(
-            json.loads(service_account_json), scope
-        )
-        self.client = gspread.authorize(creds)
-
-    def distribute_data(self, usernames: list, data: pd.DataFrame) -> dict:
-        """Distribute data evenly among users."""
-        results = {}
-        for username in usernames:
-            if username in self.users:
-                sheet = self.client.open_by_key(self.users[username].google_sheet_id).sheet1
-                sheet.clear()
-                sheet.update([data.columns.values.tolist()] + data.values.tolist())
-                results[username] = {"status": "success", "message": f"Data distributed to {username}"}
-            else:
-                results[username] = {"status": "error", "message": f"User {username} not found"}
-        return results
-
 # Initialize UserManager
 user_manager = UserManager()
 
-app.layout = dbc.Container([
-    # Header section
-    dbc.Row([
-        dbc.Col([
-            html.Div([
-                html.H1("Housemaid Monitoring Dashboard", 
-                        className="display-4 mb-4 text-primary"),
-                html.P("Upload your data file to begin analysis", 
-                       className="lead text-muted")
-            ], className="text-center my-4")
-        ])
-    ]),
+def rules_summary(table: RuleTable) -> str:
+    """One-line description of the active threshold rules."""
+    if not table.rules:
+        return f"No rules imported; every stage defaults to {table.default:g} hours."
+    return f"{len(table.rules)} rule(s) active, {table.default:g} hours when none match."
+
+def serve_layout():
+    """Build the page layout; Dash calls this on every page load."""
+    return dbc.Container([
+        # Header section
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.H1("Housemaid Monitoring Dashboard", 
+                            className="display-4 mb-4 text-primary"),
+                    html.P("Upload your data file to begin analysis", 
+                           className="lead text-muted")
+                ], className="text-center my-4")
+            ])
+        ]),
     
-    # File upload section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dcc.Upload(
-                    id='upload-data',
-                    children=html.Div([
-                        html.I(className="fas fa-cloud-upload-alt fa-2x mb-2"),
-                        html.Br(),
-                        'Drag and Drop or ',
-                        html.A('Select a File', className="text-primary")
-                    ]),
-                    style={
-                        'width': '100%',
-                        'height': '120px',
-                        'lineHeight': '30px',
-                        'borderWidth': '2px',
-                        'borderStyle': 'dashed',
-                        'borderRadius': '10px',
-                        'textAlign': 'center',
-                        'padding': '20px',
-                        'backgroundColor': '#fafafa'
-                    },
-                    multiple=False
-                )
-            ], className="mb-4", style=custom_styles['filter-card'])
-        ])
-    ]),
+        # File upload section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dcc.Upload(
+                        id='upload-data',
+                        children=html.Div([
+                            html.I(className="fas fa-cloud-upload-alt fa-2x mb-2"),
+                            html.Br(),
+                            'Drag and Drop or ',
+                            html.A('Select a File', className="text-primary")
+                        ]),
+                        style={
+                            'width': '100%',
+                            'height': '120px',
+                            'lineHeight': '30px',
+                            'borderWidth': '2px',
+                            'borderStyle': 'dashed',
+                            'borderRadius': '10px',
+                            'textAlign': 'center',
+                            'padding': '20px',
+                            'backgroundColor': '#fafafa'
+                        },
+                        multiple=True
+                    ),
+                    dbc.Row([
+                        dbc.Col([
+                            dbc.Switch(
+                                id='append-mode',
+                                label="Append to current dataset",
+                                value=False,
+                                className="mt-3 ms-2"
+                            )
+                        ], md=4),
+                        dbc.Col([
+                            html.Div(id='upload-status', className="mt-3 me-2")
+                        ], md=8)
+                    ])
+                ], className="mb-4", style=custom_styles['filter-card'])
+            ])
+        ]),
+
+        # Reference to the server-side dataset built from the uploaded file(s)
+        dcc.Store(id='dataset-store'),
+        dcc.Store(id='session-id', storage_type='session'),
+        dcc.Store(id='watch-version'),
+        # Hashes of the chart arrays the browser already holds, so unchanged ones are not resent
+        dcc.Store(id='bar-fingerprints'),
+        dcc.Store(id='pie-fingerprints'),
+        # Descriptions of the current filtered and late views, shared by the panel callbacks
+        dcc.Store(id='filter-spec'),
+        dcc.Store(id='late-spec'),
+        # Compact typed-array summary for in-browser filtering when instant filtering is on
+        dcc.Store(id='case-summary'),
+        dcc.Interval(id='watch-poll', interval=WATCH_INTERVAL * 1000, disabled=not WATCH_DIR),
     
-    # Combined Manage Users and Current Users Accordion
-    dbc.Accordion([
-        dbc.AccordionItem(
+        # Combined Manage Users and Current Users Accordion
+        dbc.Accordion([
+            dbc.AccordionItem(
+                [
+                    dbc.CardBody([
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Username", className="font-weight-bold mb-2"),
+                                dbc.Input(id='input-username', placeholder="Enter username", type="text", className="mb-3")
+                            ], md=4),
+                            dbc.Col([
+                                html.Label("Full Name", className="font-weight-bold mb-2"),
+                                dbc.Input(id='input-fullname', placeholder="Enter full name", type="text", className="mb-3")
+                            ], md=4),
+                            dbc.Col([
+                                html.Label("Google Sheet ID", className="font-weight-bold mb-2"),
+                                dbc.Input(id='input-sheet-id', placeholder="Enter Google Sheet ID", type="text", className="mb-3")
+                            ], md=4)
+                        ]),
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-plus me-2"),
+                                        "Add User"
+                                    ]),
+                                    id='add-user',
+                                    color="success",
+                                    className="me-2"
+                                ),
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-edit me-2"),
+                                        "Update User"
+                                    ]),
+                                    id='update-user',
+                                    color="primary",
+                                    className="me-2"
+                                ),
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-trash me-2"),
+                                        "Delete User"
+                                    ]),
+                                    id='delete-user',
+                                    color="danger"
+                                )
+                            ], className="text-end mt-3")
+                        ]),
+                        html.Div(id='user-management-results', className="mt-3"),
+                        dash_table.DataTable(
+                            id='user-table',
+                            columns=[
+                                {'name': 'Username', 'id': 'username', 'type': 'text'},
+                                {'name': 'Name', 'id': 'name', 'type': 'text'},
+                                {'name': 'Google Sheet ID', 'id': 'google_sheet_id', 'type': 'text'},
+                                {'name': 'Status', 'id': 'status', 'type': 'text'},
+                                {'name': 'Workload', 'id': 'workload', 'type': 'numeric'}
+                            ],
+                            data=[
+                                {
+                                    'username': username,
+                                    'name': user.name,
+                                    'google_sheet_id': user.google_sheet_id,
+                                    'status': 'Active' if user.active else 'Inactive',
+                                    'workload': user.workload
+                                }
+                                for username, user in user_manager.users.items()
+                            ],
+                            row_selectable='single',
+                            selected_rows=[],
+                            style_table={'overflowX': 'auto'},
+                            style_cell={
+                                'textAlign': 'left',
+                                'padding': '12px',
+                            },
+                            style_header={
+                                'backgroundColor': '#f8f9fa',
+                                'fontWeight': 'bold'
+                            },
+                            filter_action='native',
+                            sort_action='native',
+                            page_action='native',
+                            page_size=10
+                        )
+                    ])
+                ],
+                title="Manage Users ",
+                item_id="manage-users"
+            )
+        ], start_collapsed=True, flush=True, style=custom_styles['filter-card']),
+    
+        # User Management Modal
+        dbc.Modal(
             [
-                dbc.CardBody([
+                dbc.ModalHeader("User Management"),
+                dbc.ModalBody([
                     dbc.Row([
                         dbc.Col([
                             html.Label("Username", className="font-weight-bold mb-2"),
-                            dbc.Input(id='input-username', placeholder="Enter username", type="text", className="mb-3")
+                            dbc.Input(id='input-username-modal', placeholder="Enter username", type="text", className="mb-3")
                         ], md=4),
                         dbc.Col([
                             html.Label("Full Name", className="font-weight-bold mb-2"),
-                            dbc.Input(id='input-fullname', placeholder="Enter full name", type="text", className="mb-3")
+                            dbc.Input(id='input-fullname-modal', placeholder="Enter full name", type="text", className="mb-3")
                         ], md=4),
                         dbc.Col([
                             html.Label("Google Sheet ID", className="font-weight-bold mb-2"),
-                            dbc.Input(id='input-sheet-id', placeholder="Enter Google Sheet ID", type="text", className="mb-3")
+                            dbc.Input(id='input-sheet-id-modal', placeholder="Enter Google Sheet ID", type="text", className="mb-3")
                         ], md=4)
                     ]),
                     dbc.Row([
@@ -348,7 +432,7 @@ app.layout = dbc.Container([
                                     html.I(className="fas fa-plus me-2"),
                                     "Add User"
                                 ]),
-                                id='add-user',
+                                id='add-user-modal',
                                 color="success",
                                 className="me-2"
                             ),
@@ -357,7 +441,7 @@ app.layout = dbc.Container([
                                     html.I(className="fas fa-edit me-2"),
                                     "Update User"
                                 ]),
-                                id='update-user',
+                                id='update-user-modal',
                                 color="primary",
                                 className="me-2"
                             ),
@@ -366,454 +450,863 @@ app.layout = dbc.Container([
                                     html.I(className="fas fa-trash me-2"),
                                     "Delete User"
                                 ]),
-                                id='delete-user',
+                                id='delete-user-modal',
                                 color="danger"
                             )
                         ], className="text-end mt-3")
                     ]),
-                    html.Div(id='user-management-results', className="mt-3"),
-                    dash_table.DataTable(
-                        id='user-table',
-                        columns=[
-                            {'name': 'Username', 'id': 'username', 'type': 'text'},
-                            {'name': 'Name', 'id': 'name', 'type': 'text'},
-                            {'name': 'Google Sheet ID', 'id': 'google_sheet_id', 'type': 'text'},
-                            {'name': 'Status', 'id': 'status', 'type': 'text'},
-                            {'name': 'Workload', 'id': 'workload', 'type': 'numeric'}
-                        ],
-                        data=[
-                            {
-                                'username': username,
-                                'name': user.name,
-                                'google_sheet_id': user.google_sheet_id,
-                                'status': 'Active' if user.active else 'Inactive',
-                                'workload': user.workload
-                            }
-                            for username, user in user_manager.users.items()
-                        ],
-                        row_selectable='single',
-                        selected_rows=[],
-                        style_table={'overflowX': 'auto'},
-                        style_cell={
-                            'textAlign': 'left',
-                            'padding': '12px',
-                        },
-                        style_header={
-                            'backgroundColor': '#f8f9fa',
-                            'fontWeight': 'bold'
-                        },
-                        filter_action='native',
-                        sort_action='native',
-                        page_action='native',
-                        page_size=10
-                    )
-                ])
+                    html.Div(id='user-management-results-modal', className="mt-3")
+                ]),
+                dbc.ModalFooter(
+                    dbc.Button("Close", id="close-user-modal", className="ms-auto")
+                )
             ],
-            title="Manage Users ",
-            item_id="manage-users"
-        )
-    ], start_collapsed=True, flush=True, style=custom_styles['filter-card']),
+            id="user-management-modal",
+            size="lg",
+            is_open=False
+        ),
     
-    # User Management Modal
-    dbc.Modal(
-        [
-            dbc.ModalHeader("User Management"),
-            dbc.ModalBody([
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Username", className="font-weight-bold mb-2"),
-                        dbc.Input(id='input-username-modal', placeholder="Enter username", type="text", className="mb-3")
-                    ], md=4),
-                    dbc.Col([
-                        html.Label("Full Name", className="font-weight-bold mb-2"),
-                        dbc.Input(id='input-fullname-modal', placeholder="Enter full name", type="text", className="mb-3")
-                    ], md=4),
-                    dbc.Col([
-                        html.Label("Google Sheet ID", className="font-weight-bold mb-2"),
-                        dbc.Input(id='input-sheet-id-modal', placeholder="Enter Google Sheet ID", type="text", className="mb-3")
-                    ], md=4)
-                ]),
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Button(
-                            html.Span([
-                                html.I(className="fas fa-plus me-2"),
-                                "Add User"
+        # User Management & Task Distribution Section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("User Management & Task Distribution", className="text-primary mb-0"),
+                        html.Small("Manage users and distribute tasks", className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Select Users", className="font-weight-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='select-users',
+                                    multi=True,
+                                    placeholder="Select User(s)",
+                                    options=[{'label': user.name, 'value': username} for username, user in user_manager.users.items()],
+                                    className="mb-3"
+                                )
+                            ], md=6),
+                            dbc.Col([
+                                html.Label("Distribute Tasks", className="font-weight-bold mb-2"),
+                                html.Div([
+                                    dbc.Button(
+                                        html.Span([
+                                            html.I(className="fas fa-tasks me-2"),
+                                            "Distribute Tasks"
+                                        ]),
+                                        id='distribute-tasks',
+                                        color="primary",
+                                        className="me-3"
+                                    ),
+                                    dbc.Button(
+                                        html.Span([
+                                            html.I(className="fas fa-file-archive me-2"),
+                                            "Export Bundle"
+                                        ]),
+                                        id='export-bundle',
+                                        color="secondary",
+                                        outline=True,
+                                        className="me-3"
+                                    ),
+                                    dbc.Switch(
+                                        id='distribute-preemptive',
+                                        label="Also cases breaching within the forecast horizon",
+                                        value=False
+                                    )
+                                ], className="d-flex align-items-center")
+                            ], md=6)
+                        ]),
+                        html.Div(id='distribution-results', className="mt-3"),
+                        html.Div(id='bundle-results', className="mt-2"),
+                        html.Hr(),
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Agent Progress", className="font-weight-bold mb-0"),
+                                html.Small(" read back from each agent's sheet (Status column)",
+                                           className="text-muted")
                             ]),
-                            id='add-user-modal',
-                            color="success",
-                            className="me-2"
+                            dbc.Col([
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-sync me-2"),
+                                        "Refresh Progress"
+                                    ]),
+                                    id='refresh-progress',
+                                    color="secondary",
+                                    outline=True,
+                                    size="sm"
+                                )
+                            ], className="text-end")
+                        ]),
+                        html.Div(id='progress-results', className="mt-2"),
+                        html.Hr(),
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Agent Queue", className="font-weight-bold mb-0"),
+                                html.Small(" as last distributed, from the local assignment index",
+                                           className="text-muted")
+                            ], md=6),
+                            dbc.Col([
+                                dcc.Dropdown(
+                                    id='queue-agent',
+                                    placeholder="All agents",
+                                    options=[{'label': user.name, 'value': username} for username, user in user_manager.users.items()]
+                                )
+                            ], md=6)
+                        ]),
+                        html.Div(id='queue-results', className="mt-2")
+                    ])
+                ], style=custom_styles['filter-card'])
+            ])
+        ]),
+    
+        # Filters Section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader(html.H4("Filters", className="text-primary mb-0")),
+                    dbc.CardBody([
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Stage", className="font-weight-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='filter-stage',
+                                    multi=True,
+                                    placeholder="Select Stage(s)",
+                                    className="mb-3"
+                                )
+                            ], md=3),
+                            dbc.Col([
+                                html.Label("Type", className="font-weight-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='filter-type',
+                                    multi=True,
+                                    placeholder="Select Type(s)",
+                                    className="mb-3"
+                                )
+                            ], md=3),
+                            dbc.Col([
+                                html.Label("Nationality", className="font-weight-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='filter-nationality',
+                                    multi=True,
+                                    placeholder="Select Nationality(s)",
+                                    className="mb-3"
+                                )
+                            ], md=3),
+                            dbc.Col([
+                                html.Label("Client Priority", className="font-weight-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='filter-client-note',
+                                    multi=True,
+                                    placeholder="Select Priority",
+                                    className="mb-3"
+                                )
+                            ], md=3)
+                        ]),
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Change Since Last Upload", className="font-weight-bold mb-2"),
+                                dcc.Dropdown(
+                                    id='filter-change',
+                                    multi=True,
+                                    placeholder="Select Change(s)",
+                                    options=[{'label': label, 'value': value} for value, label in CHANGE_LABELS.items()],
+                                    className="mb-3"
+                                )
+                            ], md=3),
+                            dbc.Col([
+                                dbc.Switch(
+                                    id='client-mode',
+                                    label="Instant filtering (cards and charts update in the browser)",
+                                    value=False,
+                                    className="mt-4"
+                                ),
+                                html.Div(id='client-mode-status')
+                            ], md=9)
+                        ])
+                    ])
+                ], style=custom_styles['filter-card'])
+            ])
+        ]),
+    
+        # Stage Thresholds Section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("Stage Thresholds (Hours)", className="text-primary mb-0"),
+                        html.Small("Set maximum allowed hours for each stage", 
+                                 className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        dash_table.DataTable(
+                            id='threshold-table',
+                            columns=[
+                                {'name': 'Stage', 'id': 'stage', 'type': 'text', 'editable': False},
+                                {'name': 'Threshold (Hours)', 'id': 'hours', 'type': 'numeric', 'editable': True}
+                            ],
+                            data=[],
+                            editable=True,
+                            virtualization=True,
+                            fixed_rows={'headers': True},
+                            page_action='none',
+                            sort_action='native',
+                            filter_action='native',
+                            filter_options={'case': 'insensitive'},
+                            style_table={'height': '300px', 'overflowY': 'auto'},
+                            style_cell={
+                                'textAlign': 'left',
+                                'padding': '8px',
+                                'fontFamily': '"Segoe UI", Arial, sans-serif'
+                            },
+                            style_cell_conditional=[
+                                {'if': {'column_id': 'stage'}, 'width': '70%'},
+                                {'if': {'column_id': 'hours'}, 'width': '30%', 'textAlign': 'right'}
+                            ],
+                            # Negative hours are not saved; flag the cell so the edit does not look accepted
+                            style_data_conditional=[
+                                {'if': {'filter_query': '{hours} < 0', 'column_id': 'hours'},
+                                 'backgroundColor': '#f8d7da', 'color': '#842029'}
+                            ],
+                            style_header={
+                                'backgroundColor': '#f8f9fa',
+                                'fontWeight': 'bold'
+                            }
                         ),
-                        dbc.Button(
-                            html.Span([
-                                html.I(className="fas fa-edit me-2"),
-                                "Update User"
-                            ]),
-                            id='update-user-modal',
-                            color="primary",
-                            className="me-2"
+                        # Reference to this session's thresholds, which live on the server
+                        dcc.Store(id='threshold-set'),
+                        html.Hr(),
+                        dbc.Row([
+                            dbc.Col([
+                                html.Label("Threshold Rules (Stage × Type × Nationality)", className="font-weight-bold mb-2"),
+                                html.Div(rules_summary(rule_store.table), id='rules-status', className="text-muted small")
+                            ], md=6),
+                            dbc.Col([
+                                dcc.Upload(
+                                    id='upload-rules',
+                                    children=dbc.Button(
+                                        html.Span([
+                                            html.I(className="fas fa-file-import me-2"),
+                                            "Import Rules"
+                                        ]),
+                                        color="secondary",
+                                        outline=True,
+                                        size="sm"
+                                    ),
+                                    multiple=False,
+                                    className="d-inline-block me-2"
+                                ),
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-file-export me-2"),
+                                        "Export Rules"
+                                    ]),
+                                    id='export-rules',
+                                    color="secondary",
+                                    outline=True,
+                                    size="sm"
+                                ),
+                                dcc.Download(id='download-rules')
+                            ], md=6, className="text-end")
+                        ]),
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-filter me-2"),
+                                        "Apply Filters & Thresholds"
+                                    ]),
+                                    id='apply-filters',
+                                    color="primary",
+                                    className="me-2"
+                                ),
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-undo me-2"),
+                                        "Reset"
+                                    ]),
+                                    id='reset-filters',
+                                    color="secondary"
+                                )
+                            ], className="text-end mt-3")
+                        ])
+                    ])
+                ], style=custom_styles['filter-card'])
+            ], md=7),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("Dwell Time Percentiles (Hours)", className="text-primary mb-0"),
+                        html.Small("Time In Stage per stage across uploads, to calibrate thresholds",
+                                 className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        dcc.DatePickerRange(
+                            id='percentile-range',
+                            display_format='YYYY-MM-DD',
+                            clearable=True,
+                            start_date_placeholder_text="First upload",
+                            end_date_placeholder_text="Last upload",
+                            className="mb-2"
                         ),
-                        dbc.Button(
-                            html.Span([
-                                html.I(className="fas fa-trash me-2"),
-                                "Delete User"
-                            ]),
-                            id='delete-user-modal',
-                            color="danger"
-                        )
-                    ], className="text-end mt-3")
-                ]),
-                html.Div(id='user-management-results-modal', className="mt-3")
-            ]),
-            dbc.ModalFooter(
-                dbc.Button("Close", id="close-user-modal", className="ms-auto")
-            )
-        ],
-        id="user-management-modal",
-        size="lg",
-        is_open=False
-    ),
+                        dcc.Graph(id='percentile-chart', figure=percentile_figure(),
+                                  config={'displayModeBar': False}),
+                        html.Div(id='percentile-table')
+                    ])
+                ], style=custom_styles['filter-card'])
+            ], md=5)
+        ]),
     
-    # User Management & Task Distribution Section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H4("User Management & Task Distribution", className="text-primary mb-0"),
-                    html.Small("Manage users and distribute tasks", className="text-muted")
-                ]),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            html.Label("Select Users", className="font-weight-bold mb-2"),
-                            dcc.Dropdown(
-                                id='select-users',
-                                multi=True,
-                                placeholder="Select User(s)",
-                                options=[{'label': user.name, 'value': username} for username, user in user_manager.users.items()],
-                                className="mb-3"
-                            )
-                        ], md=6),
-                        dbc.Col([
-                            html.Label("Distribute Tasks", className="font-weight-bold mb-2"),
-                            dbc.Button(
-                                html.Span([
-                                    html.I(className="fas fa-tasks me-2"),
-                                    "Distribute Tasks"
-                                ]),
-                                id='distribute-tasks',
-                                color="primary",
-                                className="me-2"
-                            )
-                        ], md=6)
-                    ]),
-                    html.Div(id='distribution-results', className="mt-3")
-                ])
-            ], style=custom_styles['filter-card'])
-        ])
-    ]),
+        # Metrics Row
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-exclamation-triangle fa-2x mb-2 text-danger"),
+                            html.H3(id='metric-super-angry', className="text-danger mb-1"),
+                            html.P("Super Angry Clients", className="text-muted mb-0")
+                        ], className="text-center")
+                    ])
+                ], style=custom_styles['metric-card'])
+            ], md=4),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-passport fa-2x mb-2 text-warning"),
+                            html.H3(id='metric-prioritize-visa', className="text-warning mb-1"),
+                            html.P("Priority Visa Cases", className="text-muted mb-0")
+                        ], className="text-center")
+                    ])
+                ], style=custom_styles['metric-card'])
+            ], md=4),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-clock fa-2x mb-2 text-info"),
+                            html.H3(id='metric-total-late', className="text-info mb-1"),
+                            html.P("Total Late Cases", className="text-muted mb-0")
+                        ], className="text-center")
+                    ])
+                ], style=custom_styles['metric-card'])
+            ], md=4)
+        ], className="mb-4"),
     
-    # Filters Section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader(html.H4("Filters", className="text-primary mb-0")),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            html.Label("Stage", className="font-weight-bold mb-2"),
-                            dcc.Dropdown(
-                                id='filter-stage',
-                                multi=True,
-                                placeholder="Select Stage(s)",
-                                className="mb-3"
-                            )
-                        ], md=3),
-                        dbc.Col([
-                            html.Label("Type", className="font-weight-bold mb-2"),
-                            dcc.Dropdown(
-                                id='filter-type',
-                                multi=True,
-                                placeholder="Select Type(s)",
-                                className="mb-3"
-                            )
-                        ], md=3),
-                        dbc.Col([
-                            html.Label("Nationality", className="font-weight-bold mb-2"),
-                            dcc.Dropdown(
-                                id='filter-nationality',
-                                multi=True,
-                                placeholder="Select Nationality(s)",
-                                className="mb-3"
-                            )
-                        ], md=3),
-                        dbc.Col([
-                            html.Label("Client Priority", className="font-weight-bold mb-2"),
-                            dcc.Dropdown(
-                                id='filter-client-note',
-                                multi=True,
-                                placeholder="Select Priority",
-                                className="mb-3"
-                            )
-                        ], md=3)
+        # Change Since Last Upload Row
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-arrow-trend-up fa-2x mb-2 text-danger"),
+                            html.H3("-", id='metric-newly-late', className="text-danger mb-1"),
+                            html.P("Newly Late Since Last Upload", className="text-muted mb-0")
+                        ], className="text-center")
                     ])
-                ])
-            ], style=custom_styles['filter-card'])
-        ])
-    ]),
+                ], style=custom_styles['metric-card'])
+            ], md=4),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-hourglass-half fa-2x mb-2 text-warning"),
+                            html.H3("-", id='metric-still-late', className="text-warning mb-1"),
+                            html.P("Still Late", className="text-muted mb-0")
+                        ], className="text-center")
+                    ])
+                ], style=custom_styles['metric-card'])
+            ], md=4),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-check-circle fa-2x mb-2 text-success"),
+                            html.H3("-", id='metric-resolved', className="text-success mb-1"),
+                            html.P("Resolved Since Last Upload", className="text-muted mb-0")
+                        ], className="text-center")
+                    ])
+                ], style=custom_styles['metric-card'])
+            ], md=4)
+        ], className="mb-4"),
     
-    # Stage Thresholds Section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H4("Stage Thresholds (Hours)", className="text-primary mb-0"),
-                    html.Small("Set maximum allowed hours for each stage", 
-                             className="text-muted")
-                ]),
-                dbc.CardBody([
-                    html.Div(id='threshold-inputs', style={
-                        'max-height': '300px',
-                        'overflow-y': 'auto',
-                        'padding': '10px'
-                    }),
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Button(
-                                html.Span([
-                                    html.I(className="fas fa-filter me-2"),
-                                    "Apply Filters & Thresholds"
-                                ]),
-                                id='apply-filters',
-                                color="primary",
-                                className="me-2"
+        # Breach Forecast Row
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.Div([
+                            html.I(className="fas fa-stopwatch fa-2x mb-2 text-primary"),
+                            html.H3("-", id='metric-breaching', className="text-primary mb-1"),
+                            html.P("Cases Breaching Within", className="text-muted mb-2"),
+                            dbc.RadioItems(
+                                id='forecast-horizon',
+                                options=[{'label': f"{h}h", 'value': h} for h in FORECAST_HORIZONS],
+                                value=FORECAST_HORIZONS[0],
+                                inline=True
                             ),
-                            dbc.Button(
-                                html.Span([
-                                    html.I(className="fas fa-undo me-2"),
-                                    "Reset"
-                                ]),
-                                id='reset-filters',
-                                color="secondary"
-                            )
-                        ], className="text-end mt-3")
+                            html.Small(id='forecast-as-of', className="text-muted")
+                        ], className="text-center")
                     ])
-                ])
-            ], style=custom_styles['filter-card'])
-        ])
-    ]),
+                ], style=custom_styles['metric-card'])
+            ], md=4),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("Next to Breach", className="text-primary mb-0"),
+                        html.Small("Open cases not late in the export; breached since the export first, then soonest breach",
+                                 className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        html.Div(id='forecast-table')
+                    ])
+                ], style=custom_styles['chart-card'])
+            ], md=8)
+        ], className="mb-4"),
     
-    # Metrics Row
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.Div([
-                        html.I(className="fas fa-exclamation-triangle fa-2x mb-2 text-danger"),
-                        html.H3(id='metric-super-angry', className="text-danger mb-1"),
-                        html.P("Super Angry Clients", className="text-muted mb-0")
-                    ], className="text-center")
-                ])
-            ], style=custom_styles['metric-card'])
-        ], md=4),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.Div([
-                        html.I(className="fas fa-passport fa-2x mb-2 text-warning"),
-                        html.H3(id='metric-prioritize-visa', className="text-warning mb-1"),
-                        html.P("Priority Visa Cases", className="text-muted mb-0")
-                    ], className="text-center")
-                ])
-            ], style=custom_styles['metric-card'])
-        ], md=4),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.Div([
-                        html.I(className="fas fa-clock fa-2x mb-2 text-info"),
-                        html.H3(id='metric-total-late', className="text-info mb-1"),
-                        html.P("Total Late Cases", className="text-muted mb-0")
-                    ], className="text-center")
-                ])
-            ], style=custom_styles['metric-card'])
-        ], md=4)
-    ], className="mb-4"),
+        # Charts Section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("Late Cases by Stage (Top 10)", className="text-primary mb-0"),
+                        html.Small("Number of cases exceeding threshold per stage", 
+                                 className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        dcc.Graph(id='bar-chart', figure=bar_figure())
+                    ])
+                ], style=custom_styles['chart-card'])
+            ], md=12)
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        dbc.Row([
+                            dbc.Col([
+                                html.H4("Late Trend", className="text-primary mb-0"),
+                                html.Small("Late housemaids per day from the upload archive",
+                                         className="text-muted")
+                            ]),
+                            dbc.Col([
+                                dbc.RadioItems(
+                                    id='trend-days',
+                                    options=[{'label': f"{d} days", 'value': d} for d in [30, 90, 180]],
+                                    value=90,
+                                    inline=True,
+                                    className="me-3"
+                                ),
+                                dcc.Dropdown(
+                                    id='trend-split',
+                                    options=[{'label': 'All cases', 'value': 'all'}] + [
+                                        {'label': f"By {name}", 'value': name} for name in TREND_DIMENSIONS
+                                    ],
+                                    value='all',
+                                    clearable=False,
+                                    style={'minWidth': '180px'}
+                                )
+                            ], className="d-flex align-items-center justify-content-end")
+                        ])
+                    ]),
+                    dbc.CardBody([
+                        dcc.Graph(id='trend-chart', figure=trend_figure())
+                    ])
+                ], style=custom_styles['chart-card'])
+            ], md=12)
+        ]),
     
-    # Charts Section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H4("Late Cases by Stage (Top 10)", className="text-primary mb-0"),
-                    html.Small("Number of cases exceeding threshold per stage", 
-                             className="text-muted")
-                ]),
-                dbc.CardBody([
-                    dcc.Graph(id='bar-chart')
-                ])
-            ], style=custom_styles['chart-card'])
-        ], md=12)
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H4("Stage Distribution (Top 10)", className="text-primary mb-0"),
-                    html.Small("Current distribution of all cases", 
-                             className="text-muted")
-                ]),
-                dbc.CardBody([
-                    dcc.Graph(id='pie-chart')
-                ])
-            ], style=custom_styles['chart-card'])
-        ], md=12)
-    ]),
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("Stage Distribution (Top 10)", className="text-primary mb-0"),
+                        html.Small("Current distribution of all cases", 
+                                 className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        dcc.Graph(id='pie-chart', figure=pie_figure())
+                    ])
+                ], style=custom_styles['chart-card'])
+            ], md=12)
+        ]),
     
-    # Data Table Section
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardHeader([
-                    dbc.Row([
-                        dbc.Col([
-                            html.H4("Detailed Data", className="text-primary mb-0"),
-                            html.Small("Full dataset with filtering and sorting", 
-                                     className="text-muted")
-                        ]),
-                        dbc.Col([
-                            dbc.Button(
-                                html.Span([
-                                    html.I(className="fas fa-file-csv me-2"),
-                                    "Export CSV"
-                                ]),
-                                id="export-csv",
-                                color="success",
-                                size="sm",
-                                className="me-2"
-                            ),
-                            dbc.Button(
-                                html.Span([
-                                    html.I(className="fas fa-file-excel me-2"),
-                                    "Export Excel"
-                                ]),
-                                id="export-excel",
-                                color="success",
-                                size="sm"
-                            )
-                        ], className="text-end d-flex align-items-center")
+        # Global search over every row of the dataset, not just the late rows in the table
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        html.H4("Search", className="text-primary mb-0"),
+                        html.Small("Find a housemaid by name, housemaid ID or request ID",
+                                 className="text-muted")
+                    ]),
+                    dbc.CardBody([
+                        dbc.Input(
+                            id='search-query',
+                            type='search',
+                            debounce=True,
+                            placeholder="e.g. Maria, 104567 or 5000123",
+                            className="mb-2"
+                        ),
+                        html.Div(id='search-results')
                     ])
-                ]),
-                dbc.CardBody([
-                    html.Div(id='data-table')
+                ], style=custom_styles['chart-card'])
+            ], md=12)
+        ]),
+    
+        # Data Table Section
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader([
+                        dbc.Row([
+                            dbc.Col([
+                                html.H4("Detailed Data", className="text-primary mb-0"),
+                                html.Small("Full dataset with filtering and sorting", 
+                                         className="text-muted")
+                            ]),
+                            dbc.Col([
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-file-csv me-2"),
+                                        "Export CSV"
+                                    ]),
+                                    id="export-csv",
+                                    color="success",
+                                    size="sm",
+                                    className="me-2"
+                                ),
+                                dbc.Button(
+                                    html.Span([
+                                        html.I(className="fas fa-file-excel me-2"),
+                                        "Export Excel"
+                                    ]),
+                                    id="export-excel",
+                                    color="success",
+                                    size="sm"
+                                )
+                            ], className="text-end d-flex align-items-center")
+                        ])
+                    ]),
+                    dbc.CardBody([
+                        html.Small("Click a row to see that housemaid's full note history.", className="text-muted"),
+                        html.Div(id='data-table')
+                    ])
+                ], style=custom_styles['chart-card'])
+            ])
+        ]),
+
+        # Case-history drilldown for the housemaid of the clicked table row
+        dbc.Modal(
+            [
+                dbc.ModalHeader(dbc.ModalTitle(id='drilldown-title')),
+                dbc.ModalBody([
+                    dcc.Graph(id='drilldown-timeline', config={'displayModeBar': False}),
+                    html.Div(id='drilldown-table', className="mt-3")
                 ])
-            ], style=custom_styles['chart-card'])
-        ])
-    ]),
+            ],
+            id="drilldown-modal",
+            size="xl",
+            is_open=False
+        ),
     
-    # Hidden download components
-    html.Div([
-        html.A(id='download-csv', download="filtered_data.csv", href="", target="_blank", style={'display': 'none'}),
-        html.A(id='download-excel', download="filtered_data.xlsx", href="", target="_blank", style={'display': 'none'})
-    ])
-], fluid=True)
+        # Hidden download components
+        html.Div([
+            html.A(id='download-csv', download="filtered_data.csv", href="", target="_blank", style={'display': 'none'}),
+            html.A(id='download-excel', download="filtered_data.xlsx", href="", target="_blank", style={'display': 'none'})
+        ])
+    ], fluid=True)
+
+app.layout = serve_layout
+# The detailed table ('datatable') is rendered by a callback, yet drives the drilldown
+app.validation_layout = html.Div([serve_layout(), dash_table.DataTable(id='datatable')])
 # Helper functions
-def get_sorted_unique(series: pd.Series) -> List[str]:
-    """Get sorted unique values from a series, handling mixed types and NaN values."""
-    unique_values = [str(x) for x in series.unique() if pd.notna(x)]
-    return sorted(unique_values)
+EXPIRED_MESSAGE = "This dataset is no longer on the server (it expired or was evicted). Please re-upload the file."
+THRESHOLDS_LOST_MESSAGE = ("Your threshold edits are no longer on the server; stage thresholds now come from the "
+                           "threshold rules. Re-enter any custom thresholds.")
 
-def parse_contents(contents: str, filename: str) -> pd.DataFrame:
-    """Parse uploaded file contents into a pandas DataFrame."""
-    if contents is None:
+def dataset_expired(dataset_ref: Optional[Dict[str, Any]]) -> bool:
+    """True when the browser references a dataset the server no longer holds."""
+    return bool((dataset_ref or {}).get('id')) and dataset_store.get(dataset_ref['id']) is None
+
+def load_dataset(dataset_ref: Dict[str, Any]) -> pd.DataFrame:
+    """Return the cached DataFrame referenced by the dataset store, or an empty frame."""
+    dataset = dataset_store.get((dataset_ref or {}).get('id'))
+    if dataset is None:
         return pd.DataFrame()
+    return dataset.df
+
+def threshold_rows(stages: List[str]) -> List[Dict[str, Any]]:
+    """Threshold editor rows for the given stages, starting from the active rules."""
+    return [{'stage': stage, 'hours': rule_store.table.stage_default(stage)} for stage in stages]
+
+def filter_option_lists(dataset) -> List[List[Dict[str, str]]]:
+    """Dropdown options for the stage, type, nationality and client note filters."""
+    options = dataset.filter_options()
+    return [
+        [{'label': value, 'value': value} for value in options[name]]
+        for name in ('stage', 'type', 'nationality', 'client_note')
+    ]
+
+def distribution_cases(dataset_ref, stages, types, nationalities, client_notes, changes,
+                       session_id, threshold_set, preemptive=False, horizon=None):
+    """Rows to hand out to agents, in urgency order, and how many rows were skipped as already done."""
+    # Filter only late cases, reusing the memoized view when the dashboard already built it
+    fspec = filter_spec(dataset_ref, session_id, stages, types, nationalities, client_notes, changes)
+    lspec = late_spec(fspec, threshold_set)
+    late_cases_df = late_frame(lspec, late_only=True)
+    if preemptive and horizon:
+        # Soonest breaches follow the late cases, so they are split in urgency order too
+        forecast = breach_forecast(lspec)
+        upcoming = late_frame(lspec).take(forecast.within(horizon))
+        upcoming = upcoming.assign(**{'Hours To Breach': forecast.hours_left[:len(upcoming)].round(1)})
+        late_cases_df = pd.concat([late_cases_df, upcoming])
     
-    try:
-        # Split the content
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        
-        # Read the file based on its type
-        if 'csv' in filename.lower():
-            df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-        elif 'xls' in filename.lower():
-            df = pd.read_excel(io.BytesIO(decoded))
-        else:
-            raise ValueError("Unsupported file type")
-        
-        # Clean up the DataFrame
-        df = df.replace({pd.NA: None, pd.NaT: None})
-        
-        # Sort the DataFrame by 'Note time' and 'RPA try count' to ensure proper filling
-        df = df.sort_values(by=['Note time', 'RPA try count'])
-        
-        # List of columns to forward-fill
-        columns_to_fill = [
-            'Housemaid Name', 'Housemaid ID', 'HM Status', 
-            'Request ID MB', 'Nationality', 'Type'
-        ]
-        
-        # Forward-fill the specified columns
-        for column in columns_to_fill:
-            if column in df.columns:
-                df[column] = df[column].ffill()
-        
-        # Add Late column if not exists
-        if 'Late' not in df.columns:
-            df['Late'] = False
-            
-        return df
-    except Exception as e:
-        print(f"Error parsing file: {str(e)}")
-        return pd.DataFrame()
+    # Cases an agent has marked done at their current stage (recorded in the done ledger) are not handed out again
+    late_cases_df, skipped = without_done(late_cases_df)
+    return late_cases_df, skipped
+
+def ingest_watched_file(path: str, record: bool = True):
+    """Parse a file from the watched directory into the shared watched dataset.
+
+    Only one worker records the file's dwell sketch and archive rollups (record=True),
+    so workers that each keep their own copy of the dataset do not count it N times.
+    """
+    df = parse_file(path)
+    if df.empty:
+        return
+    if dataset_store.get(WATCHED_DATASET_ID) is None:
+        dataset_store.create(df, dataset_id=WATCHED_DATASET_ID, pinned=True)
+    else:
+        dataset_store.append(WATCHED_DATASET_ID, df)
+    warm_indexes(dataset_store.get(WATCHED_DATASET_ID))
+    if record:
+        sketch_store.record(os.path.basename(path), df)
+        upload_archive.write(df)
+    print(f"Ingested {os.path.basename(path)} from watched directory")
+
 # Callback to update filters and thresholds
 @app.callback(
-    [Output('filter-stage', 'options'),
+    [Output('dataset-store', 'data'),
+     Output('filter-stage', 'options'),
      Output('filter-type', 'options'),
      Output('filter-nationality', 'options'),
      Output('filter-client-note', 'options'),
-     Output('threshold-inputs', 'children')],
+     Output('threshold-table', 'data'),
+     Output('threshold-set', 'data'),
+     Output('upload-status', 'children'),
+     Output('session-id', 'data'),
+     Output('metric-newly-late', 'children'),
+     Output('metric-still-late', 'children'),
+     Output('metric-resolved', 'children')],
     Input('upload-data', 'contents'),
-    State('upload-data', 'filename')
+    [State('upload-data', 'filename'),
+     State('append-mode', 'value'),
+     State('dataset-store', 'data'),
+     State('session-id', 'data'),
+     State('threshold-set', 'data')]
 )
-def update_filters_and_thresholds(contents: str, filename: str):
-    """Update filter options and threshold inputs based on uploaded data."""
+def update_filters_and_thresholds(contents, filenames, append_mode, dataset_ref, session_id,
+                                  threshold_set):
+    """Ingest uploaded file(s) and update filter options and the threshold editor."""
     if contents is None:
-        return [], [], [], [], []
+        return None, [], [], [], [], [], None, None, dash.no_update, "-", "-", "-"
+    if isinstance(contents, str):
+        contents, filenames = [contents], [filenames]
     
-    # Parse the uploaded file
-    df = parse_contents(contents, filename)
-    if df.empty:
-        return [], [], [], [], []
+    # Check each file's header before parsing it, and skip the ones that fail either step
+    parsed, rejected = [], []
+    for c, f in zip(contents, filenames):
+        try:
+            decoded = decode_contents(c)
+            upload = sniff_upload(decoded, f)
+        except ValueError as e:
+            rejected.append(f"{f}: {str(e)}")
+            continue
+        parsed.append((parse_bytes(decoded, f, upload), f))
+    rejected += [f"{f}: no rows could be parsed" for df, f in parsed if df.empty]
+    parsed = [(df, f) for df, f in parsed if not df.empty]
+    frames = [df for df, _ in parsed]
+    if not frames:
+        message = ["Uploaded file is empty or invalid."] + [html.Div(reason) for reason in rejected]
+        return (dash.no_update,) * 7 + (dbc.Alert(message, color="danger"),) + (dash.no_update,) * 4
     
-    # Get unique values for filters
-    stages = [{'label': stage, 'value': stage} for stage in get_sorted_unique(df['Current Stage'])]
-    types = [{'label': type_, 'value': type_} for type_ in get_sorted_unique(df['Type'])]
-    nationalities = [{'label': nat, 'value': nat} for nat in get_sorted_unique(df['Nationality'])]
-    client_notes = [{'label': note, 'value': note} for note in get_sorted_unique(df['Client Note'])]
+    current = dataset_store.get((dataset_ref or {}).get('id')) if append_mode else None
+    append_refused = current is not None and current.pinned
+    if append_refused:
+        # The watched dataset is shared by every session; an upload must not merge into it
+        current = None
+    if current is not None:
+        try:
+            merges = [dataset_store.append(current.dataset_id, df) for df in frames]
+        except DatasetExpired:
+            # Evicted since the lookup above; the files start a new dataset instead
+            current = None
+    if current is None:
+        # Replace mode: the first file seeds a new dataset, the rest merge into it
+        dataset = dataset_store.create(frames[0])
+        seeded = len(dataset.df)
+        merges = [dataset_store.append(dataset.dataset_id, df) for df in frames[1:]]
+        threshold_data = threshold_rows(dataset.stages)
+        threshold_set = threshold_sets.create({row['stage']: row['hours'] for row in threshold_data})
+    else:
+        dataset = current
+        seeded = 0
+        # Only add rows for stages not seen before, keeping edited values intact
+        new_rows = threshold_rows([stage for merge in merges for stage in merge.new_stages])
+        threshold_data = Patch()
+        threshold_data.extend(new_rows)
+        threshold_set = threshold_sets.update(
+            threshold_set, {row['stage']: row['hours'] for row in new_rows}, only_missing=True
+        )
     
-    # Create threshold inputs for each stage
-    threshold_inputs = []
-    for stage in get_sorted_unique(df['Current Stage']):
-        threshold_inputs.append(
-            dbc.Card([
-                dbc.Row([
-                    dbc.Col(html.Label(stage, className="font-weight-bold"), width=8),
-                    dbc.Col(
-                        dbc.Input(
-                            id={'type': 'threshold-input', 'stage': stage},
-                            type='number',
-                            value=24,
-                            min=0,
-                            className="form-control-sm"
-                        ),
-                        width=4
-                    )
-                ], className="align-items-center")
-            ], className="mb-2", style=custom_styles['threshold-card'])
+    warm_indexes(dataset)
+    for df, filename in parsed:
+        sketch_store.record(filename, df)
+        upload_archive.write(df)
+    
+    # Compare late housemaids against the previous upload of this session
+    session_id = session_id or uuid.uuid4().hex
+    threshold_dict = threshold_sets.get(threshold_set)
+    snapshot = build_snapshot(dataset.df, late_flags(dataset.df, threshold_dict, rules=rule_store.table))
+    delta = snapshot_store.record(session_id, snapshot)
+    if delta is None:
+        change_counts = ["-", "-", "-"]
+    else:
+        change_counts = [str(len(delta[change])) for change in CHANGE_LABELS]
+    
+    status = dbc.Alert(
+        f"{len(dataset.df):,} rows across {len(dataset.stage_counts)} stages "
+        f"({seeded + sum(m.added for m in merges):,} rows added, "
+        f"{sum(m.replaced for m in merges):,} superseded, "
+        f"{sum(m.duplicates for m in merges):,} duplicates dropped).",
+        color="info", className="mb-0 py-2"
+    )
+    if rejected:
+        status = html.Div([status, dbc.Alert(["Skipped:"] + [html.Div(reason) for reason in rejected],
+                                             color="warning", className="mb-0 mt-2 py-2")])
+    if append_refused:
+        status = html.Div([status, dbc.Alert("The watched directory's dataset is shared by everyone, so the "
+                                             "upload started a new dataset instead of appending to it.",
+                                             color="warning", className="mb-0 mt-2 py-2")])
+    
+    return (
+        {'id': dataset.dataset_id, 'version': dataset.version},
+        *filter_option_lists(dataset),
+        threshold_data,
+        threshold_set,
+        status,
+        session_id,
+        *change_counts
+    )
+# Callback to pick up the shared dataset built from the watched directory
+@app.callback(
+    [Output('dataset-store', 'data', allow_duplicate=True),
+     Output('filter-stage', 'options', allow_duplicate=True),
+     Output('filter-type', 'options', allow_duplicate=True),
+     Output('filter-nationality', 'options', allow_duplicate=True),
+     Output('filter-client-note', 'options', allow_duplicate=True),
+     Output('threshold-table', 'data', allow_duplicate=True),
+     Output('threshold-set', 'data', allow_duplicate=True),
+     Output('upload-status', 'children', allow_duplicate=True),
+     Output('watch-version', 'data')],
+    Input('watch-poll', 'n_intervals'),
+    [State('dataset-store', 'data'),
+     State('watch-version', 'data'),
+     State('threshold-set', 'data')],
+    prevent_initial_call=True
+)
+def refresh_watched_dataset(n_intervals, dataset_ref, seen_version, threshold_set):
+    """Send the watched dataset to the browser only when its version has changed."""
+    dataset_ref = dataset_ref or {}
+    if dataset_ref.get('id') not in (None, WATCHED_DATASET_ID):
+        # The session works on its own upload; the watched dataset must not replace it
+        raise dash.exceptions.PreventUpdate
+    dataset = dataset_store.get(WATCHED_DATASET_ID)
+    if dataset is None or dataset.version == seen_version:
+        raise dash.exceptions.PreventUpdate
+    
+    if dataset_ref.get('id') == WATCHED_DATASET_ID:
+        # Same dataset, newer version: only add rows for new stages
+        new_rows = threshold_rows(dataset.stages_since(dataset_ref.get('version') or 0))
+        threshold_data = Patch()
+        threshold_data.extend(new_rows)
+        threshold_set = threshold_sets.update(
+            threshold_set, {row['stage']: row['hours'] for row in new_rows}, only_missing=True
         )
+    else:
+        threshold_data = threshold_rows(dataset.stages)
+        threshold_set = threshold_sets.create({row['stage']: row['hours'] for row in threshold_data})
     
-    return stages, types, nationalities, client_notes, threshold_inputs
+    status = dbc.Alert(
+        f"Watched directory refreshed: {len(dataset.df):,} rows across "
+        f"{len(dataset.stage_counts)} stages (version {dataset.version}).",
+        color="info", className="mb-0 py-2"
+    )
+    return (
+        {'id': dataset.dataset_id, 'version': dataset.version},
+        *filter_option_lists(dataset),
+        threshold_data,
+        threshold_set,
+        status,
+        dataset.version
+    )
+# Callback to store threshold edits on the server
+@app.callback(
+    Output('threshold-set', 'data', allow_duplicate=True),
+    Input('threshold-table', 'data_timestamp'),
+    [State('threshold-table', 'data'),
+     State('threshold-table', 'data_previous'),
+     State('threshold-set', 'data')],
+    prevent_initial_call=True
+)
+def save_threshold_edits(data_timestamp, rows, previous_rows, threshold_set):
+    """Send only the edited stage thresholds to the server-side threshold set."""
+    previous = {row['stage']: row.get('hours') for row in (previous_rows or [])}
+    changes = {}
+    for row in rows or []:
+        hours = row.get('hours')
+        if previous_rows is not None and previous.get(row['stage']) == hours:
+            continue
+        try:
+            hours = None if hours in (None, '') else float(hours)
+        except (TypeError, ValueError):
+            continue
+        if hours is not None and hours < 0:
+            continue
+        changes[row['stage']] = hours
+    if not changes:
+        raise dash.exceptions.PreventUpdate
+    return threshold_sets.update(threshold_set, changes)
+
+# Callback to import threshold rules
+@app.callback(
+    Output('rules-status', 'children'),
+    Input('upload-rules', 'contents'),
+    State('upload-rules', 'filename'),
+    prevent_initial_call=True
+)
+def import_rules(contents, filename):
+    """Replace the active threshold rules with an uploaded JSON/CSV rule file."""
+    try:
+        content_type, content_string = contents.split(',')
+        table = RuleTable.from_bytes(base64.b64decode(content_string), filename)
+    except Exception as e:
+        return dbc.Alert(f"Could not read rules from {filename}: {str(e)}", color="danger", className="mb-0 py-2")
+    rule_store.replace(table)
+    return rules_summary(table) + " New threshold rows start from these rules."
+
+# Callback to export threshold rules
+@app.callback(
+    Output('download-rules', 'data'),
+    Input('export-rules', 'n_clicks'),
+    prevent_initial_call=True
+)
+def export_rules(n_clicks):
+    """Download the active threshold rules as JSON."""
+    return dcc.send_string(rule_store.table.to_json(), "threshold_rules.json")
 # Callback to populate the user table
 @app.callback(
     Output('user-table', 'data'),
@@ -969,233 +1462,412 @@ def delete_user(n_clicks, username):
     Output('distribution-results', 'children'),
     Input('distribute-tasks', 'n_clicks'),
     State('select-users', 'value'),
-    State('upload-data', 'contents'),
-    State('upload-data', 'filename'),
+    State('dataset-store', 'data'),
     State('filter-stage', 'value'),
     State('filter-type', 'value'),
     State('filter-nationality', 'value'),
     State('filter-client-note', 'value'),
-    State({'type': 'threshold-input', 'stage': dash.ALL}, 'value'),
-    State({'type': 'threshold-input', 'stage': dash.ALL}, 'id'),
+    State('filter-change', 'value'),
+    State('session-id', 'data'),
+    State('threshold-set', 'data'),
+    State('distribute-preemptive', 'value'),
+    State('forecast-horizon', 'value'),
     prevent_initial_call=True
 )
-def distribute_tasks(n_clicks, selected_users, contents, filename, stages, types, 
-                     nationalities, client_notes, thresholds, threshold_ids):
-    """Distribute filtered tasks to selected users' Google Sheets."""
-    if not selected_users or not contents:
+def distribute_tasks(n_clicks, selected_users, dataset_ref, stages, types, 
+                     nationalities, client_notes, changes, session_id, threshold_set,
+                     preemptive=False, horizon=None):
+    """Distribute filtered tasks to selected users' Google Sheets, optionally with soon-to-breach cases."""
+    if not selected_users or not dataset_ref:
         return dbc.Alert("No users selected or no data uploaded.", color="warning")
     
-    # Parse the uploaded file
-    df = parse_contents(contents, filename)
+    # Look up the uploaded dataset
+    if dataset_expired(dataset_ref):
+        return dbc.Alert(EXPIRED_MESSAGE, color="warning")
+    df = load_dataset(dataset_ref)
     if df.empty:
         return dbc.Alert("Uploaded file is empty or invalid.", color="danger")
     
-    # Apply filters to create the filtered DataFrame
-    filtered_df = df.copy()
-    
-    if stages:
-        filtered_df = filtered_df[filtered_df['Current Stage'].isin(stages)]
-    if types:
-        filtered_df = filtered_df[filtered_df['Type'].isin(types)]
-    if nationalities:
-        filtered_df = filtered_df[filtered_df['Nationality'].isin(nationalities)]
-    if client_notes:
-        filtered_df = filtered_df[filtered_df['Client Note'].isin(client_notes)]
-    
-    # Apply thresholds
-    threshold_dict = {
-        str(id_dict['stage']): threshold 
-        for threshold, id_dict in zip(thresholds, threshold_ids)
-    }
-    
-    # Calculate Late status
-    filtered_df['Late'] = filtered_df.apply(
-        lambda row: (pd.notna(row['Current Stage']) and 
-                    pd.notna(row['Time In Stage']) and 
-                    row['Time In Stage'] > threshold_dict.get(str(row['Current Stage']), 24)),
-        axis=1
-    )
-    
-    # Filter only late cases
-    late_cases_df = filtered_df[filtered_df['Late'] == True]
-    
+    # Read the sheets back first: distributing overwrites their Status column, so done marks
+    # made since the last progress refresh would otherwise be lost
+    refresh_done(user_manager)
+    late_cases_df, skipped = distribution_cases(dataset_ref, stages, types, nationalities, client_notes, changes,
+                                                session_id, threshold_set, preemptive, horizon)
     if late_cases_df.empty:
         return dbc.Alert("No late cases found to distribute.", color="warning")
     
-    # Replace NaN values with None (JSON-compatible)
-    late_cases_df = late_cases_df.where(pd.notna(late_cases_df), None)
-    
     # Distribute the filtered data evenly among selected users
     try:
-        num_users = len(selected_users)
-        chunk_size = len(late_cases_df) // num_users
-        remainder = len(late_cases_df) % num_users
-        
-        results = {}
-        start_idx = 0
-        for i, username in enumerate(selected_users):
-            if username not in user_manager.users:
-                results[username] = {"status": "error", "message": f"User {username} not found"}
-                continue
-            
-            # Calculate end index for this user
-            end_idx = start_idx + chunk_size + (1 if i < remainder else 0)
-            user_data = late_cases_df.iloc[start_idx:end_idx]
-            start_idx = end_idx
-            
-            # Update the user's Google Sheet
-            try:
-                sheet = user_manager.client.open_by_key(user_manager.users[username].google_sheet_id).sheet1
-                sheet.clear()
-                # Replace NaN values with empty strings for Google Sheets compatibility
-                user_data = user_data.where(pd.notna(user_data), "")
-                sheet.update([user_data.columns.values.tolist()] + user_data.values.tolist())
-                results[username] = {"status": "success", "message": f"Assigned {len(user_data)} late cases to {username}"}
-            except Exception as e:
-                results[username] = {"status": "error", "message": f"Failed to update sheet for {username}: {str(e)}"}
+        results = distribute_cases(
+            user_manager, selected_users, late_cases_df,
+            row_thresholds(late_cases_df, threshold_sets.get(threshold_set), rules=rule_store.table)
+        )
         
         # Display results
         messages = []
+        if skipped:
+            messages.append(dbc.Alert(f"Skipped {skipped} rows of cases already marked done by an agent.", color="info"))
         for username, result in results.items():
-            if result['status'] == 'success':
-                messages.append(dbc.Alert(result['message'], color="success"))
-            else:
-                messages.append(dbc.Alert(result['message'], color="danger"))
+            color = "success" if result['status'] == 'success' else "danger"
+            messages.append(dbc.Alert(result['message'], color=color))
         return html.Div(messages)
     except Exception as e:
         traceback.print_exc()
         return dbc.Alert(f"An error occurred during task distribution: {str(e)}", color="danger")
+
+# Callback for the offline per-agent bundle, split exactly as distribute_tasks splits
+@app.callback(
+    Output('bundle-results', 'children'),
+    Input('export-bundle', 'n_clicks'),
+    State('select-users', 'value'),
+    State('dataset-store', 'data'),
+    State('filter-stage', 'value'),
+    State('filter-type', 'value'),
+    State('filter-nationality', 'value'),
+    State('filter-client-note', 'value'),
+    State('filter-change', 'value'),
+    State('session-id', 'data'),
+    State('threshold-set', 'data'),
+    State('distribute-preemptive', 'value'),
+    State('forecast-horizon', 'value'),
+    prevent_initial_call=True
+)
+def export_bundle(n_clicks, selected_users, dataset_ref, stages, types,
+                  nationalities, client_notes, changes, session_id, threshold_set,
+                  preemptive=False, horizon=None):
+    """Write one workbook per selected agent plus a summary, and link the zip."""
+    if not selected_users or not dataset_ref:
+        return dbc.Alert("No users selected or no data uploaded.", color="warning")
+    if dataset_expired(dataset_ref):
+        return dbc.Alert(EXPIRED_MESSAGE, color="warning")
+    
+    late_cases_df, skipped = distribution_cases(dataset_ref, stages, types, nationalities, client_notes, changes,
+                                                session_id, threshold_set, preemptive, horizon)
+    if late_cases_df.empty:
+        return dbc.Alert("No late cases found to distribute.", color="warning")
+    
+    overdue = (pd.to_numeric(late_cases_df['Time In Stage'], errors='coerce').to_numpy(dtype='float64')
+               - row_thresholds(late_cases_df, threshold_sets.get(threshold_set), rules=rule_store.table))
+    late_cases_df = late_cases_df.astype(object).where(pd.notna(late_cases_df), None)
+    if STATUS_COLUMN not in late_cases_df.columns:
+        # Same columns as the sheets, so a bundle file can be pasted into a sheet later
+        late_cases_df = late_cases_df.assign(**{STATUS_COLUMN: ""})
+    
+    names = {username: user_manager.users[username].name if username in user_manager.users else username
+             for username in selected_users}
+    # Named by username: display names need not be unique
+    files = workbook_filenames(selected_users)
+    shares = split_evenly(late_cases_df.assign(**{OVERDUE_COLUMN: overdue}), len(selected_users))
+    chunks = {files[username]: share.drop(columns=OVERDUE_COLUMN) for username, share in zip(selected_users, shares)}
+    try:
+        token = bundle_builder.build(chunks, bundle_summary(chunks, {files[u]: names[u] for u in selected_users}))
+    except Exception as e:
+        traceback.print_exc()
+        return dbc.Alert(f"An error occurred while exporting the bundle: {str(e)}", color="danger")
     
-# Callback for metrics and visualizations
+    assignment_index.assign({username: AgentQueue.build(share, share[OVERDUE_COLUMN].to_numpy())
+                             for username, share in zip(selected_users, shares)})
+    messages = []
+    if skipped:
+        messages.append(dbc.Alert(f"Skipped {skipped} rows of cases already marked done by an agent.", color="info"))
+    messages.append(dbc.Alert([
+        f"Bundle ready: {len(late_cases_df)} rows for {len(selected_users)} agents. ",
+        html.A("Download zip", href=app.get_relative_path(f"/export/bundle/{token}"), className="alert-link")
+    ], color="success"))
+    return html.Div(messages)
+
+# Callback for the agent progress read-back
 @app.callback(
-    [Output('metric-super-angry', 'children'),
-     Output('metric-prioritize-visa', 'children'),
-     Output('metric-total-late', 'children'),
-     Output('bar-chart', 'figure'),
-     Output('pie-chart', 'figure'),
-     Output('data-table', 'children')],
+    Output('progress-results', 'children'),
+    Input('refresh-progress', 'n_clicks'),
+    State('late-spec', 'data'),
+    prevent_initial_call=True
+)
+def refresh_progress(n_clicks, lspec):
+    """Read every agent's sheet back and count done and pending cases against the current late set."""
+    try:
+        progress = completion_tracker.refresh(user_manager.client, user_manager.sheets())
+    except Exception as e:
+        return dbc.Alert(f"Could not read agent sheets: {str(e)}", color="danger")
+    late_requests = request_keys(late_frame(lspec, late_only=True)) if lspec else set()
+    names = {username: user.name for username, user in user_manager.users.items()}
+    return dash_table.DataTable(
+        columns=[
+            {'name': 'Agent', 'id': 'agent'},
+            {'name': 'Assigned', 'id': 'assigned', 'type': 'numeric'},
+            {'name': 'Done', 'id': 'done', 'type': 'numeric'},
+            {'name': 'Pending', 'id': 'pending', 'type': 'numeric'},
+            {'name': 'Pending & Still Late', 'id': 'pending_still_late', 'type': 'numeric'},
+            {'name': 'Sheet', 'id': 'status'}
+        ],
+        data=progress_table(progress, late_requests, names),
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'padding': '8px', 'fontSize': '13px'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'}
+    )
+
+# Callback for the agent queue, served from the local assignment index only
+@app.callback(
+    Output('queue-results', 'children'),
+    [Input('queue-agent', 'value'),
+     Input('distribution-results', 'children')]
+)
+def update_queue(username, distribution_results):
+    """Show one agent's assigned cases, or every agent's late count and oldest overdue case."""
+    names = {name: user.name for name, user in user_manager.users.items()}
+    table_style = dict(
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'padding': '8px', 'fontSize': '13px'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'}
+    )
+    if not username:
+        queues = assignment_index.summary()
+        if not queues:
+            return html.Small("No tasks distributed yet.", className="text-muted")
+        rows = [{
+            'agent': names.get(agent, agent),
+            'assigned_at': queue.assigned_at,
+            'cases': len(queue.cases),
+            'late': queue.late_count,
+            'oldest': queue.oldest_label
+        } for agent, queue in queues.items()]
+        return dash_table.DataTable(
+            columns=[
+                {'name': 'Agent', 'id': 'agent'},
+                {'name': 'Assigned At', 'id': 'assigned_at'},
+                {'name': 'Cases', 'id': 'cases', 'type': 'numeric'},
+                {'name': 'Late', 'id': 'late', 'type': 'numeric'},
+                {'name': 'Oldest Overdue', 'id': 'oldest'}
+            ],
+            data=rows,
+            **table_style
+        )
+    
+    queue = assignment_index.queue(username)
+    if queue is None:
+        return html.Small(f"Nothing distributed to {names.get(username, username)} yet.", className="text-muted")
+    header = html.Div([
+        html.Strong(f"{len(queue.cases)} cases, {queue.late_count} late"),
+        html.Span(f" \u2022 assigned {queue.assigned_at}", className="text-muted"),
+        html.Span(f" \u2022 oldest overdue: {queue.oldest_label}", className="text-muted")
+    ], className="mb-2")
+    return html.Div([header, dash_table.DataTable(
+        columns=[{"name": c, "id": c} for c in (queue.rows[0].keys() if queue.rows else [])],
+        data=queue.rows,
+        page_size=10,
+        sort_action='native',
+        **table_style
+    )])
+
+# Callback that turns Apply/Reset into view specs; panels recompute only when their spec changes
+@app.callback(
+    [Output('filter-spec', 'data'),
+     Output('late-spec', 'data')],
     [Input('apply-filters', 'n_clicks'),
      Input('reset-filters', 'n_clicks')],
-    [State('upload-data', 'contents'),
-     State('upload-data', 'filename'),
+    [State('dataset-store', 'data'),
      State('filter-stage', 'value'),
      State('filter-type', 'value'),
      State('filter-nationality', 'value'),
      State('filter-client-note', 'value'),
-     State({'type': 'threshold-input', 'stage': dash.ALL}, 'value'),
-     State({'type': 'threshold-input', 'stage': dash.ALL}, 'id')]
+     State('filter-change', 'value'),
+     State('session-id', 'data'),
+     State('threshold-set', 'data'),
+     State('filter-spec', 'data'),
+     State('late-spec', 'data')]
 )
-def update_dashboard(apply_clicks, reset_clicks, contents, filename, stages, types, 
-                    nationalities, client_notes, thresholds, threshold_ids):
-    """Update all dashboard components based on filters and thresholds."""
-    if contents is None:
-        return "0", "0", "0", {}, {}, []
-    
-    # Parse the uploaded file
-    df = parse_contents(contents, filename)
-    if df.empty:
-        return "0", "0", "0", {}, {}, []
-        
-    filtered_df = df.copy()
-    
+def update_view_specs(apply_clicks, reset_clicks, dataset_ref, stages, types, nationalities,
+                      client_notes, changes, session_id, threshold_set, current_filter, current_late):
+    """Describe the requested view; unchanged specs are not resent so dependent panels stay idle."""
     # Reset filters if reset button is clicked
-    if reset_clicks and reset_clicks > (apply_clicks or 0):
-        stages, types, nationalities, client_notes = None, None, None, None
+    if dash.ctx.triggered_id == 'reset-filters':
+        stages, types, nationalities, client_notes, changes = None, None, None, None, None
     
-    # Apply filters
-    if stages:
-        filtered_df = filtered_df[filtered_df['Current Stage'].isin(stages)]
-    if types:
-        filtered_df = filtered_df[filtered_df['Type'].isin(types)]
-    if nationalities:
-        filtered_df = filtered_df[filtered_df['Nationality'].isin(nationalities)]
-    if client_notes:
-        filtered_df = filtered_df[filtered_df['Client Note'].isin(client_notes)]
-    
-    # Create threshold dictionary
-    threshold_dict = {
-        str(id_dict['stage']): threshold 
-        for threshold, id_dict in zip(thresholds, threshold_ids)
-    }
-    
-    # Apply thresholds and calculate Late status
-    filtered_df['Late'] = filtered_df.apply(
-        lambda row: (pd.notna(row['Current Stage']) and 
-                    pd.notna(row['Time In Stage']) and 
-                    row['Time In Stage'] > threshold_dict.get(str(row['Current Stage']), 24)),
-        axis=1
+    fspec = filter_spec(dataset_ref, session_id, stages, types, nationalities, client_notes, changes)
+    lspec = late_spec(fspec, threshold_set)
+    return (
+        dash.no_update if fspec == current_filter else fspec,
+        dash.no_update if lspec == current_late else lspec
     )
+
+# Callback that explains an empty dashboard or reset thresholds when server-side state is gone
+@app.callback(
+    Output('upload-status', 'children', allow_duplicate=True),
+    [Input('late-spec', 'data'),
+     Input('dataset-store', 'data')],
+    prevent_initial_call=True
+)
+def check_dataset(lspec, dataset_ref):
+    """Replace the upload status with a prompt when the dataset or threshold set has expired."""
+    if dataset_expired(dataset_ref):
+        return dbc.Alert(EXPIRED_MESSAGE, color="warning", className="mb-0 py-2")
+    if lspec is not None and not threshold_sets.exists(lspec['thresholds']):
+        return dbc.Alert(THRESHOLDS_LOST_MESSAGE, color="warning", className="mb-0 py-2")
+    return dash.no_update
+
+# Callback for the metric cards
+@app.callback(
+    [Output('metric-super-angry', 'children'),
+     Output('metric-prioritize-visa', 'children'),
+     Output('metric-total-late', 'children')],
+    Input('late-spec', 'data')
+)
+def update_metrics(lspec):
+    """Distinct housemaids per priority note and late housemaids in the current view."""
+    if lspec is None:
+        return "0", "0", "0"
     
-    # Calculate metrics
-    super_angry = filtered_df[filtered_df['Client Note'] == 'SUPER_ANGRY_CLIENT']['Housemaid Name'].drop_duplicates().shape[0]
-    prioritize_visa = filtered_df[filtered_df['Client Note'] == 'PRIORITIZE_VISA']['Housemaid Name'].drop_duplicates().shape[0]
-    total_late = filtered_df[filtered_df['Late'] == True]['Housemaid Name'].drop_duplicates().shape[0]
+    def note_counts():
+        filtered_df = filtered_frame(lspec['filter'])
+        if filtered_df.empty:
+            return 0, 0
+        super_angry = filtered_df[filtered_df['Client Note'] == 'SUPER_ANGRY_CLIENT']['Housemaid Name'].drop_duplicates().shape[0]
+        prioritize_visa = filtered_df[filtered_df['Client Note'] == 'PRIORITIZE_VISA']['Housemaid Name'].drop_duplicates().shape[0]
+        return super_angry, prioritize_visa
     
-    # Create bar chart for late cases (Top 10)
-    late_cases = filtered_df[filtered_df['Late'] == True]
-    stage_counts = late_cases.groupby('Current Stage')['Housemaid Name'].nunique().reset_index(name='Count')
-    stage_counts = stage_counts.sort_values(by='Count', ascending=False).head(10)  # Top 10
-
+    def late_count():
+        late_cases = late_frame(lspec, late_only=True)
+        return 0 if late_cases.empty else late_cases['Housemaid Name'].drop_duplicates().shape[0]
     
-    bar_fig = go.Figure(data=[
-        go.Bar(
-            x=stage_counts['Count'],
-            y=stage_counts['Current Stage'],
-            orientation='h',
-            text=stage_counts['Count'],
-            textposition='auto',
-            marker_color='rgb(55, 83, 109)',
-            hovertemplate="Stage: %{y}<br>Late Cases: %{x}<extra></extra>"
-        )
-    ])
+    super_angry, prioritize_visa = memoized('note-counts', lspec['filter'], note_counts)
+    total_late = memoized('late-count', lspec, late_count)
+    return str(super_angry), str(prioritize_visa), str(total_late)
+
+# Callback for the dwell-time percentiles next to the thresholds; uploads add new sketches
+@app.callback(
+    [Output('percentile-chart', 'figure'),
+     Output('percentile-table', 'children')],
+    [Input('percentile-range', 'start_date'),
+     Input('percentile-range', 'end_date'),
+     Input('dataset-store', 'data')]
+)
+def update_percentiles(start_date, end_date, dataset_ref):
+    """Merge the per-upload sketches in the date range into p50/p90/p99 per stage."""
+    table = percentile_table(sketch_store.merged(start_date, end_date))
+    if table.empty:
+        return percentile_figure(), html.Small("No uploads in this range yet.", className="text-muted")
+    return percentile_figure(table.head(10)), dash_table.DataTable(
+        columns=[{"name": c, "id": c} for c in table.columns],
+        data=table.to_dict('records'),
+        page_size=8,
+        sort_action='native',
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'padding': '6px', 'fontSize': '13px'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'}
+    )
+
+# Callback for the late trend; reads only the archive's daily rollups
+@app.callback(
+    Output('trend-chart', 'figure'),
+    [Input('trend-days', 'value'),
+     Input('trend-split', 'value'),
+     Input('dataset-store', 'data')]
+)
+def update_trend(days, split, dataset_ref):
+    """Chart late housemaids per day over the last `days` days of the archive."""
+    latest = upload_archive.latest_day()
+    if latest is None:
+        return trend_figure()
+    start = (pd.Timestamp(latest) - pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    return trend_figure(late_trend(upload_archive.rollups(start, latest), split))
+
+# Callback for the breach forecast card and next-to-breach list
+@app.callback(
+    [Output('metric-breaching', 'children'),
+     Output('forecast-as-of', 'children'),
+     Output('forecast-table', 'children')],
+    [Input('late-spec', 'data'),
+     Input('forecast-horizon', 'value')]
+)
+def update_forecast(lspec, horizon):
+    """Count and list the open cases that breach within the selected horizon."""
+    if lspec is None or not horizon:
+        return "-", "", []
+    forecast = breach_forecast(lspec)
+    count = forecast.count_within(horizon)
+    as_of = f"as of {forecast.as_of:%Y-%m-%d %H:%M} (newest note)" if forecast.as_of is not None else ""
+    if forecast.breached:
+        as_of = f"{as_of}; {forecast.breached} already breached since the export"
+    if not count:
+        return "0", as_of, html.Small(f"No open case breaches within {horizon} hours.", className="text-muted")
     
-    bar_fig.update_layout(
-        margin=dict(l=20, r=20, t=40, b=20),
-        showlegend=False,
-        plot_bgcolor='white',
-        height=400,
-        xaxis_title="Number of Late Cases",
-        yaxis_title="Stage",
-        xaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(211, 211, 211, 0.5)'
-        ),
-        yaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(211, 211, 211, 0.5)'
-        )
+    frame = filtered_frame(lspec['filter'])
+    columns = [c for c in ['Housemaid Name', 'Housemaid ID', 'Request ID MB', 'Current Stage', 'Time In Stage']
+               if c in frame.columns]
+    soonest = frame.take(forecast.within(horizon)[:FORECAST_LIST_SIZE])[columns]
+    soonest = soonest.assign(**{'Hours To Breach': forecast.hours_left[:len(soonest)].round(1)})
+    table = dash_table.DataTable(
+        columns=[{"name": c, "id": c} for c in soonest.columns],
+        data=soonest.to_dict('records'),
+        page_size=10,
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'padding': '8px', 'fontSize': '13px'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
+        # Breached since the export: listed first, with zero or negative hours left
+        style_data_conditional=[
+            {'if': {'filter_query': '{Hours To Breach} <= 0'}, 'backgroundColor': '#f8d7da', 'color': '#842029'}
+        ]
     )
+    return str(count), as_of, table
+
+# Callback for the late-cases bar chart
+@app.callback(
+    [Output('bar-chart', 'figure'),
+     Output('bar-fingerprints', 'data')],
+    Input('late-spec', 'data'),
+    State('bar-fingerprints', 'data')
+)
+def update_bar_chart(lspec, fingerprints):
+    """Patch the bar chart with late housemaids per stage (top 10)."""
+    if lspec is None:
+        raise dash.exceptions.PreventUpdate
     
-    # Create pie chart for stage distribution (Top 10)
-    stage_dist = filtered_df.groupby('Current Stage')['Housemaid Name'].nunique().reset_index(name='Count')
-    stage_dist = stage_dist.sort_values(by='Count', ascending=False).head(10)  # Top 10
+    def compute():
+        late_cases = late_frame(lspec, late_only=True)
+        return bar_arrays(top_stage_counts(late_cases)) if not late_cases.empty else bar_arrays(EMPTY_COUNTS)
     
-    pie_fig = go.Figure(data=[
-        go.Pie(
-            labels=stage_dist['Current Stage'],
-            values=stage_dist['Count'],
-            textinfo='percent+label',
-            hole=0.3,
-            hovertemplate="Stage: %{label}<br>Cases: %{value}<br>Percentage: %{percent}<extra></extra>"
-        )
-    ])
+    patch, prints = patch_trace(memoized('bar', lspec, compute), fingerprints)
+    return (dash.no_update if patch is None else patch), prints
+
+# Callback for the stage distribution pie chart; thresholds do not affect it
+@app.callback(
+    [Output('pie-chart', 'figure'),
+     Output('pie-fingerprints', 'data')],
+    Input('filter-spec', 'data'),
+    State('pie-fingerprints', 'data')
+)
+def update_pie_chart(fspec, fingerprints):
+    """Patch the pie chart with housemaids per stage (top 10)."""
+    if fspec is None:
+        raise dash.exceptions.PreventUpdate
     
-    pie_fig.update_layout(
-        margin=dict(l=20, r=20, t=40, b=20),
-        showlegend=False,
-        height=400
-    )
+    def compute():
+        filtered_df = filtered_frame(fspec)
+        return pie_arrays(top_stage_counts(filtered_df)) if not filtered_df.empty else pie_arrays(EMPTY_COUNTS)
+    
+    patch, prints = patch_trace(memoized('pie', fspec, compute), fingerprints)
+    return (dash.no_update if patch is None else patch), prints
+
+# Callback for the detailed late-cases table
+@app.callback(
+    Output('data-table', 'children'),
+    Input('late-spec', 'data')
+)
+def update_table(lspec):
+    """Render the late rows of the current view."""
+    if lspec is None:
+        return []
     
     # Filter the data to include only delayed cases for the table
-    delayed_df = filtered_df[filtered_df['Late'] == True]
+    delayed_df = late_frame(lspec, late_only=True)
+    with stage('records', rows=len(delayed_df)):
+        records = delayed_df.to_dict('records')
     
     # Create data table with enhanced formatting
     table = dash_table.DataTable(
         id='datatable',
         columns=[{"name": i, "id": i} for i in delayed_df.columns],
-        data=delayed_df.to_dict('records'),
+        data=records,
         page_size=10,
         style_table={
             'overflowX': 'auto'
@@ -1242,7 +1914,7 @@ def update_dashboard(apply_clicks, reset_clicks, contents, filename, stages, typ
             {
                 column: {'value': str(value), 'type': 'markdown'}
                 for column, value in row.items()
-            } for row in delayed_df.to_dict('records')
+            } for row in records
         ],
         tooltip_header={
             column: {'value': column, 'type': 'markdown'}
@@ -1250,15 +1922,148 @@ def update_dashboard(apply_clicks, reset_clicks, contents, filename, stages, typ
         }
     )
     
-    return str(super_angry), str(prioritize_visa), str(total_late), bar_fig, pie_fig, table
+    return table
+
+# Callback for the global search box
+@app.callback(
+    Output('search-results', 'children'),
+    Input('search-query', 'value'),
+    State('dataset-store', 'data')
+)
+def update_search_results(query, dataset_ref):
+    """List housemaids whose name, ID or request ID matches the query, each opening its history."""
+    dataset = dataset_store.get((dataset_ref or {}).get('id'))
+    if not query or dataset is None:
+        return []
+    hits = search_index(dataset).search(query)
+    if not hits:
+        return html.Small(f'No housemaid or request matches "{query}".', className="text-muted")
+    return dbc.ListGroup([
+        dbc.ListGroupItem(
+            [
+                html.Span(hit['housemaid_name'] or hit['housemaid_id'], className="fw-bold me-2"),
+                html.Small(f"{hit['field']}: {hit['value']}", className="text-muted")
+            ],
+            id={'type': 'search-hit', 'index': hit['housemaid_id']},
+            action=True,
+            n_clicks=0
+        ) for hit in hits
+    ], flush=True)
+
+# Callback for the housemaid case-history drilldown
+@app.callback(
+    [Output('drilldown-modal', 'is_open'),
+     Output('drilldown-title', 'children'),
+     Output('drilldown-timeline', 'figure'),
+     Output('drilldown-table', 'children')],
+    [Input('datatable', 'active_cell'),
+     Input({'type': 'search-hit', 'index': ALL}, 'n_clicks')],
+    [State('datatable', 'derived_viewport_data'),
+     State('late-spec', 'data')],
+    prevent_initial_call=True
+)
+def show_housemaid_history(active_cell, search_clicks, viewport_rows, lspec):
+    """Open the timeline of every note of the clicked table row's or search hit's housemaid."""
+    if lspec is None:
+        raise dash.exceptions.PreventUpdate
+    trigger = dash.ctx.triggered_id
+    if isinstance(trigger, dict):
+        # Newly rendered search hits also fire this callback, with no clicks yet
+        if not any(search_clicks):
+            raise dash.exceptions.PreventUpdate
+        housemaid_id = trigger['index']
+    else:
+        if not active_cell or not viewport_rows or active_cell['row'] >= len(viewport_rows):
+            raise dash.exceptions.PreventUpdate
+        housemaid_id = viewport_rows[active_cell['row']].get('Housemaid ID')
+    dataset = dataset_store.get(lspec['filter']['dataset']['id'])
+    if dataset is None or housemaid_id is None:
+        raise dash.exceptions.PreventUpdate
+
+    history = housemaid_history(dataset, housemaid_id)
+    if not history.empty:
+        flags = late_flags(history, threshold_sets.get(lspec['thresholds']), rules=rule_store.table)
+        history = history.assign(Late=flags.to_numpy(dtype=bool))
+    names = history['Housemaid Name'].dropna() if 'Housemaid Name' in history.columns else []
+    title = f"{names.iloc[0] if len(names) else 'Housemaid'} ({housemaid_key(housemaid_id)}): {len(history)} notes"
+    requests = history['Request ID MB'].dropna() if 'Request ID MB' in history.columns else []
+    agent = assignment_index.agent_for(requests.iloc[-1]) if len(requests) else None
+    if agent:
+        title += f", assigned to {user_manager.users[agent].name if agent in user_manager.users else agent}"
+
+    columns = [c for c in HISTORY_COLUMNS if c in history.columns] + (['Late'] if 'Late' in history.columns else [])
+    table = dash_table.DataTable(
+        columns=[{"name": c, "id": c} for c in columns],
+        data=history[columns].to_dict('records'),
+        page_size=15,
+        style_table={'overflowX': 'auto'},
+        style_cell={'textAlign': 'left', 'padding': '8px', 'fontSize': '13px'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
+        style_data_conditional=[{
+            'if': {'filter_query': '{Late} eq true'},
+            'backgroundColor': '#fff3cd',
+            'color': '#856404'
+        }]
+    )
+    return True, title, timeline_figure(history), table
 
+# Callback that ships the compact case summary used by instant (in-browser) filtering;
+# rules-status changes whenever a rule table is imported
 @app.callback(
-    Output('select-users', 'options'),
+    [Output('case-summary', 'data'),
+     Output('client-mode-status', 'children')],
+    [Input('client-mode', 'value'),
+     Input('dataset-store', 'data'),
+     Input('rules-status', 'children')],
+    State('session-id', 'data')
+)
+def update_case_summary(client_mode, dataset_ref, rules_status, session_id):
+    """Build the typed-array summary for the current dataset, or clear it when the mode is off."""
+    if not client_mode:
+        return None, None
+    df = load_dataset(dataset_ref)
+    if df.empty:
+        return None, None
+    summary = build_case_summary(df, rule_store.table, snapshot_store.delta(session_id))
+    if summary is None:
+        return None, html.Small(
+            f"Dataset has more than {CLIENT_MODE_MAX_ROWS} rows; filters apply on the server with Apply.",
+            className="text-muted"
+        )
+    return summary, html.Small("Cards and charts follow the filters and thresholds instantly; "
+                               "the table, distribution and export use Apply.", className="text-muted")
+
+# Cards and charts recomputed in the browser from the case summary (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='recompute'),
+    [Output('metric-super-angry', 'children', allow_duplicate=True),
+     Output('metric-prioritize-visa', 'children', allow_duplicate=True),
+     Output('metric-total-late', 'children', allow_duplicate=True),
+     Output('bar-chart', 'figure', allow_duplicate=True),
+     Output('pie-chart', 'figure', allow_duplicate=True),
+     Output('bar-fingerprints', 'data', allow_duplicate=True),
+     Output('pie-fingerprints', 'data', allow_duplicate=True)],
+    [Input('case-summary', 'data'),
+     Input('filter-stage', 'value'),
+     Input('filter-type', 'value'),
+     Input('filter-nationality', 'value'),
+     Input('filter-client-note', 'value'),
+     Input('filter-change', 'value'),
+     Input('threshold-table', 'data')],
+    [State('bar-chart', 'figure'),
+     State('pie-chart', 'figure')],
+    prevent_initial_call=True
+)
+
+@app.callback(
+    [Output('select-users', 'options'),
+     Output('queue-agent', 'options')],
     Input('user-table', 'data')
 )
 def update_user_dropdown(user_data):
     """Update the dropdown options in the User Management & Task Distribution section."""
-    return [{'label': user['name'], 'value': user['username']} for user in user_data]
+    options = [{'label': user['name'], 'value': user['username']} for user in user_data]
+    return options, options
 
 # Callback for export functionality
 @app.callback(
@@ -1267,77 +2072,37 @@ def update_user_dropdown(user_data):
      Output('base-filename', 'children')],  # Add this output
     [Input('export-csv', 'n_clicks'),
      Input('export-excel', 'n_clicks')],
-    [State('upload-data', 'contents'),
-     State('upload-data', 'filename'),
+    [State('dataset-store', 'data'),
      State('filter-stage', 'value'),
      State('filter-type', 'value'),
      State('filter-nationality', 'value'),
      State('filter-client-note', 'value'),
-     State({'type': 'threshold-input', 'stage': dash.ALL}, 'value'),
-     State({'type': 'threshold-input', 'stage': dash.ALL}, 'id')]
+     State('filter-change', 'value'),
+     State('session-id', 'data'),
+     State('threshold-set', 'data')]
 )
-def export_data(csv_clicks, excel_clicks, contents, filename, stages, types,
-                nationalities, client_notes, thresholds, threshold_ids):
+def export_data(csv_clicks, excel_clicks, dataset_ref, stages, types,
+                nationalities, client_notes, changes, session_id, threshold_set):
     """Generate export links for filtered data in CSV and Excel formats."""
-    if contents is None:
+    if dataset_ref is None:
         return "", "", ""  # Return an empty string for base_filename as well
 
-    # Parse the uploaded file and apply filters
-    df = parse_contents(contents, filename)
-    if df.empty:
+    # Reuse the memoized filtered view and late flags
+    fspec = filter_spec(dataset_ref, session_id, stages, types, nationalities, client_notes, changes)
+    filtered_df = late_frame(late_spec(fspec, threshold_set))
+    if filtered_df.empty:
         return "", "", ""  # Return an empty string for base_filename as well
 
-    filtered_df = df.copy()
-
-    # Apply filters
-    if stages:
-        filtered_df = filtered_df[filtered_df['Current Stage'].isin(stages)]
-    if types:
-        filtered_df = filtered_df[filtered_df['Type'].isin(types)]
-    if nationalities:
-        filtered_df = filtered_df[filtered_df['Nationality'].isin(nationalities)]
-    if client_notes:
-        filtered_df = filtered_df[filtered_df['Client Note'].isin(client_notes)]
-
-    # Apply thresholds
-    threshold_dict = {
-        str(id_dict['stage']): threshold
-        for threshold, id_dict in zip(thresholds, threshold_ids)
-    }
-
-    filtered_df['Late'] = filtered_df.apply(
-        lambda row: (pd.notna(row['Current Stage']) and
-                     pd.notna(row['Time In Stage']) and
-                     row['Time In Stage'] > threshold_dict.get(str(row['Current Stage']), 24)),
-        axis=1
-    )
-
     # Generate filename based on filters
-    filter_names = []
-    if stages:
-        filter_names.append(f"Stage_{'_'.join(stages)}")
-    if types:
-        filter_names.append(f"Type_{'_'.join(types)}")
-    if nationalities:
-        filter_names.append(f"Nationality_{'_'.join(nationalities)}")
-    if client_notes:
-        filter_names.append(f"ClientNote_{'_'.join(client_notes)}")
-
-    base_filename = "filtered_data"
-    if filter_names:
-        base_filename += "_" + "_".join(filter_names)
+    base_filename = export_filename(stages, types, nationalities, client_notes, changes)
 
     try:
         # Create CSV download link
-        csv_string = filtered_df.to_csv(index=False, encoding='utf-8')
-        csv_base64 = base64.b64encode(csv_string.encode()).decode()
+        csv_base64 = base64.b64encode(to_csv_bytes(filtered_df)).decode()
         csv_href = f'data:text/csv;base64,{csv_base64}'
 
         # Create Excel download link
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            filtered_df.to_excel(writer, index=False)
-        excel_base64 = base64.b64encode(excel_buffer.getvalue()).decode()
+        excel_base64 = base64.b64encode(to_excel_bytes(filtered_df)).decode()
         excel_href = f'data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{excel_base64}'
 
         return csv_href, excel_href, base_filename  # Return base_filename as well
@@ -1346,6 +2111,26 @@ def export_data(csv_clicks, excel_clicks, contents, filename, stages, types,
         return "", "", ""  # Return an empty string for base_filename as well
 
 
+# Watch a local directory for new RPA exports when configured
+directory_watcher = None
+
+def start_watcher():
+    """Start this process's directory watcher; gunicorn calls it in each worker after the fork.
+
+    With shared datasets a single worker watches and publishes to all of them. Without,
+    every worker needs its own copy of the watched dataset, but only one records history.
+    """
+    global directory_watcher
+    if WATCH_DIR and directory_watcher is None:
+        shared = dataset_store.shared
+        if shared is not None and not shared.claim('watcher'):
+            # Another worker watches the folder and publishes the dataset to all of them
+            return
+        record = claim_recorder(WATCH_DIR)
+        directory_watcher = DirectoryWatcher(WATCH_DIR, lambda path: ingest_watched_file(path, record))
+        directory_watcher.start()
+
+
 def run_server(debug=True, port=8050, host='0.0.0.0'):
     print("""
     ╔════════════════════════════════════════════╗
@@ -1355,6 +2140,7 @@ def run_server(debug=True, port=8050, host='0.0.0.0'):
     ║ Press Ctrl+C to quit                       ║
     ╚════════════════════════════════════════════╝
     """)
+    start_watcher()
     app.run_server(debug=debug, port=port, host=host)
 # Run the app
 if __name__ == '__main__':
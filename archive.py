@@ -0,0 +1,268 @@
+"""Date-partitioned Parquet archive of uploads with pre-aggregated daily rollups.
+
+Layout of ARCHIVE_DIR:
+    raw/date=<YYYY-MM-DD>/<upload id>.parquet   the upload's rows noted on that day, until merged
+    raw/date=<YYYY-MM-DD>/merged.parquet        the day's rows merged from every upload so far
+    rollups/date=<YYYY-MM-DD>.parquet           late counts for that day
+    rollups.lock                                flock serializing rollup rebuilds across workers
+
+A day's rollup is rebuilt whenever an upload contains notes from it, by merging
+the upload's rows into the day's merged file; the merged upload file is then
+deleted, so a rebuild reads two files however many uploads a day has had.
+Exports overlap and deltas only cover part of a day, so rows are merged on
+MERGE_KEYS (the latest upload wins) rather than counted per file. Late is always evaluated against the threshold rules alone,
+never a session's edited thresholds, so every day has the same basis.
+Trend charts read only the rollups.
+
+Uploads are archived by one background thread per worker, in arrival order,
+so archiving never delays an upload and an archive error never fails one.
+"""
+import atexit
+import fcntl
+import glob
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datastore import MERGE_KEYS
+from forecast import note_times
+from instrumentation import stage
+from pipeline import id_keys, late_flags
+from rules import rule_store
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet  # noqa: F401
+    # pyarrow sets up its pandas support on first use, which is not thread-safe: concurrent
+    # first writes can fail with KeyError. Do it once here, before any request thread runs.
+    pa.Table.from_pandas(pd.DataFrame({'date': ['']}))
+except ImportError:  # archiving is skipped (with an error printed) without pyarrow
+    pa = None
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# On shutdown, wait this long for queued uploads to be archived
+ARCHIVE_FLUSH_SECONDS = float(os.getenv("ARCHIVE_FLUSH_SECONDS", "30"))
+
+# Rollup group columns, as trend split options
+TREND_DIMENSIONS = {
+    'stage': 'Current Stage',
+    'type': 'Type',
+    'nationality': 'Nationality'
+}
+# Group value of a rollup's all-rows total
+TOTAL = '*'
+# A day's rows merged from all its uploads, in its raw directory
+MERGED_FILE = 'merged.parquet'
+
+
+def note_days(series: pd.Series) -> np.ndarray:
+    """Note time as 'YYYY-MM-DD' strings (None when unparseable), formatting each distinct day once."""
+    day_numbers = note_times(series).astype('datetime64[D]')
+    codes, uniques = pd.factorize(day_numbers)
+    labels = np.array([None if pd.isna(d) else str(d) for d in uniques] + [None], dtype=object)
+    return labels[codes]
+
+
+def _codes(values) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer codes with missing values as one extra code, and the values (None for missing)."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values)
+    uniques = np.append(np.asarray(uniques, dtype=object), None)
+    return np.where(codes < 0, len(uniques) - 1, codes), uniques
+
+
+def _group_counts(groups: np.ndarray, size: int, housemaids: np.ndarray, late: np.ndarray) -> Dict[str, np.ndarray]:
+    """Notes, late notes and distinct (late) housemaids per group id, via bincounts over integer codes."""
+    known = housemaids >= 0
+    span = int(housemaids.max()) + 1 if known.any() else 1
+
+    def distinct(mask):
+        pairs = np.unique(groups[mask] * span + housemaids[mask])
+        return np.bincount(pairs // span, minlength=size)
+
+    return {
+        'notes': np.bincount(groups, minlength=size),
+        'late_notes': np.bincount(groups, weights=late, minlength=size).astype('int64'),
+        'housemaids': distinct(known),
+        'late_housemaids': distinct(known & late)
+    }
+
+
+def daily_rollup(df: pd.DataFrame, late: np.ndarray, days: np.ndarray) -> pd.DataFrame:
+    """Notes, late notes, housemaids and late housemaids per day x stage x type x nationality, plus day totals."""
+    keep = pd.notna(days)
+    df, late, days = df[keep], late[keep], days[keep]
+    housemaids = pd.factorize(df['Housemaid ID'])[0] if 'Housemaid ID' in df.columns else np.full(len(df), -1)
+
+    day_codes, day_values = _codes(days)
+    dimensions = [_codes(df[column] if column in df.columns else np.full(len(df), None, dtype=object))
+                  for column in TREND_DIMENSIONS.values()]
+    combined = np.ravel_multi_index([day_codes] + [codes for codes, _ in dimensions],
+                                    [len(day_values)] + [len(values) for _, values in dimensions])
+    groups, group_keys = pd.factorize(combined)
+    day_of, *dimension_of = np.unravel_index(group_keys, [len(day_values)] + [len(v) for _, v in dimensions])
+
+    group_rows = pd.DataFrame({'date': day_values[day_of]})
+    for column, (_, values), codes in zip(TREND_DIMENSIONS.values(), dimensions, dimension_of):
+        group_rows[column] = values[codes]
+    group_rows = group_rows.assign(**_group_counts(groups, len(group_keys), housemaids, late))
+
+    totals = pd.DataFrame({'date': day_values}).assign(**{column: TOTAL for column in TREND_DIMENSIONS.values()})
+    totals = totals.assign(**_group_counts(day_codes, len(day_values), housemaids, late))
+    totals = totals[totals['notes'] > 0]
+    return pd.concat([totals, group_rows], ignore_index=True)
+
+
+class UploadArchive:
+    """Writes uploads into the archive and serves the daily rollups, cached by file modification time."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._rollups: Dict[str, Tuple[float, pd.DataFrame]] = {}
+        self._pending: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def write(self, df: pd.DataFrame, upload_id: Optional[str] = None):
+        """Queue one parsed upload for archiving; its rows and day rollups are written in the background."""
+        if not self.directory or df.empty or 'Note time' not in df.columns:
+            return
+        upload_id = upload_id or time.strftime('%Y%m%dT%H%M%S-') + uuid.uuid4().hex[:8]
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._drain, daemon=True)
+                self._writer.start()
+                atexit.register(self._flush)
+        self._pending.put((df, upload_id))
+
+    def _flush(self):
+        """Let the writer finish the queued uploads before the process exits."""
+        atexit.unregister(self._flush)
+        self._pending.put(None)
+        self._writer.join(ARCHIVE_FLUSH_SECONDS)
+
+    def _drain(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            df, upload_id = item
+            try:
+                self._archive(df, upload_id)
+            except Exception as e:
+                print(f"Error archiving upload: {str(e)}")
+
+    def _archive(self, df: pd.DataFrame, upload_id: str):
+        if pa is None:
+            raise ImportError("the upload archive requires pyarrow")
+        with stage('archive', rows=len(df)):
+            days = note_days(df['Note time'])
+            touched = []
+            for day, positions in pd.Series(np.arange(len(df))).groupby(days).groups.items():
+                raw_dir = os.path.join(self.directory, 'raw', f'date={day}')
+                os.makedirs(raw_dir, exist_ok=True)
+                self._write_parquet(df.iloc[positions], os.path.join(raw_dir, f'{upload_id}.parquet'))
+                touched.append(day)
+            rollup_dir = os.path.join(self.directory, 'rollups')
+            os.makedirs(rollup_dir, exist_ok=True)
+            # Another worker rebuilding the same day must not miss the rows written here
+            with open(os.path.join(self.directory, 'rollups.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                for day in touched:
+                    self._rebuild_day(day, os.path.join(rollup_dir, f'date={day}.parquet'))
+
+    def _rebuild_day(self, day: str, path: str):
+        """Merge the day's new upload files into its merged file, then rebuild its rollup from that."""
+        raw_dir = os.path.join(self.directory, 'raw', f'date={day}')
+        merged_path = os.path.join(raw_dir, MERGED_FILE)
+        # Upload ids start with their timestamp, so the latest upload comes last, after the merged rows
+        uploads = sorted(p for p in glob.glob(os.path.join(raw_dir, '*.parquet')) if p != merged_path)
+        sources = ([merged_path] if os.path.exists(merged_path) else []) + uploads
+        rows = self._merge_rows([pd.read_parquet(source) for source in sources])
+        if uploads:
+            self._write_parquet(rows, merged_path)
+            # Written first, so a failure in between only merges the same uploads again
+            for upload in uploads:
+                os.remove(upload)
+        late = late_flags(rows, {}, rules=rule_store.table).to_numpy()
+        rollup = daily_rollup(rows, late, note_days(rows['Note time']))
+        self._write_parquet(rollup[rollup['date'] == day].drop(columns='date'), path)
+
+    @staticmethod
+    def _merge_rows(frames) -> pd.DataFrame:
+        """Rows of the frames (oldest first), each (request, note time) counted once."""
+        rows = pd.concat(frames, ignore_index=True)
+        for column in ['Housemaid ID'] + MERGE_KEYS:
+            if column in rows.columns:
+                rows[column] = id_keys(rows[column])
+        columns = [column for column in MERGE_KEYS if column in rows.columns]
+        if not columns:
+            return rows
+        # As in DatasetStore.append: the last row of a key supersedes its earlier rows,
+        # while a row missing part of its key only drops exact copies
+        keyed = rows[columns].notna().all(axis=1).to_numpy()
+        latest = ~rows.duplicated(subset=columns, keep='last').to_numpy()
+        return rows[np.where(keyed, latest, ~rows.duplicated(keep='last').to_numpy())].reset_index(drop=True)
+
+    @staticmethod
+    def _write_parquet(frame: pd.DataFrame, path: str):
+        # Write aside and rename, so readers never see a half-written file
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            frame.to_parquet(tmp, index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed-type object columns (e.g. numbers and text) are archived as text
+            # (missing values stay missing, as merged files are read back on the next rebuild)
+            text = [c for c in frame.columns if frame[c].dtype == object]
+            frame = frame.assign(**{c: frame[c].where(frame[c].isna(), frame[c].astype(str)) for c in text})
+            frame.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+    def rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Daily rollups for days in [start, end] (YYYY-MM-DD, inclusive)."""
+        frames = []
+        for path in sorted(glob.glob(os.path.join(self.directory, 'rollups', 'date=*.parquet'))):
+            day = os.path.basename(path)[len('date='):-len('.parquet')]
+            if (start and day < start) or (end and day > end):
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+                with self._lock:
+                    cached = self._rollups.get(path)
+                if cached is None or cached[0] != mtime:
+                    cached = (mtime, pd.read_parquet(path).assign(date=day))
+                    with self._lock:
+                        self._rollups[path] = cached
+            except (OSError, ValueError) as e:
+                print(f"Error reading rollup {path}: {str(e)}")
+                continue
+            frames.append(cached[1])
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def latest_day(self) -> Optional[str]:
+        paths = sorted(glob.glob(os.path.join(self.directory, 'rollups', 'date=*.parquet')))
+        return os.path.basename(paths[-1])[len('date='):-len('.parquet')] if paths else None
+
+
+def late_trend(rollups: pd.DataFrame, split: Optional[str] = None, limit: int = 6) -> pd.DataFrame:
+    """Late housemaids per day, one column per split value (the `limit` largest), or a single 'All' column."""
+    if rollups.empty:
+        return pd.DataFrame()
+    totals = rollups[rollups['Current Stage'] == TOTAL]
+    if split not in TREND_DIMENSIONS:
+        return totals.set_index('date')[['late_housemaids']].rename(columns={'late_housemaids': 'All'}).sort_index()
+    column = TREND_DIMENSIONS[split]
+    groups = rollups[rollups['Current Stage'] != TOTAL]
+    # Summing distinct counts across groups is exact while a housemaid sits in one group per day
+    trend = groups.pivot_table(index='date', columns=column, values='late_housemaids', aggfunc='sum', fill_value=0)
+    top = trend.sum().sort_values(ascending=False).index[:limit]
+    return trend[top].sort_index()
+
+
+# Shared archive for this worker process
+upload_archive = UploadArchive()
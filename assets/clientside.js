@@ -0,0 +1,135 @@
+// In-browser recomputation of the metric cards and charts from the compact
+// case summary built by client_summary.py. Used when "Instant filtering" is on.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        _decoded: null,
+        _decodedFor: null,
+
+        decode: function (summary) {
+            if (this._decodedFor === summary) {
+                return this._decoded;
+            }
+            const types = {
+                i1: Int8Array, u1: Uint8Array, i2: Int16Array, i4: Int32Array, f4: Float32Array, f8: Float64Array
+            };
+            const columns = {};
+            Object.keys(summary.columns).forEach(function (name) {
+                const column = summary.columns[name];
+                const raw = atob(column.data);
+                const bytes = new Uint8Array(raw.length);
+                for (let i = 0; i < raw.length; i++) {
+                    bytes[i] = raw.charCodeAt(i);
+                }
+                columns[name] = new types[column.dtype](bytes.buffer);
+            });
+            this._decoded = columns;
+            this._decodedFor = summary;
+            return columns;
+        },
+
+        // Set of codes selected in a dropdown, or null when the filter is empty
+        selection: function (values, vocab) {
+            if (!values || values.length === 0) {
+                return null;
+            }
+            const lookup = {};
+            vocab.forEach(function (value, code) { lookup[value] = code; });
+            const selected = new Set();
+            values.forEach(function (value) {
+                if (value in lookup) {
+                    selected.add(lookup[value]);
+                }
+            });
+            return selected;
+        },
+
+        topStages: function (perStage, vocab) {
+            const rows = [];
+            perStage.forEach(function (housemaids, code) {
+                rows.push([vocab[code], housemaids.size]);
+            });
+            rows.sort(function (a, b) { return b[1] - a[1]; });
+            return rows.slice(0, 10);
+        },
+
+        recompute: function (summary, stages, types, nationalities, notes, changes,
+                             thresholdRows, barFigure, pieFigure) {
+            const noUpdate = window.dash_clientside.no_update;
+            if (!summary) {
+                return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+            const dashboard = window.dash_clientside.dashboard;
+            const c = dashboard.decode(summary);
+            const vocab = summary.vocab;
+
+            const stageSel = dashboard.selection(stages, vocab.stage);
+            const typeSel = dashboard.selection(types, vocab.type);
+            const natSel = dashboard.selection(nationalities, vocab.nationality);
+            const noteSel = dashboard.selection(notes, vocab.note);
+            const changeSel = (changes && changes.length) ?
+                new Set(changes.map(function (name) { return summary.change_codes[name]; })) : null;
+
+            // Per-stage threshold from the editor; values equal to the inherited default are not overrides
+            const stageThreshold = new Float64Array(vocab.stage.length).fill(NaN);
+            const stageCode = {};
+            vocab.stage.forEach(function (value, code) { stageCode[value] = code; });
+            (thresholdRows || []).forEach(function (row) {
+                const code = stageCode[row.stage];
+                const hours = parseFloat(row.hours);
+                if (code !== undefined && !isNaN(hours) && hours !== summary.stage_default[code]) {
+                    stageThreshold[code] = hours;
+                }
+            });
+
+            const angryCode = vocab.note.indexOf('SUPER_ANGRY_CLIENT');
+            const visaCode = vocab.note.indexOf('PRIORITIZE_VISA');
+            const angry = new Set(), visa = new Set(), late = new Set();
+            const lateByStage = new Map(), allByStage = new Map();
+
+            for (let i = 0; i < summary.rows; i++) {
+                const stage = c.stage[i];
+                if (stageSel && !stageSel.has(stage)) continue;
+                if (typeSel && !typeSel.has(c.type[i])) continue;
+                if (natSel && !natSel.has(c.nationality[i])) continue;
+                if (noteSel && !noteSel.has(c.note[i])) continue;
+                if (changeSel && !changeSel.has(c.change[i])) continue;
+
+                const housemaid = c.housemaid[i];
+                if (c.note[i] === angryCode && angryCode >= 0) angry.add(housemaid);
+                if (c.note[i] === visaCode && visaCode >= 0) visa.add(housemaid);
+                if (stage < 0) continue;
+                if (!allByStage.has(stage)) allByStage.set(stage, new Set());
+                if (housemaid >= 0) allByStage.get(stage).add(housemaid);
+
+                let threshold = c.base_threshold[i];
+                if (c.overridable[i] && !isNaN(stageThreshold[stage])) {
+                    threshold = stageThreshold[stage];
+                }
+                const time = c.time[i];
+                if (!isNaN(time) && time > threshold) {
+                    late.add(housemaid);
+                    if (!lateByStage.has(stage)) lateByStage.set(stage, new Set());
+                    // Charts count distinct names like nunique, so a missing name is not counted
+                    if (housemaid >= 0) lateByStage.get(stage).add(housemaid);
+                }
+            }
+
+            const barRows = dashboard.topStages(lateByStage, vocab.stage);
+            const pieRows = dashboard.topStages(allByStage, vocab.stage);
+            const bar = Object.assign({}, barFigure);
+            bar.data = [Object.assign({}, barFigure.data[0], {
+                x: barRows.map(function (r) { return r[1]; }),
+                y: barRows.map(function (r) { return r[0]; }),
+                text: barRows.map(function (r) { return r[1]; })
+            })];
+            const pie = Object.assign({}, pieFigure);
+            pie.data = [Object.assign({}, pieFigure.data[0], {
+                labels: pieRows.map(function (r) { return r[0]; }),
+                values: pieRows.map(function (r) { return r[1]; })
+            })];
+
+            // Clearing the fingerprints makes the next server update resend full chart arrays
+            return [String(angry.size), String(visa.size), String(late.size), bar, pie, null, null];
+        }
+    }
+});
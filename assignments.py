@@ -0,0 +1,142 @@
+"""Local index of distributed cases: agent -> queue and case -> agent.
+
+Every successful distribution replaces the agent's queue in ASSIGNMENTS_PATH,
+with the queue's late count and longest-overdue case computed once, at
+assignment time. Queue views read only this index, never the Google Sheets
+or the dataset. Workers reload the file when its modification time changes.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from drilldown import housemaid_key
+
+try:
+    import orjson
+except ImportError:  # the standard json module is used instead
+    orjson = None
+
+ASSIGNMENTS_PATH = os.getenv("ASSIGNMENTS_PATH", "assignments.json")
+QUEUE_COLUMNS = ['Housemaid Name', 'Housemaid ID', 'Request ID MB', 'Current Stage', 'Time In Stage']
+OVERDUE_COLUMN = 'Hours Overdue'
+
+
+@dataclass
+class AgentQueue:
+    assigned_at: str
+    # Queue rows in distribution order, QUEUE_COLUMNS plus OVERDUE_COLUMN
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    cases: List[str] = field(default_factory=list)
+    late_count: int = 0
+    oldest_overdue: Optional[Dict[str, Any]] = None
+
+    @property
+    def oldest_label(self) -> str:
+        """The longest-overdue case as '<housemaid> (<hours> h over)', or '-' when nothing is late."""
+        row = self.oldest_overdue
+        if not row:
+            return '-'
+        who = next((row[c] for c in ['Housemaid Name', 'Housemaid ID', 'Request ID MB'] if row.get(c) is not None), '?')
+        return f"{housemaid_key(who)} ({row[OVERDUE_COLUMN]} h over)"
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, overdue: np.ndarray) -> "AgentQueue":
+        """Queue of one agent's rows, given each row's hours past its threshold (negative: not yet late)."""
+        overdue = np.asarray(overdue, dtype='float64')
+        late = overdue > 0
+        columns = [c for c in QUEUE_COLUMNS if c in df.columns]
+        frame = df[columns].assign(**{OVERDUE_COLUMN: overdue.round(1)})
+        frame = frame.astype(object).where(frame.notna(), None)
+        if 'Request ID MB' in df.columns:
+            requests = df['Request ID MB']
+            keys = [housemaid_key(v) for v in requests.dropna().unique()]
+            late_count = int(requests[late].nunique())
+        else:
+            keys, late_count = [], int(late.sum())
+        oldest = None
+        if late.any():
+            oldest = frame.iloc[int(np.nanargmax(np.where(late, overdue, np.nan)))].to_dict()
+        return cls(time.strftime('%Y-%m-%d %H:%M'), frame.to_dict('records'), keys, late_count, oldest)
+
+
+class AssignmentIndex:
+    """Assignments persisted to a JSON file and shared by all workers through it."""
+
+    def __init__(self, path: str = ASSIGNMENTS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._queues: Dict[str, AgentQueue] = {}
+        self._agents: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'rb') as f:
+                payload = _loads(f.read())
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                print(f"Error loading assignments: {str(e)}")
+            return
+        self._queues = {username: AgentQueue(**queue) for username, queue in payload.items()}
+        self._agents = {case: username for username, queue in self._queues.items() for case in queue.cases}
+        self._mtime = mtime
+
+    def assign(self, queues: Dict[str, AgentQueue]):
+        """Replace the queues of the given agents, in one write; their cases now point to them."""
+        with self._lock, open(self.path + '.lock', 'a') as lock_file:
+            # Another worker may have assigned in between; merge onto its file, not our cached copy
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            self._queues.update(queues)
+            self._agents = {case: agent for case, agent in self._agents.items() if agent not in queues}
+            for username, queue in queues.items():
+                self._agents.update({case: username for case in queue.cases})
+            tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp, 'wb') as f:
+                    f.write(_dumps({agent: vars(q) for agent, q in self._queues.items()}))
+                os.replace(tmp, self.path)
+                self._mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                print(f"Error saving assignments: {str(e)}")
+
+    def queue(self, username: str) -> Optional[AgentQueue]:
+        with self._lock:
+            self._refresh()
+            return self._queues.get(username)
+
+    def agent_for(self, request_id: Any) -> Optional[str]:
+        """Agent the case was last assigned to."""
+        with self._lock:
+            self._refresh()
+            return self._agents.get(housemaid_key(request_id))
+
+    def summary(self) -> Dict[str, AgentQueue]:
+        with self._lock:
+            self._refresh()
+            return dict(self._queues)
+
+
+def _dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=str).encode()
+
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+# Shared index for this worker process
+assignment_index = AssignmentIndex()
@@ -0,0 +1,65 @@
+"""Payload size and server time of full figure rebuilds versus dash.Patch updates.
+
+    python benchmarks/bench_figure_patch.py [rows]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from figures import bar_figure, pie_figure, top_stage_counts, patch_trace, bar_arrays, pie_arrays  # noqa: E402
+from synthetic import generate  # noqa: E402
+
+
+def synthetic_frame(rows: int, stages: int = 150, seed: int = 0) -> pd.DataFrame:
+    return generate(rows, stages=stages, nan_rate=0, blank_repeats=False, seed=seed)
+
+
+def full_figures(df: pd.DataFrame, threshold: float):
+    """What update_dashboard used to do: build both figures from scratch and serialize them."""
+    late = df[df['Time In Stage'] > threshold]
+    bar_fig = bar_figure()
+    bar_fig.update_traces(**bar_arrays(top_stage_counts(late)))
+    pie_fig = pie_figure()
+    pie_fig.update_traces(**pie_arrays(top_stage_counts(df)))
+    return to_json_plotly(bar_fig) + to_json_plotly(pie_fig)
+
+
+def patched_figures(df: pd.DataFrame, threshold: float, fingerprints: dict):
+    late = df[df['Time In Stage'] > threshold]
+    bar_patch, bar_prints = patch_trace(bar_arrays(top_stage_counts(late)), fingerprints.get('bar'))
+    pie_patch, pie_prints = patch_trace(pie_arrays(top_stage_counts(df)), fingerprints.get('pie'))
+    payload = ''.join(to_json_plotly(p) for p in (bar_patch, pie_patch) if p is not None)
+    return payload, {'bar': bar_prints, 'pie': pie_prints}
+
+
+def timed(fn, *args, repeat: int = 5):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(rows: int = 50000):
+    df = synthetic_frame(rows)
+    print(f"{rows:,} rows, 150 stages")
+    print(f"{'update':<28}{'full bytes':>12}{'full ms':>10}{'patch bytes':>13}{'patch ms':>10}")
+
+    fingerprints = {}
+    # First render, then a threshold change that moves the bars, then a no-op re-apply
+    for label, threshold in [('initial render', 24), ('threshold 24 -> 30', 30), ('re-apply, no change', 30)]:
+        full_time, full_payload = timed(full_figures, df, threshold)
+        patch_time, (patch_payload, new_prints) = timed(patched_figures, df, threshold, fingerprints)
+        fingerprints = new_prints
+        print(f"{label:<28}{len(full_payload):>12,}{full_time * 1000:>10.1f}"
+              f"{len(patch_payload):>13,}{patch_time * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
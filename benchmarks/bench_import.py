@@ -0,0 +1,56 @@
+"""Cold-start time: importing app in a fresh interpreter, and serving the first layout.
+
+    python benchmarks/bench_import.py [runs]
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROBE = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.server.test_client().get('/_dash-layout')
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def cold_start():
+    """Seconds to import app and to serve the first /_dash-layout, in a new process."""
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    import_seconds, layout_seconds = (float(x) for x in output.stdout.split()[-2:])
+    return import_seconds, layout_seconds
+
+
+def top_imports(limit: int = 12):
+    """Slowest top-level imports under app by cumulative time, from python -X importtime."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in output.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        # Direct imports of app and app itself sit at two-space depth or less
+        if match and len(match.group(2)) <= 3:
+            rows.append((int(match.group(1)) / 1000, match.group(3)))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(runs: int = 5):
+    samples = [cold_start() for _ in range(runs)]
+    imports = [s[0] for s in samples]
+    layouts = [s[1] for s in samples]
+    print(f"{runs} fresh interpreters")
+    print(f"  import app        median {statistics.median(imports) * 1000:8.1f} ms   min {min(imports) * 1000:8.1f} ms")
+    print(f"  first layout      median {statistics.median(layouts) * 1000:8.1f} ms   min {min(layouts) * 1000:8.1f} ms")
+    print("\nSlowest imports (cumulative ms):")
+    for ms, module in top_imports():
+        print(f"  {ms:8.1f}  {module}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
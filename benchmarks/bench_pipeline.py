@@ -0,0 +1,137 @@
+"""Pipeline microbenchmarks on synthetic RPA logs, saved as JSON for run-to-run comparison.
+
+    python benchmarks/bench_pipeline.py [--rows 10000 100000 1000000] [--compare previous.json]
+
+XLSX parse/export are skipped above --xlsx-max-rows; openpyxl takes minutes at 1M rows.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from figures import top_stage_counts  # noqa: E402
+from pipeline import filter_mask, late_flags, parse_contents, to_csv_bytes, to_excel_bytes  # noqa: E402
+from rules import RuleTable, ThresholdRule  # noqa: E402
+from synthetic import generate, stage_names  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def data_url(payload: bytes, mime: str) -> str:
+    return f"data:{mime};base64," + base64.b64encode(payload).decode()
+
+
+def xlsx_bytes(df: pd.DataFrame) -> bytes:
+    return to_excel_bytes(df)
+
+
+def metric_counts(df: pd.DataFrame, late: pd.Series):
+    """The three metric cards as update_metrics computes them."""
+    notes = df['Client Note']
+    return (df.loc[notes == 'SUPER_ANGRY_CLIENT', 'Housemaid Name'].drop_duplicates().shape[0],
+            df.loc[notes == 'PRIORITIZE_VISA', 'Housemaid Name'].drop_duplicates().shape[0],
+            df.loc[late.to_numpy(), 'Housemaid Name'].drop_duplicates().shape[0])
+
+
+def run_size(rows: int, stages: int, repeat: int, xlsx_max_rows: int) -> List[Dict[str, Any]]:
+    raw = generate(rows, stages=stages)
+    csv_url = data_url(raw.to_csv(index=False).encode(), 'text/csv')
+    df = parse_contents(csv_url, 'bench.csv')
+
+    names = stage_names(stages)
+    thresholds = {stage: 24 + (i % 5) * 12 for i, stage in enumerate(names)}
+    rules = RuleTable([ThresholdRule(12, type='MV'), ThresholdRule(48, stage=names[0], nationality='Kenyan')])
+    selection = dict(stages=names[:stages // 2], types=['CC'], nationalities=None, client_notes=None)
+    mask = filter_mask(df, **selection)
+    filtered = df[mask]
+    late = late_flags(filtered, thresholds)
+
+    cases: Dict[str, Callable[[], Any]] = {
+        'parse_csv': lambda: parse_contents(csv_url, 'bench.csv'),
+        'filter': lambda: filter_mask(df, **selection),
+        'late': lambda: late_flags(filtered, thresholds),
+        'late_rules': lambda: late_flags(filtered, thresholds, rules=rules),
+        'metrics': lambda: metric_counts(filtered, late),
+        'bar_aggregation': lambda: top_stage_counts(filtered[late.to_numpy()]),
+        'pie_aggregation': lambda: top_stage_counts(filtered),
+        'export_csv': lambda: to_csv_bytes(filtered[late.to_numpy()])
+    }
+    if rows <= xlsx_max_rows:
+        xlsx_url = data_url(xlsx_bytes(raw), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        cases['parse_xlsx'] = lambda: parse_contents(xlsx_url, 'bench.xlsx')
+        cases['export_xlsx'] = lambda: to_excel_bytes(filtered[late.to_numpy()])
+
+    results = []
+    for name, fn in cases.items():
+        # XLSX cases are slow enough that one run is representative
+        seconds = timed(fn, 1 if 'xlsx' in name else repeat)
+        results.append({'rows': rows, 'case': name, 'seconds': round(seconds, 6)})
+        print(f"{rows:>10,}  {name:<16}{seconds * 1000:>12.1f} ms")
+    return results
+
+
+def compare(results: List[Dict[str, Any]], previous_path: str):
+    with open(previous_path) as f:
+        previous = {(r['rows'], r['case']): r['seconds'] for r in json.load(f)['results']}
+    print(f"\n{'rows':>10}  {'case':<16}{'before ms':>12}{'after ms':>12}{'ratio':>8}")
+    for r in results:
+        before = previous.get((r['rows'], r['case']))
+        if before:
+            print(f"{r['rows']:>10,}  {r['case']:<16}{before * 1000:>12.1f}{r['seconds'] * 1000:>12.1f}"
+                  f"{r['seconds'] / before:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pipeline on synthetic data.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--stages', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--xlsx-max-rows', type=int, default=100000)
+    parser.add_argument('--output', help="Results JSON (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        results.extend(run_size(rows, args.stages, args.repeat, args.xlsx_max_rows))
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('pipeline-%Y%m%d-%H%M%S.json'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'stages': args.stages,
+                'repeat': args.repeat
+            },
+            'results': results
+        }, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Encode time and bytes on the wire of a late-cases table response per JSON engine and encoding.
+
+    python benchmarks/bench_serialization.py [rows]
+"""
+import gzip
+import os
+import sys
+import time
+
+import pandas as pd
+import plotly.io as pio
+from dash import dash_table
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from serialization import GZIP_LEVEL, BROTLI_QUALITY, brotli, orjson, fast_to_json  # noqa: E402
+from synthetic import generate  # noqa: E402
+
+
+def synthetic_late_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    return generate(rows, blank_repeats=False, seed=seed).assign(Late=True)
+
+
+def table_response(df: pd.DataFrame) -> dict:
+    """The update_table callback response body for a late set (records plus tooltips)."""
+    records = df.to_dict('records')
+    table = dash_table.DataTable(
+        id='datatable',
+        columns=[{"name": i, "id": i} for i in df.columns],
+        data=records,
+        tooltip_data=[
+            {column: {'value': str(value), 'type': 'markdown'} for column, value in row.items()}
+            for row in records
+        ]
+    )
+    return {'multi': True, 'response': {'data-table': {'children': table}}}
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(rows: int = 50000):
+    response = table_response(synthetic_late_frame(rows))
+    print(f"{rows:,} late rows, DataTable records + tooltips")
+
+    def plotly_engine(engine):
+        def encode():
+            pio.json.config.default_engine = engine
+            return to_json_plotly(response).encode()
+        return encode
+
+    encoders = [('plotly json', plotly_engine('json'))]
+    if orjson is not None:
+        encoders += [('plotly orjson', plotly_engine('orjson')),
+                     ('fast_to_json', lambda: fast_to_json(response).encode())]
+    print(f"{'encoder':<16}{'encode ms':>12}{'bytes':>14}")
+    payload = None
+    for name, encode in encoders:
+        encode_time, payload = timed(encode)
+        print(f"{name:<16}{encode_time * 1000:>12.1f}{len(payload):>14,}")
+
+    encoders = [('identity', lambda b: b), ('gzip', lambda b: gzip.compress(b, compresslevel=GZIP_LEVEL))]
+    if brotli is not None:
+        encoders.append(('br', lambda b: brotli.compress(b, quality=BROTLI_QUALITY)))
+    print(f"\n{'encoding':<16}{'compress ms':>12}{'bytes':>14}{'ratio':>8}")
+    for name, encode in encoders:
+        compress_time, body = timed(encode, payload)
+        print(f"{name:<16}{compress_time * 1000:>12.1f}{len(body):>14,}{len(payload) / len(body):>8.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
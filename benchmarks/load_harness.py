@@ -0,0 +1,325 @@
+"""Concurrent-session load test of the Dash server with Google Sheets stubbed (see stub_app.py).
+
+Each simulated supervisor uploads a synthetic log, then repeats Apply (the
+spec callback plus the four panels it fires), Export and Distribute with
+varying filters. Requests carry the same _dash-update-component payloads the
+browser sends, built from /_dash-dependencies and the session's own state.
+
+    python benchmarks/load_harness.py --sessions 8 --rows 20000                # Flask test client
+    python benchmarks/load_harness.py --gunicorn 1x4 2x4 4x2 --sessions 16     # local gunicorn, workers x threads
+
+Without SHARED_DATASET_DIR, datasets live in the worker that parsed the upload.
+An Apply served by another worker finds no dataset; it is counted as a dataset
+miss rather than hidden in the latency figures. Set SHARED_DATASET_DIR (e.g. a
+directory on /dev/shm) to have every worker map the published copy instead.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from instrumentation import current_rss_mb  # noqa: E402
+from synthetic import generate  # noqa: E402
+
+PANEL_OUTPUTS = ['metric-super-angry', 'bar-chart', 'pie-chart', 'data-table']
+AGENTS = ['razan.hassan', 'aya.tahawi', 'maya.dayoub', 'laila.alhafi']
+
+
+class TestClientTransport:
+    """In-process requests through Flask's test client (one client per thread)."""
+
+    def __init__(self, server):
+        self.server = server
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.server.test_client()
+        return self._local.client
+
+    def get_json(self, path: str) -> Any:
+        return json.loads(self._client().get(path).data)
+
+    def post_json(self, path: str, payload: dict):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.data
+
+
+class HttpTransport:
+    """Requests against a running server over HTTP, with the standard library only."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def _send(self, request: urllib.request.Request):
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            # Returned like any other response, so the caller counts it as an error
+            return e.code, e.read()
+
+    def get_json(self, path: str) -> Any:
+        _, body = self._send(urllib.request.Request(self.base_url + path))
+        return json.loads(body)
+
+    def post_json(self, path: str, payload: dict):
+        request = urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        return self._send(request)
+
+
+def _outputs(output: str):
+    """Split a callback's output string into the outputs payload the renderer sends."""
+    def spec(item):
+        component_id, prop = item.rsplit('.', 1)
+        return {'id': component_id, 'property': prop.split('@')[0]}
+    if output.startswith('..'):
+        return [spec(item) for item in output[2:-2].split('...')]
+    return spec(output)
+
+
+class DashSession:
+    """One browser tab: its component state and the callbacks it triggers."""
+
+    def __init__(self, transport, dependencies: List[dict], record):
+        self.transport = transport
+        self.record = record
+        self.state: Dict[str, Any] = {}
+        self.callbacks = {}
+        for dep in dependencies:
+            if dep.get('clientside_function'):
+                continue
+            for item in (_outputs(dep['output']) if dep['output'].startswith('..') else [_outputs(dep['output'])]):
+                self.callbacks.setdefault(item['id'], dep)
+
+    def fire(self, kind: str, output_id: str, trigger: str, **values) -> dict:
+        dep = self.callbacks[output_id]
+        self.state.update(values)
+
+        def items(specs):
+            return [dict(spec, value=self.state.get(f"{spec['id']}.{spec['property']}")) for spec in specs]
+
+        payload = {
+            'output': dep['output'],
+            'outputs': _outputs(dep['output']),
+            'inputs': items(dep['inputs']),
+            'state': items(dep['state']),
+            'changedPropIds': [trigger]
+        }
+        start = time.perf_counter()
+        status, body = self.transport.post_json('/_dash-update-component', payload)
+        seconds = time.perf_counter() - start
+        response = json.loads(body).get('response', {}) if status == 200 else {}
+        self.record(kind, seconds, status, len(body))
+        for component_id, props in response.items():
+            for prop, value in props.items():
+                self.state[f"{component_id}.{prop}"] = value
+        return response
+
+
+def run_session(transport, dependencies, upload_url: str, iterations: int, seed: int, record) -> int:
+    """Drive one supervisor session; return the number of Apply requests that found no dataset."""
+    rng = random.Random(seed)
+    session = DashSession(transport, dependencies, record)
+    session.fire('upload', 'dataset-store', 'upload-data.contents', **{
+        'upload-data.contents': [upload_url], 'upload-data.filename': ['rpa.csv'], 'append-mode.value': False
+    })
+    stages = [o['value'] for o in session.state.get('filter-stage.options') or []]
+    misses = 0
+    for i in range(1, iterations + 1):
+        session.fire('apply', 'filter-spec', 'apply-filters.n_clicks', **{
+            'apply-filters.n_clicks': i,
+            'filter-stage.value': rng.sample(stages, min(len(stages), rng.randint(1, 5))) if stages else None,
+            'filter-type.value': rng.choice([None, ['CC'], ['MV']])
+        })
+        for output_id in PANEL_OUTPUTS:
+            response = session.fire('panel', output_id, 'late-spec.data')
+            # A worker without the dataset renders a table with no columns at all
+            table = (response.get('data-table') or {}).get('children') or {}
+            if output_id == 'data-table' and not (table.get('props') or {}).get('columns'):
+                misses += 1
+        session.fire('export', 'download-csv', 'export-csv.n_clicks', **{'export-csv.n_clicks': i})
+        session.fire('distribute', 'distribution-results', 'distribute-tasks.n_clicks', **{
+            'distribute-tasks.n_clicks': i, 'select-users.value': rng.sample(AGENTS, 2)
+        })
+    return misses
+
+
+class RssSampler(threading.Thread):
+    """Peak of the summed RSS of the given process ids (or this process), sampled in the background."""
+
+    def __init__(self, pids_fn=None, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.pids_fn = pids_fn
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._done = threading.Event()
+
+    def sample(self) -> float:
+        if self.pids_fn is None:
+            return current_rss_mb()
+        total = 0.0
+        for pid in self.pids_fn():
+            try:
+                with open(f'/proc/{pid}/statm') as f:
+                    total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+            except OSError:
+                continue
+        return total
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak_mb = max(self.peak_mb, self.sample())
+            self._done.wait(self.interval)
+
+    def stop(self) -> float:
+        self._done.set()
+        self.join()
+        return round(max(self.peak_mb, self.sample()), 1)
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            for child in f.read().split():
+                pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def run_load(transport, sessions: int, iterations: int, rows: int, pids_fn=None) -> Dict[str, Any]:
+    dependencies = transport.get_json('/_dash-dependencies')
+    upload_url = "data:text/csv;base64," + base64.b64encode(generate(rows).to_csv(index=False).encode()).decode()
+    samples: Dict[str, List[float]] = {}
+    errors = []
+    lock = threading.Lock()
+
+    def record(kind, seconds, status, size):
+        with lock:
+            samples.setdefault(kind, []).append(seconds)
+            if status != 200:
+                errors.append((kind, status))
+
+    sampler = RssSampler(pids_fn)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        misses = sum(pool.map(lambda s: run_session(transport, dependencies, upload_url, iterations, s, record),
+                              range(sessions)))
+    elapsed = time.perf_counter() - start
+    peak_rss = sampler.stop()
+
+    def percentiles(values):
+        p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+        return {'count': len(values), 'p50_ms': round(p50, 1), 'p95_ms': round(p95, 1), 'p99_ms': round(p99, 1)}
+
+    every = [s for values in samples.values() for s in values]
+    return {
+        'sessions': sessions,
+        'rows': rows,
+        'iterations': iterations,
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(len(every) / elapsed, 1),
+        'applies_per_second': round(len(samples.get('apply', [])) / elapsed, 2),
+        'peak_rss_mb': peak_rss,
+        'errors': len(errors),
+        'dataset_misses': misses,
+        'overall': percentiles(every),
+        'by_kind': {kind: percentiles(values) for kind, values in samples.items()}
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(config: str, args) -> Dict[str, Any]:
+    workers, threads = (int(x) for x in config.split('x'))
+    port = _free_port()
+    env = dict(os.environ, SHEETS_LATENCY=str(args.sheets_latency))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--pythonpath', f'{ROOT_DIR},{BENCH_DIR}', 'stub_app:server',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads), '--timeout', '300'],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        transport = HttpTransport(f'http://127.0.0.1:{port}')
+        deadline = time.time() + 120
+        while True:
+            try:
+                transport.get_json('/_dash-layout')
+                break
+            except Exception:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"gunicorn {config} did not start")
+                time.sleep(0.5)
+        result = run_load(transport, args.sessions, args.iterations, args.rows, lambda: _process_tree(process.pid))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return dict(result, config=f'gunicorn {workers} worker(s) x {threads} thread(s)')
+
+
+def report(result: Dict[str, Any]):
+    print(f"\n{result['config']}: {result['sessions']} sessions x {result['iterations']} iterations, "
+          f"{result['rows']:,} rows")
+    print(f"  {result['requests_per_second']} req/s, {result['applies_per_second']} applies/s, "
+          f"peak RSS {result['peak_rss_mb']} MB, {result['errors']} errors, "
+          f"{result['dataset_misses']} dataset misses")
+    print(f"  {'kind':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, stats in [('all', result['overall'])] + list(result['by_kind'].items()):
+        print(f"  {kind:<12}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the dashboard server.")
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=5, help="Apply/Export/Distribute rounds per session")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--sheets-latency', type=float, default=0.2, help="Seconds per stubbed Sheets call")
+    parser.add_argument('--gunicorn', nargs='+', metavar='WORKERSxTHREADS',
+                        help="Run against local gunicorn in each configuration instead of the test client")
+    parser.add_argument('--output', help="Write all results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    if args.gunicorn:
+        for config in args.gunicorn:
+            results.append(run_gunicorn(config, args))
+            report(results[-1])
+    else:
+        os.environ['SHEETS_LATENCY'] = str(args.sheets_latency)
+        from stub_app import server
+        results.append(dict(run_load(TestClientTransport(server), args.sessions, args.iterations, args.rows),
+                            config='Flask test client (in-process)'))
+        report(results[-1])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
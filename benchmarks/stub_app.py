@@ -0,0 +1,95 @@
+"""The dashboard server with Google Sheets replaced by an in-memory stub, for load tests.
+
+    gunicorn --pythonpath .,benchmarks stub_app:server
+
+SHEETS_LATENCY (seconds, default 0.2) is slept on every stubbed Sheets call
+to stand in for the Google API round trip.
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import users  # noqa: E402
+
+SHEETS_LATENCY = float(os.getenv("SHEETS_LATENCY", "0.2"))
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+class StubWorksheet:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.rows = []
+        self.modified = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows = []
+            self.modified += 1
+
+    def update(self, rows):
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows = [[str(value) for value in row] for row in rows]
+            self.modified += 1
+
+    def batch_get(self, ranges):
+        """Row ranges ('1:1') and single-column ranges ('C2:C'), as text like the Sheets API returns."""
+        time.sleep(self.latency)
+        with self._lock:
+            values = []
+            for cell_range in ranges:
+                row_match = re.fullmatch(r'(\d+):(\d+)', cell_range)
+                if row_match:
+                    values.append(self.rows[int(row_match.group(1)) - 1:int(row_match.group(2))])
+                    continue
+                column, first = re.fullmatch(r'([A-Z]+)(\d+):[A-Z]+', cell_range).groups()
+                index = _column_index(column)
+                values.append([[row[index]] if index < len(row) and row[index] != '' else []
+                               for row in self.rows[int(first) - 1:]])
+            return values
+
+
+class StubSpreadsheet:
+    def __init__(self, latency: float):
+        self.sheet1 = StubWorksheet(latency)
+
+    def get_lastUpdateTime(self) -> str:
+        time.sleep(self.sheet1.latency)
+        return str(self.sheet1.modified)
+
+
+class StubSheetsClient:
+    """Just enough of gspread's client for UserManager."""
+
+    def __init__(self, latency: float = SHEETS_LATENCY):
+        self.latency = latency
+        self._sheets = {}
+        self._lock = threading.Lock()
+
+    def open_by_key(self, key: str) -> StubSpreadsheet:
+        time.sleep(self.latency)
+        with self._lock:
+            return self._sheets.setdefault(key, StubSpreadsheet(self.latency))
+
+
+def _stub_google_sheets(self):
+    self._client = StubSheetsClient()
+
+
+users.UserManager.setup_google_sheets = _stub_google_sheets
+
+import app  # noqa: E402
+
+server = app.server
@@ -0,0 +1,96 @@
+"""Synthetic RPA logs in the schema the dashboard expects.
+
+Each case (one housemaid request) spans a few consecutive notes. As in real
+exports, the housemaid and request columns are only filled on a case's first
+note and left blank on the rest, for parse_contents to forward-fill.
+
+    python benchmarks/synthetic.py 100000 rpa.csv [--stages 40] [--nan-rate 0.02]
+"""
+import argparse
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+STAGE_NAMES = [
+    'Pending medical', 'Medical done', 'Pending visa application', 'Visa submitted',
+    'Pending entry permit', 'Entry permit issued', 'Pending ticket', 'Ticket booked',
+    'Pending arrival', 'Arrived', 'Pending Emirates ID', 'Emirates ID applied',
+    'Pending contract', 'Contract signed', 'Pending labour card', 'Labour card issued',
+    'Pending residency', 'Residency stamped', 'Pending insurance', 'Insurance issued'
+]
+NATIONALITIES = ['Filipina', 'Ethiopian', 'Kenyan', 'Indian', 'Sri Lankan', 'Indonesian', 'Ugandan', 'Nepali']
+TYPES = ['CC', 'MV']
+HM_STATUSES = ['Active', 'Pending', 'On hold', 'Cancelled']
+CLIENT_NOTES = [None, 'SUPER_ANGRY_CLIENT', 'PRIORITIZE_VISA']
+CLIENT_NOTE_WEIGHTS = [0.92, 0.03, 0.05]
+FORWARD_FILLED = ['Housemaid Name', 'Housemaid ID', 'HM Status', 'Request ID MB', 'Nationality', 'Type']
+
+
+def stage_names(count: int):
+    """The first `count` stage names, numbered past the realistic list."""
+    return (STAGE_NAMES + [f"Stage {i}" for i in range(len(STAGE_NAMES) + 1, count + 1)])[:count]
+
+
+def generate(rows: int, stages: int = 40, nan_rate: float = 0.02, notes_per_case: int = 3,
+             blank_repeats: bool = True, seed: Optional[int] = 0) -> pd.DataFrame:
+    """Generate `rows` RPA log rows.
+
+    stages sets the Current Stage cardinality. nan_rate is the share of missing
+    Time In Stage and Current Stage values. With blank_repeats, the
+    forward-filled columns are blank after each case's first note.
+    """
+    rng = np.random.default_rng(seed)
+    cases = max(1, rows // notes_per_case)
+    case = np.sort(rng.integers(0, cases, rows))
+    first_note = np.r_[True, case[1:] != case[:-1]]
+    note_index = np.arange(rows) - np.maximum.accumulate(np.where(first_note, np.arange(rows), 0))
+
+    # Per-case attributes; several cases can share a housemaid
+    housemaid = rng.integers(0, max(1, cases * 3 // 4), cases)
+    names = np.array(stage_names(stages), dtype=object)
+    case_stage = names[rng.integers(0, stages, cases)]
+    start = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 90 * 24 * 3600, cases)), unit='s')
+
+    df = pd.DataFrame({
+        'Note time': (start[case] + pd.to_timedelta(note_index * 600, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'RPA try count': note_index,
+        'Housemaid Name': np.char.add('HM ', housemaid.astype(str))[case].astype(object),
+        'Housemaid ID': (100000 + housemaid)[case],
+        'HM Status': np.array(HM_STATUSES, dtype=object)[rng.integers(0, len(HM_STATUSES), cases)][case],
+        'Request ID MB': (5000000 + np.arange(cases))[case],
+        'Nationality': np.array(NATIONALITIES, dtype=object)[rng.integers(0, len(NATIONALITIES), cases)][case],
+        'Type': np.array(TYPES, dtype=object)[rng.integers(0, len(TYPES), cases)][case],
+        'Current Stage': case_stage[case],
+        'Time In Stage': np.round(rng.lognormal(mean=3.0, sigma=0.9, size=rows), 2),
+        'Client Note': np.array(CLIENT_NOTES, dtype=object)[rng.choice(len(CLIENT_NOTES), cases, p=CLIENT_NOTE_WEIGHTS)][case]
+    })
+
+    if nan_rate:
+        df.loc[rng.random(rows) < nan_rate, 'Time In Stage'] = np.nan
+        df.loc[rng.random(rows) < nan_rate, 'Current Stage'] = None
+    if blank_repeats:
+        df.loc[~first_note, FORWARD_FILLED] = None
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic RPA log as CSV or XLSX.")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output', help="Output path ending in .csv or .xlsx")
+    parser.add_argument('--stages', type=int, default=40)
+    parser.add_argument('--nan-rate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = generate(args.rows, stages=args.stages, nan_rate=args.nan_rate, seed=args.seed)
+    if os.path.splitext(args.output)[1].lower() in ('.xls', '.xlsx'):
+        df.to_excel(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df):,} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Per-agent export bundles: one workbook per agent plus a summary, as one zip.
+
+The offline alternative to distributing through Google Sheets. Workbooks are
+written in parallel by a process pool, in openpyxl's write-only mode (rows
+go straight to disk instead of an in-memory sheet), to BUNDLE_DIR/<token>/.
+The /export/bundle/<token> route then streams them to the browser as a zip
+and removes the directory. Any worker can serve the download.
+"""
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+BUNDLE_DIR = os.getenv("BUNDLE_DIR", os.path.join(tempfile.gettempdir(), "agent_bundles"))
+BUNDLE_WORKERS = int(os.getenv("BUNDLE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Prepared bundles not downloaded within this many seconds are removed
+BUNDLE_TTL = float(os.getenv("BUNDLE_TTL", "3600"))
+SUMMARY_FILENAME = '_summary.xlsx'
+STREAM_CHUNK_BYTES = 1 << 20
+
+_TOKEN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def write_workbook(path: str, header: List[str], rows: List[List[Any]]) -> int:
+    """Write one sheet in write-only mode; runs in a pool process."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return len(rows)
+
+
+def _cell_rows(frame: pd.DataFrame) -> List[List[Any]]:
+    """Rows as cell values, missing values (NaN, None, or pd.NA of Arrow-backed columns) as empty cells."""
+    return frame.astype(object).where(frame.notna(), None).values.tolist()
+
+
+def safe_filename(name: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'agent'
+
+
+def workbook_filenames(usernames: List[str]) -> Dict[str, str]:
+    """One .xlsx name per username, numbered where sanitizing (or letter case) makes two alike."""
+    files: Dict[str, str] = {}
+    taken = {SUMMARY_FILENAME.lower()}
+    for username in usernames:
+        base = safe_filename(username)
+        filename, n = f"{base}.xlsx", 1
+        while filename.lower() in taken:
+            n += 1
+            filename = f"{base}-{n}.xlsx"
+        taken.add(filename.lower())
+        files[username] = filename
+    return files
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable sink for zipfile: written bytes are collected until drained into the response."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+class BundleBuilder:
+    """Writes bundles with a per-process pool and streams them back as zips."""
+
+    def __init__(self, directory: str = BUNDLE_DIR, workers: int = BUNDLE_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """Created on first export; spawned, since forking a threaded server process is unsafe."""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=max(1, self.workers), mp_context=get_context('spawn'))
+        return self._pool
+
+    def build(self, chunks: Dict[str, pd.DataFrame], summary: pd.DataFrame) -> str:
+        """Write {file name: rows} and the summary in parallel; returns the bundle token."""
+        self._remove_expired()
+        token = uuid.uuid4().hex
+        folder = os.path.join(self.directory, token)
+        os.makedirs(folder)
+        try:
+            with stage('bundle', rows=sum(len(chunk) for chunk in chunks.values())):
+                futures = [
+                    self.pool.submit(write_workbook, os.path.join(folder, filename),
+                                     [str(c) for c in chunk.columns], _cell_rows(chunk))
+                    for filename, chunk in chunks.items()
+                ]
+                write_workbook(os.path.join(folder, SUMMARY_FILENAME), list(summary.columns), _cell_rows(summary))
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            shutil.rmtree(folder, ignore_errors=True)
+            if isinstance(e, BrokenProcessPool):
+                # A crashed pool process breaks the whole pool; start a fresh one next time
+                self._pool = None
+            raise
+        return token
+
+    def stream(self, token: str) -> Optional[Iterator[bytes]]:
+        """Zip of a prepared bundle, produced file by file; the bundle is removed once sent."""
+        folder = os.path.join(self.directory, token)
+        if not _TOKEN.match(token) or not os.path.isdir(folder):
+            return None
+
+        def generate():
+            sink = _ZipSink()
+            try:
+                # Workbooks are already deflated, so they are stored as is
+                with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as bundle:
+                    for filename in sorted(os.listdir(folder)):
+                        with open(os.path.join(folder, filename), 'rb') as src, bundle.open(filename, 'w') as dest:
+                            while True:
+                                data = src.read(STREAM_CHUNK_BYTES)
+                                if not data:
+                                    break
+                                dest.write(data)
+                                yield sink.drain()
+                yield sink.drain()
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+        return generate()
+
+    def _remove_expired(self):
+        cutoff = time.time() - BUNDLE_TTL
+        try:
+            for token in os.listdir(self.directory):
+                path = os.path.join(self.directory, token)
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            os.makedirs(self.directory, exist_ok=True)
+
+
+def bundle_summary(chunks: Dict[str, pd.DataFrame], agents: Dict[str, str]) -> pd.DataFrame:
+    """Rows and distinct cases of every agent's file; agents maps file name -> agent name."""
+    rows = []
+    for filename, chunk in chunks.items():
+        requests = chunk['Request ID MB'] if 'Request ID MB' in chunk.columns else pd.Series(range(len(chunk)))
+        late = (chunk['Late'].fillna(False).astype(bool).to_numpy() if 'Late' in chunk.columns
+                else np.ones(len(chunk), dtype=bool))
+        rows.append({'Agent': agents.get(filename, filename), 'File': filename, 'Rows': len(chunk),
+                     'Cases': requests.nunique(), 'Late Cases': requests[late].nunique()})
+    return pd.DataFrame(rows, columns=['Agent', 'File', 'Rows', 'Cases', 'Late Cases'])
+
+
+def install_bundle_downloads(server, builder: Optional[BundleBuilder] = None):
+    """Route that streams prepared bundles as zip downloads."""
+    from flask import Response, abort
+
+    builder = builder or bundle_builder
+
+    @server.route('/export/bundle/<token>')
+    def download_bundle(token):
+        chunks = builder.stream(token)
+        if chunks is None:
+            abort(404)
+        filename = f"agent_bundle_{time.strftime('%Y%m%d_%H%M')}.zip"
+        return Response(chunks, mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+# Shared builder for this worker process
+bundle_builder = BundleBuilder()
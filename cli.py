@@ -0,0 +1,165 @@
+"""Headless batch run of the ingest -> filter -> late -> distribute/export pipeline.
+
+Example (cron):
+    python cli.py exports/rpa.xlsx --config morning.yaml --export out/late.xlsx --distribute
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+from instrumentation import current_rss_mb
+from rules import RuleTable
+from pipeline import (
+    DEFAULT_THRESHOLD, parse_file, apply_filters, late_flags, row_thresholds, to_csv_bytes, to_excel_bytes
+)
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    """Read thresholds, filters and users from a JSON or YAML file."""
+    with open(path) as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("PyYAML is required for YAML configs (pip install pyyaml)")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+class StageRecorder:
+    """Collects wall time, memory and row counts per pipeline stage."""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: List[Dict[str, Any]] = []
+        self.failures: List[str] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        record = {'stage': name}
+        # tracemalloc gives exact Python allocation peaks but slows openpyxl down a lot
+        if self.trace_memory:
+            tracemalloc.start()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            record['rss_mb'] = round(current_rss_mb(), 2)
+            record['rss_delta_mb'] = round(record['rss_mb'] - rss_before, 2)
+            if self.trace_memory:
+                record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                tracemalloc.stop()
+            self.stages.append(record)
+
+    def report(self) -> Dict[str, Any]:
+        scale = 2**20 if sys.platform == 'darwin' else 2**10
+        return {
+            'stages': self.stages,
+            'total_seconds': round(sum(s['seconds'] for s in self.stages), 4),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 2),
+            'failures': self.failures
+        }
+
+
+def run(args) -> Dict[str, Any]:
+    config = load_config(args.config) if args.config else {}
+    filters = config.get('filters', {})
+    recorder = StageRecorder(trace_memory=args.trace_memory)
+
+    with recorder.stage('parse') as record:
+        df = parse_file(args.input)
+        record['rows'] = len(df)
+    if df.empty:
+        raise SystemExit(f"No rows parsed from {args.input}")
+
+    with recorder.stage('filter') as record:
+        filtered_df = apply_filters(
+            df,
+            filters.get('stages'), filters.get('types'),
+            filters.get('nationalities'), filters.get('client_notes')
+        )
+        record['rows'] = len(filtered_df)
+
+    default_threshold = config.get('default_threshold', DEFAULT_THRESHOLD)
+    rules = None
+    if args.rules:
+        with open(args.rules, 'rb') as f:
+            rules = RuleTable.from_bytes(f.read(), args.rules)
+    elif config.get('rules'):
+        rules = RuleTable.from_dict({'rules': config['rules'], 'default': default_threshold})
+
+    with recorder.stage('late') as record:
+        filtered_df['Late'] = late_flags(
+            filtered_df, config.get('thresholds', {}), default_threshold, rules=rules
+        )
+        late_cases_df = filtered_df[filtered_df['Late'] == True]
+        record['rows'] = len(late_cases_df)
+
+    if args.distribute:
+        usernames = args.users.split(',') if args.users else config.get('users', [])
+        if not usernames:
+            raise SystemExit("No users given for distribution (--users or 'users' in config)")
+        # The same path as the dashboard's Distribute: done cases skipped, queues recorded locally
+        from distribution import distribute_cases, refresh_done, without_done
+        from users import UserManager
+        manager = UserManager()
+        with recorder.stage('distribute') as record:
+            refresh_done(manager)
+            distributed_df, record['skipped_done'] = without_done(late_cases_df)
+            thresholds = row_thresholds(distributed_df, config.get('thresholds', {}), default_threshold, rules=rules)
+            results = distribute_cases(manager, usernames, distributed_df, thresholds)
+            record['rows'] = len(distributed_df)
+            record['results'] = results
+            failed = [username for username, result in results.items() if result['status'] != 'success']
+            if failed:
+                recorder.failures.append(f"distribution failed for {', '.join(failed)}")
+
+    if args.export:
+        export_df = late_cases_df if args.late_only else filtered_df
+        with recorder.stage('export') as record:
+            if args.export.lower().endswith(('.xls', '.xlsx')):
+                payload = to_excel_bytes(export_df)
+            else:
+                payload = to_csv_bytes(export_df)
+            with open(args.export, 'wb') as f:
+                f.write(payload)
+            record['rows'] = len(export_df)
+            record['bytes'] = len(payload)
+
+    return recorder.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the housemaid late-case pipeline on a local file.")
+    parser.add_argument('input', help="CSV or XLSX RPA export")
+    parser.add_argument('--config', help="JSON/YAML file with thresholds, rules, default_threshold, filters and users")
+    parser.add_argument('--rules', help="JSON/CSV threshold rule file (stage, type, nationality, hours)")
+    parser.add_argument('--export', help="Write filtered data to this .csv or .xlsx path")
+    parser.add_argument('--late-only', action='store_true', help="Export only late cases")
+    parser.add_argument('--distribute', action='store_true', help="Distribute late cases to the users' Google Sheets")
+    parser.add_argument('--users', help="Comma-separated usernames, overrides 'users' in the config")
+    parser.add_argument('--trace-memory', action='store_true', help="Also record tracemalloc peaks per stage (slower)")
+    parser.add_argument('--metrics', help="Write stage timing and memory figures to this JSON file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if report['failures']:
+        # Cron only notices a failed run by its exit status
+        raise SystemExit("; ".join(report['failures']))
+
+
+if __name__ == '__main__':
+    main()
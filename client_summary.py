@@ -0,0 +1,60 @@
+"""Compact typed-array summary of a dataset for in-browser filtering and aggregation."""
+import base64
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline import id_keys
+from rules import RuleTable, ThresholdRule
+
+CLIENT_MODE_MAX_ROWS = int(os.getenv("CLIENT_MODE_MAX_ROWS", "100000"))
+
+# Change-since-last-upload codes, matching delta.CHANGE_LABELS order
+CHANGE_CODES = {'newly_late': 1, 'still_late': 2, 'resolved': 3}
+
+
+def encode_array(values: np.ndarray, dtype: str) -> Dict[str, str]:
+    """Base64 of the little-endian bytes, decoded into a JS typed array in the browser."""
+    return {'dtype': dtype, 'data': base64.b64encode(np.ascontiguousarray(values, dtype='<' + dtype).tobytes()).decode()}
+
+
+def _codes(series: pd.Series):
+    codes, uniques = pd.factorize(series.astype(str).where(series.notna()))
+    dtype = 'i2' if len(uniques) < 2**15 else 'i4'
+    return encode_array(codes, dtype), [str(u) for u in uniques]
+
+
+def build_case_summary(df: pd.DataFrame, rules: RuleTable,
+                       delta: Optional[Dict[str, pd.Index]] = None) -> Optional[Dict[str, Any]]:
+    """Per-row codes, Time In Stage and rule thresholds; None when the dataset is too large."""
+    if df.empty or len(df) > CLIENT_MODE_MAX_ROWS:
+        return None
+
+    summary: Dict[str, Any] = {'rows': len(df), 'columns': {}, 'vocab': {}}
+    for name, column in [('stage', 'Current Stage'), ('type', 'Type'),
+                         ('nationality', 'Nationality'), ('note', 'Client Note')]:
+        summary['columns'][name], summary['vocab'][name] = _codes(df[column])
+
+    # Metrics count distinct housemaid names, so the housemaid code follows the name
+    housemaid_codes, _ = pd.factorize(df['Housemaid Name'])
+    summary['columns']['housemaid'] = encode_array(housemaid_codes, 'i4')
+    time_in_stage = pd.to_numeric(df['Time In Stage'], errors='coerce').to_numpy(dtype='float64')
+    summary['columns']['time'] = encode_array(time_in_stage, 'f8')
+
+    # Thresholds from the rule table alone, and where a stage threshold from the editor would win
+    stages: List[str] = summary['vocab']['stage']
+    summary['columns']['base_threshold'] = encode_array(rules.lookup(df), 'f8')
+    shadow = RuleTable(rules.rules + [ThresholdRule(hours=float('nan'), stage=s) for s in stages], rules.default)
+    summary['columns']['overridable'] = encode_array(np.isnan(shadow.lookup(df)), 'u1')
+    summary['stage_default'] = [rules.stage_default(s) for s in stages]
+
+    change = np.zeros(len(df), dtype='int8')
+    if delta is not None:
+        ids = pd.Series(id_keys(df['Housemaid ID']))
+        for name, code in CHANGE_CODES.items():
+            change[ids.isin(delta[name]).to_numpy()] = code
+    summary['columns']['change'] = encode_array(change, 'i1')
+    summary['change_codes'] = CHANGE_CODES
+    return summary
@@ -0,0 +1,235 @@
+"""Read-back of agents' sheets to track which distributed cases are done.
+
+Each agent's sheet is fetched in parallel. A sheet whose Drive modified time
+has not changed since the last read is not read again. A changed sheet is read
+with one batch_get for its header row and one for its Request ID MB and
+Status columns, instead of downloading the whole sheet.
+
+Cases read back as done are recorded in a ledger file shared by all workers.
+A new distribution overwrites the sheet and its Status column, but the ledger
+keeps the case done, so it is not handed out again.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from drilldown import housemaid_key
+from instrumentation import stage
+
+# Column added to distributed sheets for agents to mark progress
+STATUS_COLUMN = 'Status'
+ID_COLUMN = 'Request ID MB'
+STAGE_COLUMN = 'Current Stage'
+DONE_STATUSES = {s.strip().lower() for s in os.getenv("DONE_STATUSES", "done,completed,resolved,closed").split(',')}
+MAX_SHEET_READERS = int(os.getenv("MAX_SHEET_READERS", "8"))
+DONE_LEDGER_PATH = os.getenv("DONE_LEDGER_PATH", "done_ledger.json")
+
+
+def _column_letter(index: int) -> str:
+    """Spreadsheet column letter for a 0-based column index (0 -> A, 26 -> AA)."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+@dataclass
+class SheetProgress:
+    modified: Optional[str] = None
+    # Request ID key -> status text as the agent typed it
+    statuses: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+    # Request ID key -> stage of the case's last row in the sheet ('' for sheets without the column)
+    stages: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def done(self) -> Set[str]:
+        return {request for request, status in self.statuses.items() if status.strip().lower() in DONE_STATUSES}
+
+
+class DoneLedger:
+    """Done cases by request ID and stage, persisted to a JSON file and shared by all workers through it.
+
+    A case is done at the stage it was in when marked; once it moves on to another
+    stage and goes late there, it is handed out again.
+    """
+
+    def __init__(self, path: str = DONE_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Request ID key -> stage -> agent who marked it, the status text and when it was first read as done
+        self._entries: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self._mtime: Optional[float] = None
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                print(f"Error loading done ledger: {str(e)}")
+            return
+        # Entries written before stages were recorded hold the case directly; their stage is unknown ('')
+        self._entries = {request: {'': value} if 'agent' in value else value for request, value in entries.items()}
+        self._mtime = mtime
+
+    def record(self, username: str, progress: SheetProgress):
+        """Add the sheet's done cases; cases this agent set back to another status are removed."""
+        done = progress.done
+        with self._lock, open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            cases = {request: progress.stages.get(request, '') for request in progress.statuses}
+            reopened = [(request, case_stage) for request, case_stage in cases.items() if request not in done
+                        and self._entries.get(request, {}).get(case_stage, {}).get('agent') == username]
+            added = [(request, cases[request]) for request in done
+                     if cases[request] not in self._entries.get(request, {})]
+            if not added and not reopened:
+                return
+            for request, case_stage in reopened:
+                del self._entries[request][case_stage]
+                if not self._entries[request]:
+                    del self._entries[request]
+            at = time.strftime('%Y-%m-%d %H:%M')
+            for request, case_stage in added:
+                self._entries.setdefault(request, {})[case_stage] = {
+                    'agent': username, 'status': progress.statuses[request], 'at': at
+                }
+            tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(self._entries, f)
+                os.replace(tmp, self.path)
+                self._mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                print(f"Error saving done ledger: {str(e)}")
+
+    def cases(self) -> Set[Tuple[str, str]]:
+        """(request ID key, stage) of every done case."""
+        with self._lock:
+            self._refresh()
+            return {(request, case_stage) for request, stages in self._entries.items() for case_stage in stages}
+
+
+class CompletionTracker:
+    """Cached read-back of every agent's sheet, re-read only when the sheet has changed."""
+
+    def __init__(self, ledger: DoneLedger, max_workers: int = MAX_SHEET_READERS):
+        self.ledger = ledger
+        self.max_workers = max_workers
+        self._progress: Dict[str, SheetProgress] = {}
+        self._lock = threading.Lock()
+
+    def _read(self, client, sheet_id: str, cached: Optional[SheetProgress]) -> SheetProgress:
+        with stage('sheets.open'):
+            spreadsheet = client.open_by_key(sheet_id)
+        # One Drive metadata request, much cheaper than reading the sheet's columns back
+        try:
+            with stage('sheets.modified'):
+                modified = spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            print(f"Error reading sheet modified time: {str(e)}")
+            modified = None
+        if cached is not None and cached.error is None and modified is not None and cached.modified == modified:
+            return cached
+        worksheet = spreadsheet.sheet1
+        with stage('sheets.batch_get'):
+            header = (worksheet.batch_get(['1:1'])[0] or [[]])[0]
+            if ID_COLUMN not in header or STATUS_COLUMN not in header:
+                return SheetProgress(modified)
+            ranges = [f'{letter}2:{letter}' for letter in
+                      (_column_letter(header.index(c)) for c in [ID_COLUMN, STATUS_COLUMN, STAGE_COLUMN] if c in header)]
+            # The stage column comes in the same batch_get, so it costs no extra request
+            ids, statuses, *stages = worksheet.batch_get(ranges)
+        stages = stages[0] if stages else []
+        progress = SheetProgress(modified)
+        for i, row in enumerate(ids):
+            if row and row[0] != '':
+                status = statuses[i][0] if i < len(statuses) and statuses[i] else ''
+                key = housemaid_key(_number(row[0]))
+                # A case spans several notes (rows); the status typed on any of them counts
+                progress.statuses[key] = status or progress.statuses.get(key, '')
+                # A case's rows follow note order, so the last one holds its current stage
+                progress.stages[key] = stages[i][0] if i < len(stages) and stages[i] else ''
+        return progress
+
+    def refresh(self, client, sheets: Dict[str, str]) -> Dict[str, SheetProgress]:
+        """Re-read the given {username: sheet id} sheets in parallel; failures keep the last good read."""
+        with self._lock:
+            cached = dict(self._progress)
+
+        def read(username):
+            try:
+                return username, self._read(client, sheets[username], cached.get(username))
+            except Exception as e:
+                previous = cached.get(username) or SheetProgress()
+                return username, SheetProgress(previous.modified, previous.statuses, str(e))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sheets)))) as pool:
+            results = dict(pool.map(read, list(sheets)))
+        with self._lock:
+            self._progress.update(results)
+        for username, progress in results.items():
+            if progress.error is None:
+                self.ledger.record(username, progress)
+        return results
+
+    def done_cases(self) -> Set[Tuple[str, str]]:
+        """(request ID, stage) of cases any agent has marked done, on any worker, including sheets since overwritten."""
+        return self.ledger.cases()
+
+    def forget(self, username: str):
+        """Drop a sheet's cached read, e.g. after it has been overwritten; its done cases stay in the ledger."""
+        with self._lock:
+            self._progress.pop(username, None)
+
+
+def _number(value: Any) -> Any:
+    """Sheet cells come back as text; '5000123' and '5000123.0' match the dataset's numeric IDs."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def progress_table(progress: Dict[str, SheetProgress], late_requests: Set[str],
+                   names: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Per-agent assigned/done/pending counts, with pending split by whether the case is still late."""
+    rows = []
+    for username, sheet in progress.items():
+        assigned = set(sheet.statuses)
+        done = sheet.done
+        pending = assigned - done
+        rows.append({
+            'agent': names.get(username, username),
+            'assigned': len(assigned),
+            'done': len(done),
+            'pending': len(pending),
+            'pending_still_late': len(pending & late_requests),
+            'status': sheet.error or 'OK'
+        })
+    return rows
+
+
+def request_keys(df: pd.DataFrame) -> Set[str]:
+    """Request ID keys of a frame, matching the keys read back from sheets."""
+    if df.empty or ID_COLUMN not in df.columns:
+        return set()
+    return {housemaid_key(v) for v in df[ID_COLUMN].dropna().unique()}
+
+
+# Shared tracker for this worker process
+completion_tracker = CompletionTracker(DoneLedger())
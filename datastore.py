@@ -0,0 +1,346 @@
+"""Server-side cache of parsed datasets with keyed, deduplicating merges."""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from pipeline import id_keys
+from sharedstore import SharedDatasetFiles, shared_files
+
+# Columns that identify one note of one request; a later upload carrying the
+# same key replaces the earlier row instead of duplicating it.
+MERGE_KEYS = ['Request ID MB', 'Note time']
+
+# Filter dropdowns and the column each one is populated from
+FILTER_COLUMNS = {
+    'stage': 'Current Stage',
+    'type': 'Type',
+    'nationality': 'Nationality',
+    'client_note': 'Client Note'
+}
+
+MAX_CACHED_DATASETS = int(os.getenv("MAX_CACHED_DATASETS", "8"))
+# Versions tried when the published one is replaced while a worker maps it
+SHARED_LOAD_ATTEMPTS = 3
+
+_index_lock = threading.Lock()
+
+
+def hash_rows(df: pd.DataFrame, columns: Optional[List[str]] = None) -> np.ndarray:
+    """Hash each row of a DataFrame (optionally restricted to some columns) to a uint64."""
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    if df.shape[1] == 0:
+        return np.zeros(len(df), dtype='uint64')
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def key_hashes(df: pd.DataFrame, row_hashes: np.ndarray) -> np.ndarray:
+    """Hash of each row's MERGE_KEYS in a canonical form, so 1001 and 1001.0 (or a date and its text) match.
+
+    A row missing part of its key can only be superseded by an exact copy, so it keeps its row hash.
+    """
+    columns = [c for c in MERGE_KEYS if c in df.columns]
+    if not columns or df.empty:
+        return np.asarray(row_hashes, dtype='uint64')
+    keys = pd.DataFrame({column: id_keys(df[column]) for column in columns})
+    incomplete = keys.isna().any(axis=1).to_numpy()
+    return np.where(incomplete, np.asarray(row_hashes, dtype='uint64'), hash_rows(keys))
+
+
+def unique_strings(series: pd.Series) -> Set[str]:
+    """Distinct non-null values of a series as strings."""
+    return {str(x) for x in series.unique() if pd.notna(x)}
+
+
+def stage_value_counts(df: pd.DataFrame) -> pd.Series:
+    """Row counts per stage, keyed by the stage as a string."""
+    if 'Current Stage' not in df.columns:
+        return pd.Series(dtype='int64')
+    stages = df['Current Stage'].dropna().astype(str)
+    return stages.value_counts()
+
+
+class DatasetExpired(LookupError):
+    """The dataset is no longer cached: evicted, or held by another worker without a shared directory."""
+
+
+@dataclass
+class MergeResult:
+    added: int = 0
+    replaced: int = 0
+    duplicates: int = 0
+    new_stages: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Dataset:
+    dataset_id: str
+    df: pd.DataFrame
+    row_hashes: pd.Index
+    key_hashes: np.ndarray
+    options: Dict[str, Set[str]]
+    stage_counts: pd.Series
+    version: int = 1
+    last_access: float = field(default_factory=time.time)
+    # Dataset version in which each stage first appeared
+    stage_versions: Dict[str, int] = field(default_factory=dict)
+    pinned: bool = False
+    # Derived lookup structures, stored as name -> (version built from, index)
+    indexes: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def stages(self) -> List[str]:
+        return sorted(self.options['stage'])
+
+    def stages_since(self, version: int) -> List[str]:
+        """Stages added after the given dataset version."""
+        return sorted(stage for stage, added in self.stage_versions.items() if added > version)
+
+    def derived(self, name: str, build: Callable[[pd.DataFrame], Any]) -> Any:
+        """A lookup structure built from df, rebuilt only when the dataset version changes."""
+        cached = self.indexes.get(name)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        with _index_lock:
+            cached = self.indexes.get(name)
+            if cached is None or cached[0] != self.version:
+                cached = (self.version, build(self.df))
+                self.indexes[name] = cached
+            return cached[1]
+
+    def filter_options(self) -> Dict[str, List[str]]:
+        """Sorted dropdown values for every filter column."""
+        return {name: sorted(values) for name, values in self.options.items()}
+
+
+class DatasetStore:
+    """Thread-safe, LRU-bounded cache of parsed uploads keyed by dataset id.
+
+    With a shared directory, every new version is published there as a
+    memory-mapped Arrow file and other workers map it instead of re-parsing.
+    """
+
+    def __init__(self, max_datasets: int = MAX_CACHED_DATASETS, shared: Optional[SharedDatasetFiles] = None):
+        self.max_datasets = max_datasets
+        self.shared = shared
+        self._datasets: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def create(self, df: pd.DataFrame, dataset_id: Optional[str] = None, pinned: bool = False) -> Dataset:
+        """Register a freshly parsed DataFrame as a new dataset; pinned datasets are never evicted."""
+        df, row_hashes = self._drop_duplicate_rows(df.reset_index(drop=True))
+        df, row_hashes, keys = self._drop_duplicate_keys(df, row_hashes)
+        dataset = Dataset(
+            dataset_id=dataset_id or uuid.uuid4().hex,
+            df=df,
+            row_hashes=pd.Index(row_hashes),
+            key_hashes=keys,
+            options={name: unique_strings(df[col]) if col in df.columns else set()
+                     for name, col in FILTER_COLUMNS.items()},
+            stage_counts=stage_value_counts(df),
+            pinned=pinned
+        )
+        dataset.stage_versions = {stage: 1 for stage in dataset.options['stage']}
+        if self.shared is not None:
+            with self.shared.lock(dataset.dataset_id):
+                # Re-creating a published id (the watched dataset) continues its version sequence
+                dataset.version = (self.shared.latest_version(dataset.dataset_id) or 0) + 1
+                dataset.stage_versions = {stage: dataset.version for stage in dataset.options['stage']}
+                self._publish(dataset)
+        self._remember(dataset)
+        return dataset
+
+    def _remember(self, dataset: Dataset):
+        with self._lock:
+            self._datasets[dataset.dataset_id] = dataset
+            self._datasets.move_to_end(dataset.dataset_id)
+            self._evict()
+
+    def _publish(self, dataset: Dataset):
+        """Write the dataset to the shared directory and switch it to the mapped copy."""
+        meta = {
+            'version': dataset.version,
+            'options': {name: sorted(values) for name, values in dataset.options.items()},
+            'stage_counts': {str(k): int(v) for k, v in dataset.stage_counts.items()},
+            'stage_versions': dataset.stage_versions,
+            'pinned': dataset.pinned
+        }
+        self.shared.publish(dataset.dataset_id, dataset.version, dataset.df,
+                            dataset.row_hashes.to_numpy(), dataset.key_hashes, meta)
+        dataset.df, row_hashes, dataset.key_hashes, _ = self.shared.load(dataset.dataset_id, dataset.version)
+        dataset.row_hashes = pd.Index(row_hashes)
+
+    def _load_shared(self, dataset_id: str, version: int) -> Optional[Dataset]:
+        """Map a version another worker published, following newer versions; None if the dataset is gone."""
+        for _ in range(SHARED_LOAD_ATTEMPTS):
+            try:
+                df, row_hashes, key_hashes, meta = self.shared.load(dataset_id, version)
+                break
+            except OSError:
+                # Replaced by a newer version while we were reading the pointer
+                latest = self.shared.latest_version(dataset_id)
+                if latest is None or latest == version:
+                    return None
+                version = latest
+        else:
+            return None
+        return Dataset(
+            dataset_id=dataset_id,
+            df=df,
+            row_hashes=pd.Index(row_hashes),
+            key_hashes=key_hashes,
+            options={name: set(values) for name, values in meta['options'].items()},
+            stage_counts=pd.Series(meta['stage_counts'], dtype='int64'),
+            version=meta['version'],
+            stage_versions=meta['stage_versions'],
+            pinned=meta['pinned']
+        )
+
+    def _evict(self):
+        """Drop least recently used, unpinned datasets beyond the cache size."""
+        unpinned = [key for key, dataset in self._datasets.items() if not dataset.pinned]
+        while len(self._datasets) > self.max_datasets and unpinned:
+            del self._datasets[unpinned.pop(0)]
+
+    def evict_oldest(self) -> Optional[str]:
+        """Drop the least recently used unpinned dataset and return its id, or None if there is none."""
+        with self._lock:
+            for key, dataset in self._datasets.items():
+                if not dataset.pinned:
+                    del self._datasets[key]
+                    return key
+        return None
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Size, row count and last access of every cached dataset, least recently used first."""
+        with self._lock:
+            datasets = list(self._datasets.values())
+        return [{
+            'dataset_id': dataset.dataset_id,
+            'rows': len(dataset.df),
+            'bytes': int(dataset.df.memory_usage(deep=True).sum()
+                         + dataset.row_hashes.nbytes + dataset.key_hashes.nbytes),
+            'version': dataset.version,
+            'pinned': dataset.pinned,
+            'last_access': dataset.last_access
+        } for dataset in datasets]
+
+    def get(self, dataset_id: Optional[str]) -> Optional[Dataset]:
+        """Return a cached dataset, or None if it was never stored or has been evicted."""
+        if not dataset_id:
+            return None
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+        if self.shared is not None:
+            latest = self.shared.latest_version(dataset_id)
+            if latest is not None and (dataset is None or dataset.version < latest):
+                mapped = self._load_shared(dataset_id, latest)
+                if mapped is not None:
+                    dataset = mapped
+                    self._remember(dataset)
+        with self._lock:
+            if dataset is not None:
+                dataset.last_access = time.time()
+                if dataset_id in self._datasets:
+                    self._datasets.move_to_end(dataset_id)
+            return dataset
+
+    def append(self, dataset_id: str, new_df: pd.DataFrame) -> MergeResult:
+        """Merge new rows into a dataset keyed by MERGE_KEYS, dropping exact duplicates."""
+        if self.shared is None:
+            return self._merge(dataset_id, new_df)
+        with self.shared.lock(dataset_id):
+            # Merge into the latest published version, then publish the result
+            self.get(dataset_id)
+            result = self._merge(dataset_id, new_df)
+            if result.added:
+                self._publish(self._datasets[dataset_id])
+            return result
+
+    def _merge(self, dataset_id: str, new_df: pd.DataFrame) -> MergeResult:
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is None:
+                raise DatasetExpired(dataset_id)
+            result = MergeResult()
+
+            new_df, new_hashes = self._drop_duplicate_rows(new_df.reset_index(drop=True))
+            # Probe the existing row-hash index; only rows never seen before survive
+            unseen = dataset.row_hashes.get_indexer(new_hashes) < 0
+            result.duplicates = int((~unseen).sum())
+            new_df = new_df[unseen].reset_index(drop=True)
+            new_hashes = new_hashes[unseen]
+            if new_df.empty:
+                return result
+
+            # A key repeated within the file counts once (its last row), like a key from an earlier upload
+            rows = len(new_df)
+            new_df, new_hashes, new_keys = self._drop_duplicate_keys(new_df, new_hashes)
+            # Rows whose key reappears in the new file are superseded by it
+            superseded = pd.Series(dataset.key_hashes).isin(new_keys).to_numpy()
+            result.replaced = int(superseded.sum()) + rows - len(new_df)
+            result.added = len(new_df)
+
+            old_df = dataset.df
+            kept = ~superseded
+            combined = pd.concat([old_df[kept], new_df], ignore_index=True)
+            hashes = np.concatenate([dataset.row_hashes.to_numpy()[kept], new_hashes])
+            keys = np.concatenate([dataset.key_hashes[kept], new_keys])
+
+            sort_cols = [c for c in ['Note time', 'RPA try count'] if c in combined.columns]
+            if sort_cols:
+                order = combined.sort_values(by=sort_cols, kind='mergesort').index.to_numpy()
+                combined = combined.take(order).reset_index(drop=True)
+                hashes = hashes[order]
+                keys = keys[order]
+
+            # Update derived structures from the delta only
+            for name, col in FILTER_COLUMNS.items():
+                if col in new_df.columns:
+                    fresh = unique_strings(new_df[col]) - dataset.options[name]
+                    dataset.options[name] |= fresh
+                    if name == 'stage':
+                        result.new_stages = sorted(fresh)
+            counts = dataset.stage_counts.sub(stage_value_counts(old_df[superseded]), fill_value=0)
+            counts = counts.add(stage_value_counts(new_df), fill_value=0)
+            dataset.stage_counts = counts[counts > 0].astype('int64')
+
+            dataset.df = combined
+            dataset.row_hashes = pd.Index(hashes)
+            dataset.key_hashes = keys
+            dataset.version += 1
+            for stage in result.new_stages:
+                dataset.stage_versions[stage] = dataset.version
+            dataset.last_access = time.time()
+            return result
+
+    @staticmethod
+    def _drop_duplicate_rows(df: pd.DataFrame):
+        """Drop rows that are exact duplicates of an earlier row; return the frame and its row hashes."""
+        hashes = hash_rows(df)
+        first = ~pd.Index(hashes).duplicated()
+        if not first.all():
+            df = df[first].reset_index(drop=True)
+            hashes = hashes[first]
+        return df, hashes
+
+    @staticmethod
+    def _drop_duplicate_keys(df: pd.DataFrame, row_hashes: np.ndarray):
+        """Keep the last row of every merge key; return the frame, its row hashes and its key hashes."""
+        keys = key_hashes(df, row_hashes)
+        last = ~pd.Index(keys).duplicated(keep='last')
+        if not last.all():
+            df = df[last].reset_index(drop=True)
+            row_hashes, keys = np.asarray(row_hashes)[last], keys[last]
+        return df, row_hashes, keys
+
+
+# Shared store for this worker process
+dataset_store = DatasetStore(shared=shared_files())
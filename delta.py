@@ -0,0 +1,168 @@
+"""Upload-to-upload comparison of late cases per housemaid.
+
+Each session's (or the team's) last snapshot and delta are saved to
+SNAPSHOT_DIR, so the change filter works on whichever worker serves a request.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pipeline import id_keys
+
+# Snapshots are kept per browser session unless the whole team shares one baseline
+SNAPSHOT_SCOPE = os.getenv("SNAPSHOT_SCOPE", "session")
+# Sessions whose snapshot and delta are kept; the least recently used are dropped beyond this
+MAX_SNAPSHOTS = int(os.getenv("MAX_SNAPSHOTS", "256"))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "upload_snapshots"))
+# Snapshots not replaced within this many seconds are removed
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", str(7 * 24 * 3600)))
+
+CHANGE_LABELS = {
+    'newly_late': "Newly Late",
+    'still_late': "Still Late",
+    'resolved': "Resolved"
+}
+
+
+def build_snapshot(df: pd.DataFrame, late: pd.Series) -> pd.DataFrame:
+    """Compact per-housemaid snapshot: whether any of the housemaid's rows is late."""
+    ids = id_keys(df['Housemaid ID'])
+    known = pd.notna(ids)
+    frame = pd.DataFrame({'late': late.to_numpy()[known]}, index=ids[known])
+    return frame.groupby(level=0).agg(late=('late', 'any'))
+
+
+def compare_snapshots(previous: pd.DataFrame, current: pd.DataFrame) -> Dict[str, pd.Index]:
+    """Split housemaids into newly late, still late and resolved with two hash joins."""
+    was_late = previous['late'].reindex(current.index, fill_value=False).to_numpy(dtype=bool)
+    is_late = current['late'].to_numpy(dtype=bool)
+    # A previously late housemaid that is missing from the new upload counts as resolved
+    still_listed_late = current['late'].reindex(previous.index, fill_value=False).to_numpy(dtype=bool)
+    return {
+        'newly_late': current.index[is_late & ~was_late],
+        'still_late': current.index[is_late & was_late],
+        'resolved': previous.index[previous['late'].to_numpy(dtype=bool) & ~still_listed_late]
+    }
+
+
+class SnapshotStore:
+    """Last upload snapshot and the resulting delta per session or team, saved to a shared directory.
+
+    Every worker reads them back from SNAPSHOT_DIR; the in-memory LRU only caches
+    the latest read of each, by file modification time.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR, max_sessions: int = MAX_SNAPSHOTS):
+        self.directory = directory
+        self.max_sessions = max_sessions
+        # Scope key -> (file mtime, snapshot, delta)
+        self._cached: "OrderedDict[str, Tuple[float, pd.DataFrame, Optional[Dict[str, pd.Index]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def scope_key(self, session_id: Optional[str]) -> str:
+        return 'team' if SNAPSHOT_SCOPE == 'team' else (session_id or 'anonymous')
+
+    def _path(self, key: str) -> str:
+        # Session ids come from the browser, so they are hashed rather than used as file names
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def _load(self, key: str) -> Optional[Tuple[float, pd.DataFrame, Optional[Dict[str, pd.Index]]]]:
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            with self._lock:
+                cached = self._cached.get(key)
+                if cached is not None and cached[0] == mtime:
+                    self._cached.move_to_end(key)
+                    return cached
+            with open(path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error loading upload snapshot: {str(e)}")
+            return None
+        snapshot = pd.DataFrame({'late': np.asarray(payload['late'], dtype=bool)},
+                                index=pd.Index(payload['ids'], dtype=object))
+        delta = None if payload['delta'] is None else {
+            change: pd.Index(ids, dtype=object) for change, ids in payload['delta'].items()
+        }
+        entry = (mtime, snapshot, delta)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry):
+        with self._lock:
+            self._cached[key] = entry
+            self._cached.move_to_end(key)
+            while len(self._cached) > self.max_sessions:
+                self._cached.popitem(last=False)
+
+    def record(self, session_id: Optional[str], snapshot: pd.DataFrame) -> Optional[Dict[str, pd.Index]]:
+        """Store a new snapshot and return its delta against the previous one (None on the first upload)."""
+        key = self.scope_key(session_id)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        with open(path + '.lock', 'a') as lock_file:
+            # With the team scope, uploads on different workers share one baseline
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            previous = self._load(key)
+            delta = compare_snapshots(previous[1], snapshot) if previous is not None else None
+            payload = {
+                'ids': snapshot.index.tolist(),
+                'late': snapshot['late'].tolist(),
+                'delta': None if delta is None else {change: ids.tolist() for change, ids in delta.items()}
+            }
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(payload, f)
+                os.replace(tmp, path)
+                self._remember(key, (os.path.getmtime(path), snapshot, delta))
+            except OSError as e:
+                print(f"Error saving upload snapshot: {str(e)}")
+        self._remove_expired()
+        return delta
+
+    def delta(self, session_id: Optional[str]) -> Optional[Dict[str, pd.Index]]:
+        entry = self._load(self.scope_key(session_id))
+        return None if entry is None else entry[2]
+
+    def housemaids(self, session_id: Optional[str], changes) -> Optional[pd.Index]:
+        """Housemaid IDs in the selected change categories; None when no change is selected.
+
+        Without a delta (no earlier upload to compare with) nothing has changed, so the
+        selection is empty rather than ignored.
+        """
+        if not changes:
+            return None
+        delta = self.delta(session_id)
+        if delta is None:
+            return pd.Index([])
+        selected = [delta[change] for change in changes if change in delta]
+        if not selected:
+            return pd.Index([])
+        return pd.Index(np.concatenate([index.to_numpy() for index in selected])).unique()
+
+    def _remove_expired(self):
+        cutoff = time.time() - SNAPSHOT_TTL
+        try:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,150 @@
+"""Worker memory diagnostics: cached datasets and views, RSS, tracemalloc captures and a memory ceiling."""
+import gc
+import hashlib
+import hmac
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from datastore import dataset_store
+from instrumentation import current_rss_mb
+from views import view_cache
+
+# Evict cached datasets once the worker's RSS goes above this; 0 disables the ceiling
+MEMORY_CEILING_MB = float(os.getenv("MEMORY_CEILING_MB", "0"))
+# At most this many datasets are evicted per check: freed memory is not always returned
+# to the OS at once, so RSS alone would otherwise drive every dataset out in one go
+MEMORY_EVICT_BATCH = int(os.getenv("MEMORY_EVICT_BATCH", "1"))
+TRACEMALLOC_TOP = int(os.getenv("TRACEMALLOC_TOP", "25"))
+# /debug/memory is only served when this is set, and only to requests carrying it
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+
+
+def enforce_memory_ceiling(ceiling_mb: float = MEMORY_CEILING_MB, batch: int = MEMORY_EVICT_BATCH) -> List[str]:
+    """Evict up to batch least recently used unpinned datasets while RSS is over the ceiling; return their ids."""
+    evicted: List[str] = []
+    if not ceiling_mb or current_rss_mb() <= ceiling_mb:
+        return evicted
+    while len(evicted) < batch and current_rss_mb() > ceiling_mb:
+        dataset_id = dataset_store.evict_oldest()
+        if dataset_id is None:
+            break
+        evicted.append(dataset_id)
+        # Memoized views of the evicted dataset are unreachable now
+        view_cache.clear()
+        gc.collect()
+    if evicted:
+        print(f"Memory ceiling {ceiling_mb:g} MB exceeded; evicted {len(evicted)} dataset(s), "
+              f"RSS now {current_rss_mb():.1f} MB")
+    return evicted
+
+
+class AllocationTracer:
+    """Runs tracemalloc around the next request of one chosen callback and keeps its top allocations.
+
+    tracemalloc is process-wide, so allocations of requests served concurrently
+    on other threads show up in the capture too.
+    """
+
+    def __init__(self, top: int = TRACEMALLOC_TOP):
+        self.top = top
+        self.armed: Optional[str] = None
+        self.last_capture: Optional[Dict[str, Any]] = None
+        self._active: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def arm(self, callback: str):
+        with self._lock:
+            self.armed = callback
+
+    def start(self, callback: str) -> bool:
+        """Start tracing if this callback is armed and no capture is running."""
+        with self._lock:
+            if self.armed != callback or self._active is not None:
+                return False
+            self.armed, self._active = None, callback
+        tracemalloc.start()
+        return True
+
+    def stop(self):
+        with self._lock:
+            callback, self._active = self._active, None
+        if callback is None:
+            return
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics('lineno')[:self.top]
+        self.last_capture = {
+            'callback': callback,
+            'captured_at': time.time(),
+            'peak_mb': round(peak / 2**20, 2),
+            'top': [{'location': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                    for stat in stats]
+        }
+
+
+allocation_tracer = AllocationTracer()
+
+
+def memory_report() -> Dict[str, Any]:
+    """Everything /debug/memory shows, least recently used datasets and views first.
+
+    Dataset ids and view keys reference session data, so only short prefixes are shown.
+    """
+    datasets = dataset_store.describe()
+    for dataset in datasets:
+        dataset['dataset_id'] = dataset['dataset_id'][:8]
+    views = view_cache.describe()
+    for view in views:
+        stage, _, spec = view.pop('key').partition(':')
+        view['stage'] = stage
+        view['key_hash'] = hashlib.md5(spec.encode()).hexdigest()[:8]
+    return {
+        'rss_mb': round(current_rss_mb(), 1),
+        'ceiling_mb': MEMORY_CEILING_MB or None,
+        'datasets': datasets,
+        'datasets_mb': round(sum(d['bytes'] for d in datasets) / 2**20, 1),
+        'views': views,
+        'views_mb': round(sum(v['bytes'] for v in views) / 2**20, 1),
+        'tracemalloc': {'armed': allocation_tracer.armed, 'last_capture': allocation_tracer.last_capture}
+    }
+
+
+def install_memory_diagnostics(server, ceiling_mb: float = MEMORY_CEILING_MB):
+    """Serve /debug/memory, trace the armed callback and check the memory ceiling after each callback.
+
+    GET /debug/memory?trace=<callback outputs> arms tracemalloc for the next
+    request of that callback (labelled as on /metrics). The route needs DEBUG_TOKEN,
+    as the X-Debug-Token header or a token query parameter; without it the route is off.
+    """
+    from flask import abort, g, jsonify, request
+
+    def callback_label() -> Optional[str]:
+        if not request.path.rstrip('/').endswith('_dash-update-component'):
+            return None
+        return str((request.get_json(silent=True) or {}).get('output', 'unknown'))
+
+    @server.before_request
+    def start_allocation_trace():
+        callback = callback_label()
+        g.traced = callback is not None and allocation_tracer.start(callback)
+
+    @server.after_request
+    def check_memory(response):
+        if g.get('traced'):
+            allocation_tracer.stop()
+        if callback_label() is not None:
+            enforce_memory_ceiling(ceiling_mb)
+        return response
+
+    @server.route('/debug/memory')
+    def debug_memory():
+        token = request.headers.get('X-Debug-Token') or request.args.get('token', '')
+        if not DEBUG_TOKEN or not hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode()):
+            abort(404)
+        if request.args.get('trace'):
+            allocation_tracer.arm(request.args['trace'])
+        return jsonify(memory_report())
@@ -0,0 +1,65 @@
+"""Distribution of late cases to agents' sheets, shared by the dashboard and the CLI.
+
+Every distribution goes through distribute_cases, so the done ledger is read
+first, done cases are skipped and each agent's new queue is recorded in the
+local assignment index, whichever way the distribution was started.
+"""
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from assignments import OVERDUE_COLUMN, AgentQueue, assignment_index
+from completion import completion_tracker
+from pipeline import id_keys, split_evenly
+
+
+def refresh_done(manager):
+    """Read the agents' sheets back, so done marks made since the last read reach the done ledger."""
+    try:
+        completion_tracker.refresh(manager.client, manager.sheets())
+    except Exception as e:
+        print(f"Error reading agent sheets before distribution: {str(e)}")
+
+
+def without_done(late_cases_df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Drop cases an agent has marked done at their current stage; returns the rest and the rows dropped.
+
+    A case that has moved on to another stage since it was marked done is kept.
+    """
+    done = completion_tracker.done_cases()
+    if not done or 'Request ID MB' not in late_cases_df.columns:
+        return late_cases_df, 0
+    requests = pd.Series(id_keys(late_cases_df['Request ID MB']), index=late_cases_df.index)
+    current = late_cases_df['Current Stage'].astype(str).groupby(requests).transform('last')
+    cases = pd.MultiIndex.from_arrays([requests, current])
+    # Stage '' marks a case recorded without one (its sheet had no stage column)
+    unstaged = pd.MultiIndex.from_arrays([requests, pd.Series('', index=requests.index)])
+    keep = ~(cases.isin(done) | unstaged.isin(done))
+    return late_cases_df[keep], int((~keep).sum())
+
+
+def distribute_cases(manager, usernames: List[str], late_cases_df: pd.DataFrame,
+                     thresholds: np.ndarray) -> Dict[str, Dict[str, Any]]:
+    """Write even chunks to the agents' sheets and record the queues of those that succeeded.
+
+    thresholds holds the threshold hours of every row, for the queues' hours overdue.
+    """
+    overdue = (pd.to_numeric(late_cases_df['Time In Stage'], errors='coerce').to_numpy(dtype='float64')
+               - np.asarray(thresholds, dtype='float64'))
+    # Replace missing values (NaN, pd.NA) with None (JSON-compatible)
+    late_cases_df = late_cases_df.astype(object).where(pd.notna(late_cases_df), None)
+    # The same consecutive chunks distribute_evenly writes to each sheet
+    chunks = dict(zip(usernames, split_evenly(late_cases_df.assign(**{OVERDUE_COLUMN: overdue}), len(usernames))))
+
+    results = manager.distribute_evenly(usernames, late_cases_df)
+    assigned = {}
+    for username, result in results.items():
+        if result['status'] == 'success':
+            # The sheet was overwritten, so its last read-back no longer applies
+            completion_tracker.forget(username)
+            chunk = chunks[username]
+            assigned[username] = AgentQueue.build(chunk, chunk[OVERDUE_COLUMN].to_numpy())
+    if assigned:
+        assignment_index.assign(assigned)
+    return results
@@ -0,0 +1,55 @@
+"""Per-housemaid row index behind the case-history drilldown.
+
+Rows are ordered by housemaid (stable, so each housemaid's notes keep the
+dataset's Note time / RPA try count order) and every housemaid maps to a
+(start, end) range of that order, so a drilldown is a dict lookup and a slice.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datastore import Dataset
+from instrumentation import stage
+from pipeline import housemaid_key
+
+HISTORY_COLUMNS = ['Note time', 'RPA try count', 'Current Stage', 'Time In Stage',
+                   'Client Note', 'Request ID MB', 'HM Status']
+
+
+@dataclass
+class HousemaidIndex:
+    # Dataset row positions grouped by housemaid
+    order: np.ndarray
+    slots: Dict[str, Tuple[int, int]]
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "HousemaidIndex":
+        if 'Housemaid ID' not in df.columns:
+            return cls(np.array([], dtype='int64'), {})
+        with stage('housemaid-index', rows=len(df)):
+            codes, uniques = pd.factorize(df['Housemaid ID'])
+            # Distinct values that share a key (1001 and '1001') share one slot
+            key_codes, keys = pd.factorize(pd.Index([housemaid_key(u) for u in uniques], dtype=object))
+            codes = np.where(codes >= 0, key_codes[codes] if len(key_codes) else codes, -1)
+            order = np.argsort(codes, kind='stable')
+            # Rows without an ID sort first and belong to no slot
+            offset = int((codes < 0).sum())
+            ends = offset + np.cumsum(np.bincount(codes[codes >= 0], minlength=len(keys)))
+            starts = np.r_[offset, ends[:-1]]
+            return cls(order, {key: (int(s), int(e)) for key, s, e in zip(keys, starts, ends)})
+
+    def positions(self, housemaid_id: Any) -> np.ndarray:
+        start, end = self.slots.get(housemaid_key(housemaid_id), (0, 0))
+        return self.order[start:end]
+
+
+def housemaid_index(dataset: Dataset) -> HousemaidIndex:
+    """The dataset's housemaid index, built once per dataset version."""
+    return dataset.derived('housemaid', HousemaidIndex.build)
+
+
+def housemaid_history(dataset: Dataset, housemaid_id: Any) -> pd.DataFrame:
+    """Every note of one housemaid, oldest first."""
+    return dataset.df.take(housemaid_index(dataset).positions(housemaid_id))
@@ -0,0 +1,185 @@
+"""Chart figures: static layouts built once, data sent as dash.Patch updates."""
+import hashlib
+import json
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import plotly.graph_objects as go
+from dash import Patch
+
+from instrumentation import stage
+
+
+def bar_figure() -> go.Figure:
+    """Late-cases-by-stage bar chart with its static layout and an empty trace."""
+    bar_fig = go.Figure(data=[
+        go.Bar(
+            x=[],
+            y=[],
+            orientation='h',
+            text=[],
+            textposition='auto',
+            marker_color='rgb(55, 83, 109)',
+            hovertemplate="Stage: %{y}<br>Late Cases: %{x}<extra></extra>"
+        )
+    ])
+
+    bar_fig.update_layout(
+        margin=dict(l=20, r=20, t=40, b=20),
+        showlegend=False,
+        plot_bgcolor='white',
+        height=400,
+        xaxis_title="Number of Late Cases",
+        yaxis_title="Stage",
+        xaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(211, 211, 211, 0.5)'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(211, 211, 211, 0.5)'
+        )
+    )
+    return bar_fig
+
+
+def pie_figure() -> go.Figure:
+    """Stage distribution pie chart with its static layout and an empty trace."""
+    pie_fig = go.Figure(data=[
+        go.Pie(
+            labels=[],
+            values=[],
+            textinfo='percent+label',
+            hole=0.3,
+            hovertemplate="Stage: %{label}<br>Cases: %{value}<br>Percentage: %{percent}<extra></extra>"
+        )
+    ])
+
+    pie_fig.update_layout(
+        margin=dict(l=20, r=20, t=40, b=20),
+        showlegend=False,
+        height=400
+    )
+    return pie_fig
+
+
+def timeline_figure(history: pd.DataFrame) -> go.Figure:
+    """One housemaid's notes over time, stage on the y axis, late notes highlighted."""
+    late = history['Late'] if 'Late' in history.columns else pd.Series(False, index=history.index)
+    hover = "%{x}<br>Stage: %{y}<br>Try: %{customdata[0]}<br>Hours in stage: %{customdata[1]}<extra></extra>"
+    customdata = history[['RPA try count', 'Time In Stage']].to_numpy() if not history.empty else []
+    timeline_fig = go.Figure(data=[
+        go.Scatter(
+            x=history['Note time'],
+            y=history['Current Stage'],
+            mode='lines+markers',
+            line=dict(color='rgb(55, 83, 109)', shape='hv'),
+            marker=dict(size=9, color=['#dc3545' if flag else 'rgb(55, 83, 109)' for flag in late]),
+            customdata=customdata,
+            hovertemplate=hover
+        )
+    ])
+
+    timeline_fig.update_layout(
+        margin=dict(l=20, r=20, t=20, b=20),
+        showlegend=False,
+        plot_bgcolor='white',
+        height=320,
+        xaxis_title="Note time",
+        yaxis=dict(type='category', showgrid=True, gridcolor='rgba(211, 211, 211, 0.5)')
+    )
+    return timeline_fig
+
+
+def percentile_figure(table: Optional[pd.DataFrame] = None) -> go.Figure:
+    """Grouped percentile bars (p50, p90, ...) of dwell hours for the stages of a percentile table."""
+    table = table if table is not None else pd.DataFrame({'Current Stage': []})
+    columns = [c for c in table.columns if c[0] == 'p' and c[1:].isdigit()]
+    percentile_fig = go.Figure(data=[
+        go.Bar(
+            x=table[column],
+            y=table['Current Stage'],
+            name=column,
+            orientation='h',
+            hovertemplate=f"Stage: %{{y}}<br>{column}: %{{x}} h<extra></extra>"
+        ) for column in columns
+    ])
+
+    percentile_fig.update_layout(
+        barmode='group',
+        margin=dict(l=20, r=20, t=20, b=20),
+        plot_bgcolor='white',
+        height=320,
+        legend=dict(orientation='h', y=1.08),
+        xaxis_title="Hours in stage",
+        yaxis=dict(autorange='reversed'),
+        xaxis=dict(showgrid=True, gridcolor='rgba(211, 211, 211, 0.5)')
+    )
+    return percentile_fig
+
+
+def trend_figure(trend: Optional[pd.DataFrame] = None) -> go.Figure:
+    """Late housemaids per day, one line per column of a late_trend frame."""
+    trend = trend if trend is not None else pd.DataFrame()
+    trend_fig = go.Figure(data=[
+        go.Scatter(
+            x=trend.index,
+            y=trend[column],
+            name=str(column),
+            mode='lines+markers',
+            hovertemplate=f"{column}<br>%{{x}}: %{{y}} late housemaids<extra></extra>"
+        ) for column in trend.columns
+    ])
+
+    trend_fig.update_layout(
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='white',
+        height=360,
+        legend=dict(orientation='h', y=1.1),
+        yaxis_title="Late housemaids",
+        xaxis=dict(showgrid=True, gridcolor='rgba(211, 211, 211, 0.5)'),
+        yaxis=dict(showgrid=True, gridcolor='rgba(211, 211, 211, 0.5)', rangemode='tozero')
+    )
+    return trend_fig
+
+
+EMPTY_COUNTS = pd.DataFrame({'Current Stage': [], 'Count': []})
+
+
+def top_stage_counts(df: pd.DataFrame, limit: int = 10) -> pd.DataFrame:
+    """Distinct housemaids per stage, largest first."""
+    with stage('groupby', rows=len(df)):
+        stage_counts = df.groupby('Current Stage')['Housemaid Name'].nunique().reset_index(name='Count')
+        return stage_counts.sort_values(by='Count', ascending=False).head(limit)
+
+
+def _fingerprint(values) -> str:
+    return hashlib.md5(json.dumps(values, default=str).encode()).hexdigest()[:16]
+
+
+def patch_trace(arrays: Dict[str, list], previous: Optional[Dict[str, str]]) -> Tuple[Optional[Patch], Dict[str, str]]:
+    """Patch only the trace arrays whose fingerprint differs from what the browser already has.
+
+    Returns (None, fingerprints) when nothing changed so the caller can skip the output.
+    """
+    with stage('figure'):
+        previous = previous or {}
+        fingerprints = {name: _fingerprint(values) for name, values in arrays.items()}
+        changed = [name for name in arrays if previous.get(name) != fingerprints[name]]
+        if not changed:
+            return None, fingerprints
+        patch = Patch()
+        for name in changed:
+            patch['data'][0][name] = arrays[name]
+        return patch, fingerprints
+
+
+def bar_arrays(stage_counts: pd.DataFrame) -> Dict[str, list]:
+    counts = stage_counts['Count'].tolist()
+    return {'x': counts, 'y': stage_counts['Current Stage'].tolist(), 'text': counts}
+
+
+def pie_arrays(stage_dist: pd.DataFrame) -> Dict[str, list]:
+    return {'labels': stage_dist['Current Stage'].tolist(), 'values': stage_dist['Count'].tolist()}
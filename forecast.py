@@ -0,0 +1,84 @@
+"""Time-to-breach forecast: which open cases pass their stage threshold next.
+
+A case's time in stage keeps growing after its latest note, so at the
+forecast time it is Time In Stage plus the hours elapsed since Note time.
+Cases not late in the export are kept sorted by the hours they have left;
+those at or below zero have breached since the export and come first.
+"Breaching within N hours" is then a binary search, not a rescan.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from pipeline import DEFAULT_THRESHOLD, row_thresholds
+from rules import RuleTable
+
+# Horizons (hours) offered for "breaching within"
+FORECAST_HORIZONS = [int(h) for h in os.getenv("FORECAST_HORIZONS", "2,6,12").split(',')]
+# Rows shown in the next-to-breach list
+FORECAST_LIST_SIZE = 100
+
+
+def note_times(series: pd.Series) -> np.ndarray:
+    """Note time as datetime64, parsing each distinct value once."""
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype='datetime64[ns]')
+    return np.append(parsed, np.datetime64('NaT'))[codes]
+
+
+def newest_note_time(df: pd.DataFrame) -> Optional[pd.Timestamp]:
+    """Latest Note time in a frame: the moment its export was taken."""
+    if df.empty or 'Note time' not in df.columns:
+        return None
+    newest = pd.Series(note_times(df['Note time'])).max()
+    return None if pd.isna(newest) else newest
+
+
+def latest_notes(df: pd.DataFrame) -> np.ndarray:
+    """Mask of each case's latest note (rows are in Note time order); every row without Request ID MB."""
+    if 'Request ID MB' not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    requests = df['Request ID MB']
+    return (~requests.duplicated(keep='last') | requests.isna()).to_numpy()
+
+
+@dataclass
+class BreachForecast:
+    as_of: Optional[pd.Timestamp]
+    # Hours until breach of every open case not late in the export, ascending; <= 0: breached since
+    hours_left: np.ndarray
+    # Row position in the forecast frame of each entry of hours_left
+    positions: np.ndarray
+
+    @property
+    def breached(self) -> int:
+        """Cases that were not late in the export but have passed their threshold since."""
+        return int(np.searchsorted(self.hours_left, 0, side='right'))
+
+    def count_within(self, hours: float) -> int:
+        return int(np.searchsorted(self.hours_left, hours, side='right'))
+
+    def within(self, hours: float) -> np.ndarray:
+        """Row positions breaching within the horizon, already breached first."""
+        return self.positions[:self.count_within(hours)]
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, threshold_dict: Dict[str, float], as_of: Optional[pd.Timestamp],
+              rules: Optional[RuleTable] = None, default: float = DEFAULT_THRESHOLD) -> "BreachForecast":
+        if df.empty or as_of is None:
+            return cls(as_of, np.array([], dtype='float64'), np.array([], dtype='int64'))
+        with stage('forecast', rows=len(df)):
+            elapsed = (np.datetime64(as_of, 'ns') - note_times(df['Note time'])) / np.timedelta64(1, 'h')
+            hours_in_stage = pd.to_numeric(df['Time In Stage'], errors='coerce').to_numpy(dtype='float64')
+            thresholds = row_thresholds(df, threshold_dict, default, rules)
+            hours_left = thresholds - (hours_in_stage + np.maximum(elapsed, 0))
+            # NaN (no stage time or note time) compares False and drops out here
+            on_time = (hours_in_stage <= thresholds) & ~np.isnan(hours_left)
+            open_cases = latest_notes(df) & df['Current Stage'].notna().to_numpy() & on_time
+            positions = np.flatnonzero(open_cases)
+            order = np.argsort(hours_left[positions], kind='stable')
+            return cls(as_of, hours_left[positions][order], positions[order])
@@ -0,0 +1,14 @@
+"""Gunicorn hooks for running with --preload (see Procfile)."""
+import gc
+
+
+def pre_fork(server, worker):
+    # Move the preloaded modules out of the GC's reach so collections in the
+    # workers do not touch, and thereby copy, the pages shared with the master
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so each worker starts its own directory watcher
+    import app
+    app.start_watcher()
@@ -0,0 +1,170 @@
+"""Latency histograms per callback and pipeline stage, exposed in Prometheus text format.
+
+Each gunicorn worker keeps its own registry, so /metrics reports the worker
+that served the scrape.
+"""
+import bisect
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (10, 100, 1000, 10000, 50000, 100000, 500000, 1000000)
+BYTE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 2**20, 10 * 2**20, 50 * 2**20, 200 * 2**20)
+# Callbacks slower than this are logged with their stage breakdown; 0 disables the log
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Named histograms with labels, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._declared: Dict[str, Tuple[str, Sequence[float]]] = {}
+        self._series: Dict[str, Dict[LabelSet, Histogram]] = {}
+
+    def declare(self, name: str, help_text: str, buckets: Sequence[float]):
+        with self._lock:
+            self._declared[name] = (help_text, buckets)
+            self._series.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._series[name]
+            if key not in series:
+                series[key] = Histogram(self._declared[name][1])
+            series[key].observe(value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (help_text, _) in self._declared.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in self._series[name].items():
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: LabelSet) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+metrics = MetricsRegistry()
+metrics.declare('dashboard_callback_seconds', 'Dash callback request latency.', LATENCY_BUCKETS)
+metrics.declare('dashboard_callback_response_bytes', 'Dash callback response size before compression.',
+                BYTE_BUCKETS)
+metrics.declare('dashboard_stage_seconds', 'Pipeline stage latency.', LATENCY_BUCKETS)
+metrics.declare('dashboard_stage_rows', 'Rows processed by a pipeline stage.', ROW_BUCKETS)
+
+def current_rss_mb() -> float:
+    """Resident set size of this process, falling back to the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+        scale = 2**20 if sys.platform == 'darwin' else 2**10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+# Stage records of the callback request being served on this thread, for the slow log
+_request = threading.local()
+
+
+@contextmanager
+def stage(name: str, rows: Optional[int] = None):
+    """Time a pipeline stage; set record['rows'] inside the block when the count is known later."""
+    record = {'stage': name, 'rows': rows}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        metrics.observe('dashboard_stage_seconds', record['seconds'], stage=name)
+        if record['rows'] is not None:
+            metrics.observe('dashboard_stage_rows', record['rows'], stage=name)
+        stages = getattr(_request, 'stages', None)
+        if stages is not None:
+            stages.append(record)
+
+
+def _breakdown(stages: List[dict]) -> str:
+    parts = []
+    for record in stages:
+        rows = '' if record['rows'] is None else f", {record['rows']} rows"
+        parts.append(f"{record['stage']} {record['seconds'] * 1000:.1f} ms{rows}")
+    return '; '.join(parts) or 'no instrumented stages'
+
+
+def install_request_metrics(server, slow_seconds: float = SLOW_REQUEST_SECONDS):
+    """Time every Dash callback request and serve the registry on /metrics.
+
+    Install after compression so response sizes are measured before encoding.
+    """
+    from flask import Response, request
+
+    @server.before_request
+    def start_callback_timer():
+        if request.path.rstrip('/').endswith('_dash-update-component'):
+            _request.start = time.perf_counter()
+            _request.stages = []
+
+    @server.after_request
+    def record_callback(response):
+        start = getattr(_request, 'start', None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        payload = request.get_json(silent=True) or {}
+        callback = str(payload.get('output', 'unknown'))
+        metrics.observe('dashboard_callback_seconds', seconds, callback=callback)
+        if not response.direct_passthrough:
+            metrics.observe('dashboard_callback_response_bytes', response.content_length or 0,
+                            callback=callback)
+        if slow_seconds and seconds >= slow_seconds:
+            print(f"Slow callback {callback}: {seconds:.3f}s ({_breakdown(_request.stages)})")
+        return response
+
+    @server.teardown_request
+    def clear_callback_timer(exc):
+        _request.start = None
+        _request.stages = None
+
+    @server.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,210 @@
+"""Dash-free data pipeline: ingest, filter, late evaluation, distribution split and export."""
+import base64
+import io
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from rules import RuleTable
+from schema import UploadFormat, check_columns, sniff_upload
+
+DEFAULT_THRESHOLD = 24
+
+
+def get_sorted_unique(series: pd.Series) -> List[str]:
+    """Get sorted unique values from a series, handling mixed types and NaN values."""
+    unique_values = [str(x) for x in series.unique() if pd.notna(x)]
+    return sorted(unique_values)
+
+
+def decode_contents(contents: str) -> bytes:
+    """Raw bytes of a dcc.Upload data URL; ValueError when it is not one."""
+    # Split the content
+    content_type, content_string = contents.split(',')
+    return base64.b64decode(content_string)
+
+
+def parse_contents(contents: str, filename: str) -> pd.DataFrame:
+    """Parse uploaded file contents into a pandas DataFrame."""
+    if contents is None:
+        return pd.DataFrame()
+
+    try:
+        decoded = decode_contents(contents)
+    except Exception as e:
+        print(f"Error parsing file: {str(e)}")
+        return pd.DataFrame()
+    return parse_bytes(decoded, filename)
+
+
+def parse_file(path: str) -> pd.DataFrame:
+    """Parse a CSV/XLSX file from local disk into a pandas DataFrame."""
+    with open(path, 'rb') as f:
+        return parse_bytes(f.read(), os.path.basename(path))
+
+
+def parse_bytes(decoded: bytes, filename: str, upload: Optional[UploadFormat] = None) -> pd.DataFrame:
+    """Parse raw CSV/XLSX bytes into a cleaned, forward-filled pandas DataFrame.
+
+    The header is sniffed and checked first unless the caller already did (see schema.sniff_upload).
+    """
+    with stage('parse') as record:
+        df = _parse_bytes(decoded, filename, upload)
+        record['rows'] = len(df)
+    return df
+
+
+def _parse_bytes(decoded: bytes, filename: str, upload: Optional[UploadFormat] = None) -> pd.DataFrame:
+    try:
+        upload = upload or sniff_upload(decoded, filename)
+        # Read the file based on its type
+        if upload.kind == 'csv':
+            df = pd.read_csv(io.BytesIO(decoded), encoding=upload.encoding, sep=upload.delimiter)
+        else:
+            df = pd.read_excel(io.BytesIO(decoded))
+            if upload.columns is None:
+                check_columns(list(df.columns))
+
+        # Clean up the DataFrame
+        df = df.replace({pd.NA: None, pd.NaT: None})
+
+        # Sort the DataFrame by 'Note time' and 'RPA try count' to ensure proper filling
+        df = df.sort_values(by=['Note time', 'RPA try count'])
+
+        # List of columns to forward-fill
+        columns_to_fill = [
+            'Housemaid Name', 'Housemaid ID', 'HM Status',
+            'Request ID MB', 'Nationality', 'Type'
+        ]
+
+        # Forward-fill the specified columns
+        for column in columns_to_fill:
+            if column in df.columns:
+                df[column] = df[column].ffill()
+
+        # Add Late column if not exists
+        if 'Late' not in df.columns:
+            df['Late'] = False
+
+        return df
+    except Exception as e:
+        print(f"Error parsing file: {str(e)}")
+        return pd.DataFrame()
+
+
+def housemaid_key(value: Any) -> str:
+    """Housemaid ID as a lookup key; 1001.0 and 1001 (e.g. after a JSON round trip) are the same housemaid."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def id_keys(series: pd.Series) -> np.ndarray:
+    """housemaid_key of every value, computed once per distinct value; None where the ID is missing."""
+    codes, uniques = pd.factorize(series)
+    keys = np.array([housemaid_key(value) for value in uniques] + [None], dtype=object)
+    return keys[codes]
+
+
+def filter_mask(df: pd.DataFrame, stages: Optional[Sequence[str]] = None,
+                types: Optional[Sequence[str]] = None,
+                nationalities: Optional[Sequence[str]] = None,
+                client_notes: Optional[Sequence[str]] = None,
+                housemaid_ids: Optional[Sequence[str]] = None) -> np.ndarray:
+    """Boolean row mask of the dashboard filter chain; empty selections leave a column unfiltered."""
+    mask = np.ones(len(df), dtype=bool)
+    if stages:
+        mask &= df['Current Stage'].isin(stages).to_numpy()
+    if types:
+        mask &= df['Type'].isin(types).to_numpy()
+    if nationalities:
+        mask &= df['Nationality'].isin(nationalities).to_numpy()
+    if client_notes:
+        mask &= df['Client Note'].isin(client_notes).to_numpy()
+    if housemaid_ids is not None:
+        mask &= pd.Series(id_keys(df['Housemaid ID'])).isin(housemaid_ids).to_numpy()
+    return mask
+
+
+def apply_filters(df: pd.DataFrame, stages: Optional[Sequence[str]] = None,
+                  types: Optional[Sequence[str]] = None,
+                  nationalities: Optional[Sequence[str]] = None,
+                  client_notes: Optional[Sequence[str]] = None,
+                  housemaid_ids: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Apply the dashboard filter chain and return a copy of the matching rows."""
+    return df[filter_mask(df, stages, types, nationalities, client_notes, housemaid_ids)].copy()
+
+
+def late_flags(df: pd.DataFrame, threshold_dict: Dict[str, float],
+               default: float = DEFAULT_THRESHOLD, rules: Optional[RuleTable] = None) -> pd.Series:
+    """Vectorized Late flag: Time In Stage above the threshold that applies to the row.
+
+    Without rules the threshold is looked up by stage only; with a rule table the
+    per-stage values are layered on top of its stage x type x nationality rules.
+    """
+    stages = df['Current Stage']
+    time_in_stage = pd.to_numeric(df['Time In Stage'], errors='coerce')
+    thresholds = row_thresholds(df, threshold_dict, default, rules)
+    return stages.notna() & time_in_stage.notna() & (time_in_stage > thresholds)
+
+
+def row_thresholds(df: pd.DataFrame, threshold_dict: Dict[str, float],
+                   default: float = DEFAULT_THRESHOLD, rules: Optional[RuleTable] = None) -> np.ndarray:
+    """Threshold hours that apply to every row (see late_flags)."""
+    if rules is not None and rules.rules:
+        return rules.with_stage_overrides(threshold_dict).lookup(df)
+    if rules is not None:
+        default = rules.default
+    # Stringify distinct stages only; per-row astype(str) is slow on Arrow-backed columns
+    codes, uniques = pd.factorize(df['Current Stage'])
+    per_stage = pd.Series([str(s) for s in uniques], dtype=object).map(threshold_dict).astype('float64')
+    return np.append(per_stage.fillna(default).to_numpy(), default)[codes]
+
+
+def split_evenly(df: pd.DataFrame, parts: int) -> List[pd.DataFrame]:
+    """Split rows into consecutive chunks whose sizes differ by at most one."""
+    chunk_size = len(df) // parts
+    remainder = len(df) % parts
+    chunks = []
+    start_idx = 0
+    for i in range(parts):
+        end_idx = start_idx + chunk_size + (1 if i < remainder else 0)
+        chunks.append(df.iloc[start_idx:end_idx])
+        start_idx = end_idx
+    return chunks
+
+
+def export_filename(stages=None, types=None, nationalities=None, client_notes=None, changes=None) -> str:
+    """Base export filename describing the active filters."""
+    filter_names = []
+    if stages:
+        filter_names.append(f"Stage_{'_'.join(stages)}")
+    if types:
+        filter_names.append(f"Type_{'_'.join(types)}")
+    if nationalities:
+        filter_names.append(f"Nationality_{'_'.join(nationalities)}")
+    if client_notes:
+        filter_names.append(f"ClientNote_{'_'.join(client_notes)}")
+    if changes:
+        filter_names.append(f"Change_{'_'.join(changes)}")
+
+    base_filename = "filtered_data"
+    if filter_names:
+        base_filename += "_" + "_".join(filter_names)
+    return base_filename
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to CSV bytes."""
+    return df.to_csv(index=False, encoding='utf-8').encode()
+
+
+def to_excel_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to XLSX bytes."""
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    return excel_buffer.getvalue()
@@ -0,0 +1,318 @@
+"""Threshold rules by stage x type x nationality, compiled to a vectorized lookup."""
+import fnmatch
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+WILDCARD = '*'
+RULE_FIELDS = [('stage', 'Current Stage'), ('type', 'Type'), ('nationality', 'Nationality')]
+RULES_PATH = os.getenv("THRESHOLD_RULES_PATH", "threshold_rules.json")
+MAX_THRESHOLD_SETS = int(os.getenv("MAX_THRESHOLD_SETS", "256"))
+# Threshold sets are saved here so every worker can serve every session
+THRESHOLD_SET_DIR = os.getenv("THRESHOLD_SET_DIR", os.path.join(tempfile.gettempdir(), "threshold_sets"))
+# Sets not edited within this many seconds are removed
+THRESHOLD_SET_TTL = float(os.getenv("THRESHOLD_SET_TTL", str(7 * 24 * 3600)))
+
+
+@dataclass
+class ThresholdRule:
+    hours: float
+    stage: str = WILDCARD
+    type: str = WILDCARD
+    nationality: str = WILDCARD
+
+    def specificity(self) -> tuple:
+        """Precedence key: more specified fields first, then exact values over patterns."""
+        scores = []
+        for name, _ in RULE_FIELDS:
+            pattern = getattr(self, name)
+            if pattern == WILDCARD:
+                scores.append(0)
+            elif any(ch in pattern for ch in '*?['):
+                scores.append(1)
+            else:
+                scores.append(2)
+        return (sum(1 for s in scores if s), sum(scores), *scores)
+
+
+def _match(pattern: str, values: np.ndarray) -> np.ndarray:
+    """Which of the distinct column values a rule field matches (values[0] is the missing slot)."""
+    if pattern == WILDCARD:
+        return np.ones(len(values), dtype=bool)
+    matched = np.zeros(len(values), dtype=bool)
+    is_pattern = any(ch in pattern for ch in '*?[')
+    for i, value in enumerate(values[1:], start=1):
+        matched[i] = fnmatch.fnmatchcase(value, pattern) if is_pattern else value == pattern
+    return matched
+
+
+class RuleTable:
+    """Ordered rules plus a fallback; the most specific matching rule wins, later rules break ties."""
+
+    def __init__(self, rules: Optional[List[ThresholdRule]] = None, default: float = 24):
+        self.rules = list(rules or [])
+        self.default = default
+
+    def with_stage_overrides(self, threshold_dict: Dict[str, Optional[float]]) -> "RuleTable":
+        """Append per-stage thresholds from the dashboard as stage-only rules.
+
+        Values equal to what the table already gives the stage are inherited, not
+        overrides, so they do not shadow type- or nationality-specific rules.
+        """
+        overrides = [ThresholdRule(hours=float(hours), stage=stage)
+                     for stage, hours in threshold_dict.items()
+                     if hours is not None and float(hours) != self.stage_default(stage)]
+        return RuleTable(self.rules + overrides, self.default)
+
+    def stage_default(self, stage: str) -> float:
+        """Threshold that applies to a stage regardless of type and nationality."""
+        best = None
+        for position, rule in enumerate(self.rules):
+            if rule.type == WILDCARD and rule.nationality == WILDCARD and \
+                    fnmatch.fnmatchcase(stage, rule.stage):
+                key = (rule.specificity(), position)
+                if best is None or key > best[0]:
+                    best = (key, rule.hours)
+        return self.default if best is None else best[1]
+
+    def lookup(self, df: pd.DataFrame) -> np.ndarray:
+        """Threshold hours for every row, resolved once per distinct (stage, type, nationality)."""
+        codes, vocabularies = [], []
+        for _, column in RULE_FIELDS:
+            if column in df.columns:
+                # Stringify the distinct values only; equal strings from different types still match alike
+                col_codes, uniques = pd.factorize(df[column])
+                uniques = np.array([str(u) for u in uniques], dtype=object)
+            else:
+                col_codes, uniques = np.full(len(df), -1), np.array([], dtype=object)
+            # Shift so code 0 is the missing-value slot that only wildcards match
+            codes.append(col_codes.astype('int64') + 1)
+            vocabularies.append(np.concatenate([np.array([None], dtype=object), uniques]))
+
+        # Factorize the combined key so rules are evaluated per distinct combination only
+        sizes = [len(v) for v in vocabularies]
+        combined = (codes[0] * sizes[1] + codes[1]) * sizes[2] + codes[2]
+        combo_codes, combos = pd.factorize(combined)
+        combo_fields = [combos // (sizes[1] * sizes[2]), (combos // sizes[2]) % sizes[1], combos % sizes[2]]
+
+        combo_hours = np.full(len(combos), float(self.default))
+        order = sorted(range(len(self.rules)), key=lambda i: (self.rules[i].specificity(), i))
+        for i in order:
+            rule = self.rules[i]
+            hit = np.ones(len(combos), dtype=bool)
+            for (name, _), vocabulary, field_codes in zip(RULE_FIELDS, vocabularies, combo_fields):
+                hit &= _match(getattr(rule, name), vocabulary)[field_codes]
+            combo_hours[hit] = rule.hours
+        return combo_hours[combo_codes]
+
+    def to_json(self) -> str:
+        return json.dumps({'default': self.default, 'rules': [asdict(r) for r in self.rules]}, indent=2)
+
+    def to_csv(self) -> str:
+        frame = pd.DataFrame([asdict(r) for r in self.rules], columns=['stage', 'type', 'nationality', 'hours'])
+        return frame.to_csv(index=False)
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "RuleTable":
+        """Build a table from {"default": hours, "rules": [{stage, type, nationality, hours}, ..]}."""
+        rules = []
+        for item in payload.get('rules', []):
+            rules.append(ThresholdRule(
+                hours=float(item['hours']),
+                stage=str(item.get('stage', WILDCARD)).strip() or WILDCARD,
+                type=str(item.get('type', WILDCARD)).strip() or WILDCARD,
+                nationality=str(item.get('nationality', WILDCARD)).strip() or WILDCARD
+            ))
+        return cls(rules, float(payload.get('default', 24)))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, filename: str) -> "RuleTable":
+        """Load rules from a JSON file or a CSV with stage,type,nationality,hours columns."""
+        if filename.lower().endswith('.csv'):
+            frame = pd.read_csv(io.BytesIO(data), dtype=str).fillna(WILDCARD)
+            if 'hours' not in frame.columns:
+                raise ValueError("Rules CSV needs an 'hours' column")
+            return cls.from_dict({'rules': frame.to_dict('records')})
+        return cls.from_dict(json.loads(data.decode('utf-8')))
+
+
+class RuleStore:
+    """Process-wide active rule table, persisted to RULES_PATH.
+
+    Every worker reloads the file when its modification time changes, so an import
+    served by one worker reaches all of them; the version is that modification time.
+    """
+
+    def __init__(self, path: str = RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._table = RuleTable()
+        self._version = 0
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._version:
+            return
+        with self._lock:
+            if mtime == self._version:
+                return
+            try:
+                with open(self.path, 'rb') as f:
+                    self._table = RuleTable.from_bytes(f.read(), self.path)
+            except Exception as e:
+                print(f"Error loading threshold rules: {str(e)}")
+            self._version = mtime
+
+    @property
+    def table(self) -> RuleTable:
+        self._refresh()
+        return self._table
+
+    @property
+    def version(self) -> int:
+        self._refresh()
+        return self._version
+
+    def replace(self, table: RuleTable):
+        with self._lock:
+            self._table = table
+            tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                # Write aside and rename, so other workers never load a half-written file
+                with open(tmp, 'w') as f:
+                    f.write(table.to_json())
+                os.replace(tmp, self.path)
+                self._version = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                print(f"Error saving threshold rules: {str(e)}")
+                # Still invalidate this worker's views computed with the old table
+                self._version += 1
+
+
+class ThresholdSetStore:
+    """Per-session stage thresholds kept on the server and referenced by id from the browser.
+
+    Each set is saved to THRESHOLD_SET_DIR/<id>.json; the in-memory LRU is only a
+    cache, so a set evicted here or created by another worker is read back from disk.
+    """
+
+    def __init__(self, directory: str = THRESHOLD_SET_DIR, max_sets: int = MAX_THRESHOLD_SETS):
+        self.directory = directory
+        self.max_sets = max_sets
+        self._sets: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _ref(self, set_id: str) -> Dict[str, Any]:
+        return {'id': set_id, 'version': self._versions[set_id]}
+
+    def _path(self, set_id: str) -> Optional[str]:
+        # Ids come from the browser; anything but our own hex ids is never a path
+        if not isinstance(set_id, str) or not set_id.isalnum():
+            return None
+        return os.path.join(self.directory, f"{set_id}.json")
+
+    def _cache(self, set_id: str, thresholds: Dict[str, float], version: int):
+        self._sets[set_id] = thresholds
+        self._versions[set_id] = version
+        self._sets.move_to_end(set_id)
+        while len(self._sets) > self.max_sets:
+            evicted, _ = self._sets.popitem(last=False)
+            del self._versions[evicted]
+
+    def _load(self, set_ref: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Make the referenced set current in the cache; returns its id, or None when it is gone."""
+        set_id = (set_ref or {}).get('id')
+        if set_id in self._sets and self._versions[set_id] >= (set_ref or {}).get('version', 0):
+            self._sets.move_to_end(set_id)
+            return set_id
+        path = self._path(set_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error loading threshold set: {str(e)}")
+            return None
+        self._cache(set_id, payload['thresholds'], payload['version'])
+        return set_id
+
+    def _save(self, set_id: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(set_id)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'version': self._versions[set_id], 'thresholds': self._sets[set_id]}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Error saving threshold set: {str(e)}")
+
+    def create(self, thresholds: Dict[str, float]) -> Dict[str, Any]:
+        """Store a new threshold set and return its reference."""
+        self._remove_expired()
+        set_id = uuid.uuid4().hex
+        with self._lock:
+            self._cache(set_id, dict(thresholds), 1)
+            self._save(set_id)
+            return self._ref(set_id)
+
+    def exists(self, set_ref: Optional[Dict[str, Any]]) -> bool:
+        """Whether a session's set can still be found; no reference at all counts as found."""
+        if not set_ref:
+            return True
+        with self._lock:
+            return self._load(set_ref) is not None
+
+    def get(self, set_ref: Optional[Dict[str, Any]]) -> Dict[str, float]:
+        """Stage thresholds for a reference; unknown or removed sets fall back to the rules."""
+        with self._lock:
+            set_id = self._load(set_ref)
+            return {} if set_id is None else dict(self._sets[set_id])
+
+    def update(self, set_ref: Optional[Dict[str, Any]], changes: Dict[str, float],
+               only_missing: bool = False) -> Dict[str, Any]:
+        """Apply changes (or only add missing stages) and bump the set version."""
+        with self._lock:
+            set_id = self._load(set_ref)
+            if set_id is None:
+                set_id = uuid.uuid4().hex
+                self._cache(set_id, {}, 0)
+            thresholds = self._sets[set_id]
+            for stage, hours in changes.items():
+                if not only_missing or stage not in thresholds:
+                    thresholds[stage] = hours
+            self._versions[set_id] += 1
+            self._save(set_id)
+            return self._ref(set_id)
+
+    def _remove_expired(self):
+        cutoff = time.time() - THRESHOLD_SET_TTL
+        try:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+rule_store = RuleStore()
+threshold_sets = ThresholdSetStore()
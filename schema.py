@@ -0,0 +1,103 @@
+"""Upload sniffing: format, encoding, delimiter and required columns from the header alone.
+
+An upload is checked before it is parsed. For a CSV only a leading sample is
+decoded (the header line, plus a few lines for the delimiter); for an XLSX
+only the first row of the first sheet is read, in openpyxl's streaming
+read-only mode. A wrong file is rejected before any time goes into parsing it.
+"""
+import codecs
+import csv
+import io
+from dataclasses import dataclass
+from typing import List, Optional
+
+from instrumentation import stage
+
+# Columns every RPA export must have: ingestion sorts on the first two, late evaluation needs the rest
+REQUIRED_COLUMNS = ['Note time', 'RPA try count', 'Current Stage', 'Time In Stage']
+# Leading bytes decoded to sniff a CSV's encoding and delimiter
+SNIFF_BYTES = 64 * 1024
+SNIFF_LINES = 20
+CSV_DELIMITERS = ',;\t|'
+
+_ZIP_MAGIC = b'PK\x03\x04'
+_OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_BOMS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+
+
+@dataclass
+class UploadFormat:
+    kind: str  # 'csv' or 'excel'
+    encoding: Optional[str] = None
+    delimiter: Optional[str] = None
+    # Header row; None for legacy .xls, whose header is only known after the full read
+    columns: Optional[List[str]] = None
+
+
+def check_columns(columns: List[str]):
+    """Raise ValueError naming the required columns a header lacks."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        found = ', '.join(str(c) for c in columns[:10]) + (', ...' if len(columns) > 10 else '')
+        raise ValueError(f"missing required column{'s' if len(missing) > 1 else ''} "
+                         f"{', '.join(missing)} (found: {found or 'no columns'})")
+
+
+def sniff_upload(decoded: bytes, filename: str) -> UploadFormat:
+    """Detect an upload's format from its first bytes and check its header; ValueError says what is wrong."""
+    with stage('sniff'):
+        name = filename.lower()
+        if not decoded:
+            raise ValueError("the file is empty")
+        if decoded.startswith(_ZIP_MAGIC):
+            upload = UploadFormat('excel', columns=_xlsx_header(decoded))
+        elif decoded.startswith(_OLE_MAGIC):
+            upload = UploadFormat('excel')
+        elif 'xls' in name:
+            raise ValueError("the file is named like an Excel workbook but is not one")
+        elif 'csv' in name:
+            upload = _csv_format(decoded)
+        else:
+            raise ValueError("unsupported file type; upload a CSV or Excel (.xlsx) export")
+        if upload.columns is not None:
+            check_columns(upload.columns)
+        return upload
+
+
+def _xlsx_header(decoded: bytes) -> List[str]:
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(io.BytesIO(decoded), read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"the workbook cannot be opened ({str(e)})")
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    return [str(value) for value in header if value is not None]
+
+
+def _csv_format(decoded: bytes) -> UploadFormat:
+    sample = decoded[:SNIFF_BYTES]
+    encoding = next((name for bom, name in _BOMS if sample.startswith(bom)), None)
+    if encoding is None:
+        try:
+            sample.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off by the sample boundary is still UTF-8
+            encoding = 'utf-8' if e.start >= len(sample) - 3 and len(decoded) > SNIFF_BYTES else 'cp1252'
+    lines = sample.decode(encoding, errors='replace').splitlines()
+    if len(decoded) > SNIFF_BYTES:
+        # The last sampled line may be cut short
+        lines = lines[:-1] or lines
+    if not lines or not lines[0].strip():
+        raise ValueError("the CSV has no header line")
+    try:
+        delimiter = csv.Sniffer().sniff('\n'.join(lines[:SNIFF_LINES]), delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ','
+    columns = next(csv.reader([lines[0]], delimiter=delimiter))
+    return UploadFormat('csv', encoding, delimiter, columns)
@@ -0,0 +1,136 @@
+"""Global search over housemaid names, housemaid IDs and request IDs.
+
+Every distinct (field, value, housemaid) triple is normalized once per
+dataset version into a sorted key array. Prefix queries are two binary
+searches; substring queries run str.find over all keys joined into one
+string, so both scale with the number of distinct values, not rows.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from datastore import Dataset
+from drilldown import housemaid_index, housemaid_key
+from instrumentation import stage
+
+# Searchable columns and the label shown next to a hit
+SEARCH_FIELDS = {
+    'Housemaid Name': 'Name',
+    'Housemaid ID': 'Housemaid ID',
+    'Request ID MB': 'Request ID'
+}
+MAX_SEARCH_RESULTS = 20
+# Separates keys in the joined substring haystack; normalize() turns newlines into spaces
+_SEPARATOR = '\n'
+
+
+def normalize(value: Any) -> str:
+    """Lowercase, single-spaced text; integral floats lose their '.0' like IDs typed by hand."""
+    return re.sub(r'\s+', ' ', housemaid_key(value)).strip().lower()
+
+
+@dataclass
+class SearchIndex:
+    keys: np.ndarray          # normalized values, sorted
+    fields: np.ndarray        # SEARCH_FIELDS label of each key
+    values: np.ndarray        # original value of each key, as shown
+    housemaids: np.ndarray    # housemaid key each entry links to
+    names: np.ndarray         # housemaid name each entry links to
+    haystack: str
+    starts: np.ndarray        # offset of each key in the haystack
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "SearchIndex":
+        with stage('search-index', rows=len(df)):
+            frames = []
+            ids = df['Housemaid ID'] if 'Housemaid ID' in df.columns else pd.Series(None, index=df.index)
+            names = df['Housemaid Name'] if 'Housemaid Name' in df.columns else pd.Series(None, index=df.index)
+            for column, label in SEARCH_FIELDS.items():
+                if column not in df.columns:
+                    continue
+                pairs = pd.DataFrame({'value': df[column], 'id': ids, 'name': names}).dropna(subset=['value', 'id'])
+                pairs = pairs.drop_duplicates(subset=['value', 'id'])
+                frames.append(pairs.assign(field=label))
+            if not frames:
+                return cls.empty()
+            entries = pd.concat(frames, ignore_index=True)
+            entries['value'] = [housemaid_key(v) for v in entries['value']]
+            entries['id'] = [housemaid_key(v) for v in entries['id']]
+            entries['key'] = [normalize(v) for v in entries['value']]
+            entries = entries.drop_duplicates(subset=['key', 'field', 'id']).sort_values('key', kind='mergesort')
+
+            keys = entries['key'].to_numpy(dtype=object)
+            lengths = np.fromiter((len(k) + 1 for k in keys), dtype='int64', count=len(keys))
+            return cls(
+                keys=keys,
+                fields=entries['field'].to_numpy(dtype=object),
+                values=entries['value'].to_numpy(dtype=object),
+                housemaids=entries['id'].to_numpy(dtype=object),
+                names=entries['name'].astype(object).where(entries['name'].notna(), None).to_numpy(dtype=object),
+                haystack=_SEPARATOR.join(keys) + _SEPARATOR,
+                starts=np.r_[0, np.cumsum(lengths)[:-1]] if len(keys) else np.array([], dtype='int64')
+            )
+
+    @classmethod
+    def empty(cls) -> "SearchIndex":
+        nothing = np.array([], dtype=object)
+        return cls(nothing, nothing, nothing, nothing, nothing, '', np.array([], dtype='int64'))
+
+    def prefix(self, query: str) -> np.ndarray:
+        """Entry positions whose key starts with the normalized query."""
+        query = normalize(query)
+        lo = np.searchsorted(self.keys, query, side='left')
+        hi = np.searchsorted(self.keys, query + '\uffff', side='right')
+        return np.arange(lo, hi)
+
+    def substring(self, query: str, limit: int) -> np.ndarray:
+        """Entry positions whose key contains the normalized query, at most `limit` of them."""
+        query = normalize(query)
+        hits: List[int] = []
+        at = self.haystack.find(query)
+        while at >= 0 and len(hits) < limit:
+            entry = int(np.searchsorted(self.starts, at, side='right')) - 1
+            hits.append(entry)
+            # Continue after this key so it is reported once
+            at = self.haystack.find(query, self.starts[entry] + len(self.keys[entry]) + 1)
+        return np.array(hits, dtype='int64')
+
+    def search(self, query: str, limit: int = MAX_SEARCH_RESULTS) -> List[Dict[str, Any]]:
+        """Prefix matches first, then other substring matches; one hit per housemaid, field and value."""
+        if not normalize(query):
+            return []
+        positions = list(self.prefix(query)[:limit * 4])
+        if len(positions) < limit:
+            positions += list(self.substring(query, limit * 4))
+        results, seen = [], set()
+        for i in positions:
+            key = (self.housemaids[i], self.fields[i], self.values[i])
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append({
+                'housemaid_id': self.housemaids[i],
+                'housemaid_name': self.names[i],
+                'field': self.fields[i],
+                'value': self.values[i]
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+def search_index(dataset: Dataset) -> SearchIndex:
+    """The dataset's search index, built once per dataset version."""
+    return dataset.derived('search', SearchIndex.build)
+
+
+def warm_indexes(dataset: Dataset):
+    """Build the search and drilldown indexes for a freshly ingested version in the background."""
+    def build():
+        search_index(dataset)
+        housemaid_index(dataset)
+    threading.Thread(target=build, daemon=True).start()
@@ -0,0 +1,92 @@
+"""Callback response serialization: orjson-backed JSON and compression of large responses."""
+import gzip
+import os
+from typing import Any, Optional, Tuple
+
+import dash._callback
+import numpy as np
+import pandas as pd
+from flask import request
+from plotly.io.json import to_json_plotly
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "2048"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "3"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSED_PATHS = ('_dash-update-component',)
+
+
+def _default(value: Any) -> Any:
+    """orjson fallback for Dash components, figures, Patch objects and pandas scalars."""
+    if hasattr(value, 'to_plotly_json'):
+        return value.to_plotly_json()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError
+
+
+def fast_to_json(value: Any) -> str:
+    """orjson encoding of a callback response; anything it cannot encode goes through plotly's encoder."""
+    try:
+        return orjson.dumps(value, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return to_json_plotly(value)
+
+
+def install_json_encoder() -> bool:
+    """Encode callback responses with orjson when it is installed.
+
+    Dash has no encoder setting, and plotly's orjson engine first walks the whole
+    response in Python (slower than the stdlib encoder on large tables), so the
+    encoder Dash uses for callback responses is replaced directly.
+    """
+    if orjson is None:
+        return False
+    dash._callback.to_json = fast_to_json
+    return True
+
+
+def compress_body(body: bytes, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+    """Compress a response body with the best encoding the client accepts; (None, body) if none."""
+    accepted = {token.split(';')[0].strip() for token in (accept_encoding or '').lower().split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br', brotli.compress(body, quality=BROTLI_QUALITY)
+    if 'gzip' in accepted:
+        return 'gzip', gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return None, body
+
+
+def install_compression(server, min_bytes: int = COMPRESS_MIN_BYTES):
+    """Compress callback responses of at least min_bytes on the Flask server."""
+    @server.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or not request.path.rstrip('/').endswith(COMPRESSED_PATHS)):
+            return response
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        encoding, compressed = compress_body(body, request.headers.get('Accept-Encoding', ''))
+        if encoding is not None:
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+        return response
+    return compress_response
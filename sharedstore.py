@@ -0,0 +1,184 @@
+"""Datasets published as memory-mapped Arrow IPC files, shared zero-copy by all gunicorn workers.
+
+Layout of SHARED_DATASET_DIR (ideally on /dev/shm):
+    <id>.v<version>.arrow   data columns plus row/key hash columns, one record batch
+    <id>.current            the latest published version ("<version> pinned" for pinned datasets)
+    <id>.lock               flock serializing appends across workers
+
+Numeric columns without nulls and string columns map back without a copy (as
+read-only arrays and string[pyarrow]); columns with nulls other than float NaN
+are converted. Mixed-type object columns (numbers and text) are stored as text,
+so they come back as strings, not as the original mix.
+"""
+import fcntl
+import glob
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # shared mode needs pyarrow; the in-process cache works without it
+    pa = None
+
+SHARED_DATASET_DIR = os.getenv("SHARED_DATASET_DIR", "")
+# Unpinned datasets not republished for this long are removed from SHARED_DATASET_DIR
+SHARED_DATASET_TTL = float(os.getenv("SHARED_DATASET_TTL", str(24 * 3600)))
+
+ROW_HASH_COLUMN = '__row_hash'
+KEY_HASH_COLUMN = '__key_hash'
+METADATA_KEY = b'housemaid_dataset'
+
+
+def _arrow_column(series: pd.Series):
+    """Arrow array for a column; float NaN stays a value (not a null) so it maps back without a copy."""
+    if series.dtype.kind == 'f':
+        return pa.array(series.to_numpy())
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns (e.g. numbers and text) are stored as text
+        return pa.array(series.astype(str).where(series.notna(), None), from_pandas=True)
+
+
+def _string_mapper(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+class SharedDatasetFiles:
+    """Publishes dataset versions to a directory and maps them back without deserializing."""
+
+    def __init__(self, directory: str, ttl: float = SHARED_DATASET_TTL):
+        if pa is None:
+            raise RuntimeError("SHARED_DATASET_DIR requires pyarrow")
+        self.directory = directory
+        self.ttl = ttl
+        self._claims = []
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, dataset_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{dataset_id}.{suffix}")
+
+    @contextmanager
+    def lock(self, dataset_id: str):
+        """Exclusive cross-process lock for read-modify-publish of one dataset."""
+        with open(self._path(dataset_id, 'lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def claim(self, name: str) -> bool:
+        """Hold an exclusive lock for the life of this process; False if another process holds it."""
+        f = open(self._path(name, 'lock'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._claims.append(f)
+        return True
+
+    def latest_version(self, dataset_id: str) -> Optional[int]:
+        try:
+            with open(self._path(dataset_id, 'current')) as f:
+                return int(f.read().split()[0])
+        except (OSError, ValueError):
+            return None
+
+    def publish(self, dataset_id: str, version: int, df: pd.DataFrame, row_hashes: np.ndarray,
+                key_hashes: np.ndarray, meta: Dict[str, Any]):
+        """Write one version and point <id>.current at it; versions before the previous one are unlinked.
+
+        The previous version stays, for workers that read the old pointer just before
+        this one replaced it. Workers that still map an unlinked version keep reading
+        it until they refresh.
+        """
+        arrays = [_arrow_column(df[column]) for column in df.columns]
+        arrays += [pa.array(np.asarray(row_hashes, dtype='uint64')), pa.array(np.asarray(key_hashes, dtype='uint64'))]
+        names = [str(column) for column in df.columns] + [ROW_HASH_COLUMN, KEY_HASH_COLUMN]
+        table = pa.Table.from_arrays(arrays, names=names)
+        table = table.replace_schema_metadata({METADATA_KEY: json.dumps(meta).encode()})
+
+        path = self._path(dataset_id, f"v{version}.arrow")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            # A single record batch keeps every column contiguous, so it maps back without concatenation
+            writer.write_table(table, max_chunksize=max(len(df), 1))
+        os.replace(tmp, path)
+
+        pointer = self._path(dataset_id, 'current')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(f"{version} pinned" if meta.get('pinned') else str(version))
+        os.replace(pointer + '.tmp', pointer)
+
+        for old in glob.glob(self._path(dataset_id, 'v*.arrow')):
+            if _version_of(old) < version - 1:
+                try:
+                    os.unlink(old)
+                except FileNotFoundError:
+                    pass
+        self._remove_expired()
+
+    def load(self, dataset_id: str, version: int):
+        """Map a published version: (df, row_hashes, key_hashes, meta), sharing pages with other workers."""
+        source = pa.memory_map(self._path(dataset_id, f"v{version}.arrow"))
+        table = pa.ipc.open_file(source).read_all()
+        meta = json.loads(table.schema.metadata[METADATA_KEY])
+        row_hashes = table.column(ROW_HASH_COLUMN).to_numpy()
+        key_hashes = table.column(KEY_HASH_COLUMN).to_numpy()
+        # One block per column: consolidating the numeric columns would copy them out of the mapping
+        df = table.drop_columns([ROW_HASH_COLUMN, KEY_HASH_COLUMN]).to_pandas(
+            types_mapper=_string_mapper, split_blocks=True, self_destruct=False
+        )
+        return df, row_hashes, key_hashes, meta
+
+    def _remove_expired(self):
+        cutoff = time.time() - self.ttl
+        for pointer in glob.glob(os.path.join(self.directory, '*.current')):
+            try:
+                if os.path.getmtime(pointer) >= cutoff:
+                    continue
+                with open(pointer) as f:
+                    if 'pinned' in f.read():
+                        continue
+                dataset_id = os.path.basename(pointer)[:-len('.current')]
+                for path in glob.glob(self._path(dataset_id, 'v*.arrow')) + [pointer]:
+                    os.unlink(path)
+            except OSError:
+                continue
+
+
+def _version_of(path: str) -> int:
+    """Version number of a <id>.v<version>.arrow file."""
+    return int(os.path.basename(path).rsplit('.', 2)[-2][1:])
+
+
+def shared_files() -> Optional[SharedDatasetFiles]:
+    """The shared directory configured by SHARED_DATASET_DIR, or None for per-worker datasets.
+
+    With several gunicorn workers (WEB_CONCURRENCY > 1) per-worker datasets would make
+    a session's requests miss its dataset on every other worker, so that fails at startup.
+    """
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+    if not SHARED_DATASET_DIR:
+        if workers > 1:
+            raise RuntimeError(f"WEB_CONCURRENCY={workers} requires SHARED_DATASET_DIR, "
+                               "or each worker only sees the datasets uploaded to it")
+        return None
+    try:
+        return SharedDatasetFiles(SHARED_DATASET_DIR)
+    except (RuntimeError, OSError) as e:
+        if workers > 1:
+            raise
+        print(f"Shared datasets disabled: {str(e)}")
+        return None
@@ -0,0 +1,180 @@
+"""Per-stage dwell-time percentiles from mergeable quantile sketches.
+
+Each upload is summarized at ingestion into one sketch per Current Stage of
+its cases' Time In Stage (latest note per case). A sketch is a log-bucketed
+histogram (DDSketch-style): bucket i holds values in (gamma^(i-1), gamma^i],
+so any quantile is within SKETCH_ACCURACY relative error. Merging sketches is
+adding bucket counts, so any range of uploads combines exactly without
+keeping their rows. Sketches are appended to DWELL_SKETCHES_PATH, one JSON
+line per upload; overlapping exports are counted once per upload.
+"""
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from forecast import latest_notes
+from instrumentation import stage
+
+SKETCHES_PATH = os.getenv("DWELL_SKETCHES_PATH", "dwell_sketches.jsonl")
+SKETCH_ACCURACY = float(os.getenv("SKETCH_ACCURACY", "0.01"))
+# Dwell times at or below this many hours share the zero bucket
+SKETCH_MIN_HOURS = 0.01
+PERCENTILES = [50, 90, 99]
+
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+@dataclass
+class DwellSketch:
+    buckets: Dict[int, int] = field(default_factory=dict)
+    zeros: int = 0
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.buckets.values())
+
+    def merge(self, other: "DwellSketch") -> "DwellSketch":
+        buckets = dict(self.buckets)
+        for index, count in other.buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        return DwellSketch(buckets, self.zeros + other.zeros)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), or None for an empty sketch."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint (in relative terms) of (gamma^(i-1), gamma^i]
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.buckets) / (_GAMMA + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'zeros': self.zeros, 'buckets': {str(i): c for i, c in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "DwellSketch":
+        return cls({int(i): int(c) for i, c in payload.get('buckets', {}).items()}, int(payload.get('zeros', 0)))
+
+
+def stage_sketches(df: pd.DataFrame) -> Dict[str, DwellSketch]:
+    """One sketch per stage of the Time In Stage of each case's latest note, bucketed in one pass."""
+    if df.empty or 'Current Stage' not in df.columns or 'Time In Stage' not in df.columns:
+        return {}
+    with stage('sketch', rows=len(df)):
+        hours = pd.to_numeric(df['Time In Stage'], errors='coerce').to_numpy(dtype='float64')
+        codes, stages = pd.factorize(df['Current Stage'])
+        keep = latest_notes(df) & (codes >= 0) & ~np.isnan(hours)
+        codes, hours = codes[keep], hours[keep]
+
+        zero = hours <= SKETCH_MIN_HOURS
+        indexes = np.ceil(np.log(np.where(zero, 1.0, hours)) / _LOG_GAMMA).astype('int64')
+        zero_counts = np.bincount(codes[zero], minlength=len(stages))
+        # Count (stage, bucket) pairs together; offset buckets so the combined key is non-negative
+        offset = int(indexes[~zero].min()) if (~zero).any() else 0
+        width = (int(indexes[~zero].max()) - offset + 1) if (~zero).any() else 1
+        pairs, counts = np.unique(codes[~zero] * width + (indexes[~zero] - offset), return_counts=True)
+
+        sketches = {str(s): DwellSketch(zeros=int(zero_counts[i])) for i, s in enumerate(stages)}
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            sketches[str(stages[pair // width])].buckets[pair % width + offset] = count
+        return {name: sketch for name, sketch in sketches.items() if sketch.count}
+
+
+class SketchStore:
+    """Per-upload sketches appended to a JSON-lines file, re-read as other workers append to it."""
+
+    def __init__(self, path: str = SKETCHES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = []
+        self._offset = 0
+
+    def _refresh(self):
+        try:
+            if os.path.getsize(self.path) == self._offset:
+                return
+            with open(self.path) as f:
+                f.seek(self._offset)
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            if not line.endswith('\n'):
+                # Another worker is mid-write; pick the line up next time
+                break
+            self._offset += len(line.encode())
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print(f"Error reading dwell sketches: {str(e)}")
+                continue
+            record['stages'] = {name: DwellSketch.from_dict(s) for name, s in record['stages'].items()}
+            self._records.append(record)
+
+    def record(self, filename: str, df: pd.DataFrame):
+        """Sketch one upload and persist it."""
+        sketches = stage_sketches(df)
+        if not sketches:
+            return
+        line = json.dumps({
+            'uploaded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'filename': filename,
+            'stages': {name: sketch.to_dict() for name, sketch in sketches.items()}
+        }) + '\n'
+        with self._lock:
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Error saving dwell sketches: {str(e)}")
+
+    def merged(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, DwellSketch]:
+        """Merge the sketches of every upload whose date falls in [start, end] (YYYY-MM-DD, inclusive)."""
+        with self._lock:
+            self._refresh()
+            records = list(self._records)
+        merged: Dict[str, DwellSketch] = {}
+        for record in records:
+            day = record['uploaded'][:10]
+            if (start and day < start[:10]) or (end and day > end[:10]):
+                continue
+            for name, sketch in record['stages'].items():
+                merged[name] = merged[name].merge(sketch) if name in merged else sketch
+        return merged
+
+    def upload_days(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return sorted({record['uploaded'][:10] for record in self._records})
+
+
+def percentile_table(sketches: Dict[str, DwellSketch]) -> pd.DataFrame:
+    """Cases and PERCENTILES of dwell hours per stage, most cases first."""
+    rows = []
+    for name, sketch in sketches.items():
+        row = {'Current Stage': name, 'Cases': sketch.count}
+        for p in PERCENTILES:
+            value = sketch.quantile(p / 100)
+            row[f"p{p}"] = None if value is None else round(value, 1)
+        rows.append(row)
+    columns = ['Current Stage', 'Cases'] + [f"p{p}" for p in PERCENTILES]
+    return pd.DataFrame(rows, columns=columns).sort_values('Cases', ascending=False, kind='mergesort')
+
+
+# Shared store for this worker process
+sketch_store = SketchStore()
@@ -0,0 +1,130 @@
+"""Agents that receive distributed late cases, and their Google Sheets."""
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict
+
+import pandas as pd
+
+from completion import STATUS_COLUMN
+from instrumentation import stage
+from pipeline import split_evenly
+
+# Define User and UserManager classes for Manage Users functionality
+@dataclass
+class User:
+    name: str
+    google_sheet_id: str
+    active: bool = True
+    workload: int = 0
+
+class UserManager:
+    def __init__(self):
+        self.users: Dict[str, User] = {
+            "razan.hassan": User(
+                name="Razan Hassan",
+                google_sheet_id="14dpPJUFwMXTFemq8b2as3Jpwj_Qs-kplradlM63lS_U"
+            ),
+            "aya.tahawi": User(
+                name="Aya Tahawi",
+                google_sheet_id="1hkB77aTFTalcZtUG9xfNKH3b7nIgYAZP1-AF6Ob7szE"
+            ),
+            "maya.dayoub": User(
+                name="Maya Dayoub",
+                google_sheet_id="1fDaIXfSGEKlUTlVprS7_SjG1wbhaGk1kVLvZXTia6QU"
+            ),
+            "laila.alhafi": User(
+                name="Laila Alhafi",
+                google_sheet_id="1nCzh8FMZOGa2x7v_OLIUtVEtAc4hzUG3f-rIgHJgEF8"
+            ),
+            "ehab.joud": User(
+                name="Ehab Joud",
+                google_sheet_id="1WccFTrR-Izh4qpRSnDD9A_nq8MWm0l54fqFJu4eJPYY"
+            ),
+            "hala.khaddour": User(
+                name="Hala Khaddour",
+                google_sheet_id="1_zM3sANFMHXvjSFvIHCtG2sKiS7GBWk8haUCoYBm1XU"
+            ),
+            "marah.ghanem": User(
+                name="Marah Ghanem",
+                google_sheet_id="1z88anA3_FKx6xo3fc4bci22-J8naoiEYdbcK8eiN8CM"
+            )
+        }
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Google Sheets client, authorized on first use rather than at import."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self.setup_google_sheets()
+        return self._client
+
+    def setup_google_sheets(self):
+        """Initialize Google Sheets connection"""
+        # gspread and oauth2client take a noticeable share of startup, so load them here
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        scope = ['https://spreadsheets.google.com/feeds',
+                'https://www.googleapis.com/auth/drive']
+        
+        # Add your credentials file path
+        service_account_json = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
+        if not service_account_json:
+            raise ValueError("Environment variable GOOGLE_SERVICE_ACCOUNT_JSON is missing")
+        
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(
+            json.loads(service_account_json), scope
+        )
+        self._client = gspread.authorize(creds)
+
+    def sheets(self) -> Dict[str, str]:
+        """Google Sheet id of every active user."""
+        return {username: user.google_sheet_id for username, user in self.users.items()
+                if user.active and user.google_sheet_id}
+
+    def distribute_data(self, usernames: list, data: pd.DataFrame) -> dict:
+        """Distribute data evenly among users."""
+        results = {}
+        for username in usernames:
+            if username in self.users:
+                with stage('sheets.open'):
+                    sheet = self.client.open_by_key(self.users[username].google_sheet_id).sheet1
+                with stage('sheets.clear'):
+                    sheet.clear()
+                with stage('sheets.update', rows=len(data)):
+                    sheet.update([data.columns.values.tolist()] + data.values.tolist())
+                results[username] = {"status": "success", "message": f"Data distributed to {username}"}
+            else:
+                results[username] = {"status": "error", "message": f"User {username} not found"}
+        return results
+
+    def distribute_evenly(self, usernames: list, data: pd.DataFrame) -> dict:
+        """Split data into even consecutive chunks and write one chunk to each user's sheet."""
+        results = {}
+        for username, user_data in zip(usernames, split_evenly(data, len(usernames))):
+            if username not in self.users:
+                results[username] = {"status": "error", "message": f"User {username} not found"}
+                continue
+            
+            # Update the user's Google Sheet
+            try:
+                with stage('sheets.open'):
+                    sheet = self.client.open_by_key(self.users[username].google_sheet_id).sheet1
+                with stage('sheets.clear'):
+                    sheet.clear()
+                # Replace NaN values with empty strings for Google Sheets compatibility
+                user_data = user_data.where(pd.notna(user_data), "")
+                if STATUS_COLUMN not in user_data.columns:
+                    # Agents mark progress here; the completion tracker reads it back
+                    user_data = user_data.assign(**{STATUS_COLUMN: ""})
+                with stage('sheets.update', rows=len(user_data)):
+                    sheet.update([user_data.columns.values.tolist()] + user_data.values.tolist())
+                results[username] = {"status": "success", "message": f"Assigned {len(user_data)} late cases to {username}"}
+            except Exception as e:
+                results[username] = {"status": "error", "message": f"Failed to update sheet for {username}: {str(e)}"}
+        return results
@@ -0,0 +1,198 @@
+"""Memoized pipeline stages shared by the dashboard callbacks.
+
+dataset -> filtered view -> late flags -> aggregates. Each stage is keyed by
+the parts of the view spec it depends on, so a threshold edit reuses the
+filtered view and a filter change reuses nothing it does not have to.
+Views hold row positions and masks rather than DataFrame copies.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from datastore import Dataset, dataset_store
+from delta import snapshot_store
+from forecast import BreachForecast, newest_note_time
+from instrumentation import stage
+from pipeline import filter_mask, late_flags
+from rules import rule_store, threshold_sets
+
+MAX_CACHED_VIEWS = int(os.getenv("MAX_CACHED_VIEWS", "64"))
+
+
+class ViewCache:
+    """LRU memo with single-flight computation: concurrent callers of one key compute it once."""
+
+    def __init__(self, max_entries: int = MAX_CACHED_VIEWS):
+        self.max_entries = max_entries
+        self._values: "OrderedDict[str, Any]" = OrderedDict()
+        self._accessed: Dict[str, float] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self._accessed[key] = time.time()
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+            try:
+                value = compute()
+                with self._lock:
+                    self._values[key] = value
+                    self._accessed[key] = time.time()
+                    while len(self._values) > self.max_entries:
+                        evicted, _ = self._values.popitem(last=False)
+                        self._accessed.pop(evicted, None)
+            finally:
+                # Also when compute raises, or failed keys would pile up here
+                with self._lock:
+                    self._key_locks.pop(key, None)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._accessed.clear()
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Approximate size and last access of every memoized view, least recently used first."""
+        with self._lock:
+            entries = [(key, value, self._accessed.get(key)) for key, value in self._values.items()]
+        return [{'key': key, 'bytes': _approx_bytes(value), 'last_access': accessed}
+                for key, value, accessed in entries]
+
+
+def _approx_bytes(value: Any) -> int:
+    """Array and frame buffers exactly, containers one level deep."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_approx_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+view_cache = ViewCache()
+
+
+def filter_spec(dataset_ref, session_id, stages=None, types=None, nationalities=None,
+                client_notes=None, changes=None) -> Optional[Dict[str, Any]]:
+    """JSON-serializable description of a filtered view, or None without a dataset."""
+    if not dataset_ref:
+        return None
+    return {
+        'dataset': {'id': dataset_ref.get('id'), 'version': dataset_ref.get('version')},
+        'session': session_id,
+        'stages': sorted(stages) if stages else None,
+        'types': sorted(types) if types else None,
+        'nationalities': sorted(nationalities) if nationalities else None,
+        'client_notes': sorted(client_notes) if client_notes else None,
+        'changes': sorted(changes) if changes else None
+    }
+
+
+def late_spec(spec: Optional[Dict[str, Any]], threshold_set) -> Optional[Dict[str, Any]]:
+    """Extend a filter spec with the threshold set and rule table version it is evaluated against."""
+    if spec is None:
+        return None
+    return {'filter': spec, 'thresholds': threshold_set, 'rules': rule_store.version}
+
+
+def _dataset_of(spec: Dict[str, Any]) -> Optional[Dataset]:
+    """Dataset a filter spec (or a late spec, through its filter) refers to, as the store holds it now."""
+    return dataset_store.get(spec.get('filter', spec)['dataset']['id'])
+
+
+def _key(stage: str, spec: Dict[str, Any], dataset: Optional[Dataset] = None) -> str:
+    """Cache key of a view: its spec, with the version of the dataset the store holds now.
+
+    The browser's version lags behind appends to a shared dataset (e.g. the watched
+    directory), which re-sort its rows; cached positions must not outlive the frame.
+    """
+    if dataset is None:
+        dataset = _dataset_of(spec)
+    version = None if dataset is None else dataset.version
+    return f"{stage}:{version}:" + json.dumps(spec, sort_keys=True, default=str)
+
+
+def filtered_positions(spec: Dict[str, Any], dataset: Optional[Dataset] = None) -> np.ndarray:
+    """Row positions of the dataset that pass the filters."""
+    dataset = dataset or _dataset_of(spec)
+
+    def compute():
+        if dataset is None or dataset.df.empty:
+            return np.array([], dtype='int64')
+        df = dataset.df
+        with stage('filter', rows=len(df)):
+            mask = filter_mask(
+                df, spec['stages'], spec['types'], spec['nationalities'], spec['client_notes'],
+                snapshot_store.housemaids(spec['session'], spec['changes'])
+            )
+            return np.flatnonzero(mask)
+    return view_cache.get_or_compute(_key('filtered', spec, dataset), compute)
+
+
+def filtered_frame(spec: Dict[str, Any], dataset: Optional[Dataset] = None) -> pd.DataFrame:
+    """Materialize the filtered view as a new DataFrame."""
+    dataset = dataset or _dataset_of(spec)
+    if dataset is None or dataset.df.empty:
+        return pd.DataFrame()
+    return dataset.df.take(filtered_positions(spec, dataset))
+
+
+def late_mask(lspec: Dict[str, Any], dataset: Optional[Dataset] = None) -> np.ndarray:
+    """Late flag for every row of the filtered view."""
+    dataset = dataset or _dataset_of(lspec)
+
+    def compute():
+        frame = filtered_frame(lspec['filter'], dataset)
+        if frame.empty:
+            return np.array([], dtype=bool)
+        with stage('late', rows=len(frame)):
+            flags = late_flags(frame, threshold_sets.get(lspec['thresholds']), rules=rule_store.table)
+            return flags.to_numpy(dtype=bool)
+    return view_cache.get_or_compute(_key('late', lspec, dataset), compute)
+
+
+def late_frame(lspec: Dict[str, Any], late_only: bool = False) -> pd.DataFrame:
+    """Filtered view with its Late column, optionally restricted to late rows."""
+    # One dataset lookup, so the frame and its flags come from the same version
+    dataset = _dataset_of(lspec)
+    frame = filtered_frame(lspec['filter'], dataset)
+    if frame.empty:
+        return frame
+    frame = frame.assign(Late=late_mask(lspec, dataset))
+    return frame[frame['Late']] if late_only else frame
+
+
+def breach_forecast(lspec: Dict[str, Any]) -> BreachForecast:
+    """Open cases of the filtered view sorted by hours left before they breach, as of the newest note."""
+    dataset = _dataset_of(lspec)
+
+    def compute():
+        if dataset is None:
+            return BreachForecast.build(pd.DataFrame(), {}, None)
+        as_of = dataset.derived('newest-note', newest_note_time)
+        return BreachForecast.build(filtered_frame(lspec['filter'], dataset), threshold_sets.get(lspec['thresholds']),
+                                    as_of, rules=rule_store.table)
+    return view_cache.get_or_compute(_key('forecast', lspec, dataset), compute)
+
+
+def memoized(stage: str, spec: Dict[str, Any], compute: Callable[[], Any]) -> Any:
+    """Memoize a derived aggregate under a stage name and the spec it depends on."""
+    return view_cache.get_or_compute(_key(stage, spec), compute)
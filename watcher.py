@@ -0,0 +1,104 @@
+"""Background ingestion of RPA exports dropped into a watched local directory."""
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import traceback
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # inotify is optional; polling works everywhere
+    INotify = None
+
+WATCH_DIR = os.getenv("WATCH_DIR")
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "10"))
+WATCH_SETTLE = 1.0
+WATCH_EXTENSIONS = ('.csv', '.xls', '.xlsx')
+
+# Directory for the lock that elects one worker to record watched files' history
+WATCH_LOCK_DIR = os.getenv("WATCH_LOCK_DIR", tempfile.gettempdir())
+
+# Dataset id under which the watched directory is published to every session
+WATCHED_DATASET_ID = 'watched'
+
+_claims = []
+
+
+def claim_recorder(path: str) -> bool:
+    """Hold a process-lifetime lock for the watched directory; True in exactly one worker."""
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    f = open(os.path.join(WATCH_LOCK_DIR, f"watcher-{name}.lock"), 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _claims.append(f)
+    return True
+
+
+class DirectoryWatcher:
+    """Detects new or changed files by mtime and size and hands them to a callback."""
+
+    def __init__(self, path: str, on_file: Callable[[str], None], interval: float = WATCH_INTERVAL):
+        self.path = path
+        self.on_file = on_file
+        self.interval = interval
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="directory-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def scan(self):
+        """Hand over every file whose signature changed and has been stable for one scan."""
+        try:
+            entries = list(os.scandir(self.path))
+        except OSError as e:
+            print(f"Error scanning watched directory: {str(e)}")
+            return
+        for entry in sorted(entries, key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.lower().endswith(WATCH_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self._seen.get(entry.path) == signature:
+                continue
+            # Wait until a file stops changing so half-written exports are not parsed
+            if self._pending.get(entry.path) != signature:
+                self._pending[entry.path] = signature
+                continue
+            del self._pending[entry.path]
+            self._seen[entry.path] = signature
+            try:
+                self.on_file(entry.path)
+            except Exception:
+                traceback.print_exc()
+
+    def _run(self):
+        inotify = None
+        if INotify is not None:
+            try:
+                inotify = INotify()
+                inotify.add_watch(self.path, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE)
+            except OSError:
+                inotify = None
+        while not self._stop.is_set():
+            self.scan()
+            # Re-check files that are still settling sooner than the regular interval
+            wait = min(WATCH_SETTLE, self.interval) if self._pending else self.interval
+            if inotify is not None:
+                # Wake up early on filesystem events; the scan still compares signatures
+                inotify.read(timeout=int(wait * 1000))
+            else:
+                self._stop.wait(wait)